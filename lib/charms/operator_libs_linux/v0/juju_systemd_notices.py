@@ -28,6 +28,7 @@ systemd service and handle events based on the current emitted state:
 
 ```python
 from charms.operator_libs_linux.v0.juju_systemd_notices import (
+    ServiceFailedEvent,
     ServiceStartedEvent,
     ServiceStoppedEvent,
     SystemdNotices,
@@ -46,6 +47,7 @@ class ApplicationCharm(CharmBase):
         self.framework.observe(self.on.stop, self._on_stop)
         self.framework.observe(self.on.service_slurmd_started, self._on_slurmd_started)
         self.framework.observe(self.on.service_slurmd_stopped, self._on_slurmd_stopped)
+        self.framework.observe(self.on.service_slurmd_failed, self._on_slurmd_failed)
 
     def _on_install(self, _: InstallEvent) -> None:
         # Subscribe the charmed operator to the services on the machine.
@@ -76,28 +78,49 @@ class ApplicationCharm(CharmBase):
 
     def _on_slurmd_stopped(self, _: ServiceStoppedEvent) -> None:
         self.unit.status = BlockedStatus("slurmd not running")
+
+    def _on_slurmd_failed(self, event: ServiceFailedEvent) -> None:
+        # The Result property of the service tells why it failed, e.g. `exit-code`.
+        self.unit.status = BlockedStatus(f"slurmd failed: {event.result}")
 ```
+
+Besides started and stopped, services emit `failed`, `restarting` while systemd
+waits to restart a failed service, and `start-limit-hit` once systemd gave up
+restarting it.
 """
 
-__all__ = ["ServiceStartedEvent", "ServiceStoppedEvent", "SystemdNotices"]
+__all__ = [
+    "ServiceFailedEvent",
+    "ServiceRestartingEvent",
+    "ServiceStartedEvent",
+    "ServiceStartLimitHitEvent",
+    "ServiceStoppedEvent",
+    "SystemdNotices",
+]
 
-import argparse
 import asyncio
+import collections
 import functools
+import json
 import logging
+import os
 import re
+import resource
 import signal
+import socket
 import subprocess
 import textwrap
+import time
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 
-from dbus_fast.aio import MessageBus
-from dbus_fast.constants import BusType, MessageType
-from dbus_fast.errors import DBusError
-from dbus_fast.message import Message
 from ops.charm import CharmBase
-from ops.framework import EventBase
+from ops.framework import EventBase, Handle
+
+# dbus_fast is only needed by the daemon, so charm hooks do not import it.
+if TYPE_CHECKING:  # pragma: nocover
+    from dbus_fast.aio import MessageBus
+    from dbus_fast.message import Message
 
 # The unique Charmhub library identifier, never change it.
 LIBID = "2bb6ecd037e64c899033113abab02e01"
@@ -107,15 +130,43 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version.
-LIBPATCH = 1
+LIBPATCH = 7
 
 # juju-systemd-notices charm library dependencies.
 # Charm library dependencies are installed when the consuming charm is packed.
 PYDEPS = ["dbus-fast>=1.90.2"]
 
 _logger = logging.getLogger(__name__)
+# Seconds to collect the state changes of a service before notifying Juju of the last one.
+_DEFAULT_DEBOUNCE = 0.5
+# Times to retry a failed hook, and the initial and maximum seconds between retries.
+_DEFAULT_HOOK_RETRIES = 5
+_HOOK_BACKOFF = 1
+_HOOK_BACKOFF_MAX = 30
 _juju_unit = None
+_debounce = _DEFAULT_DEBOUNCE
+_hook_retries = _DEFAULT_HOOK_RETRIES
 _service_states = {}
+# D-Bus match rule of each watched service.
+_match_rules = {}
+# State changes waiting to be dispatched, the dispatch task, and the last
+# state Juju was notified of, of each service.
+_pending_states = {}
+_dispatchers = {}
+_notified_states = {}
+# The last reload of the services scheduled by SIGHUP.
+_reload_task = None
+# Result of the last failure of each service.
+_service_results = {}
+# Environment variable passing the Result of a failed service to the charm.
+_RESULT_ENV = "JUJU_SYSTEMD_NOTICES_RESULT"
+# Events emitted for service states, any other state emits a stopped event.
+_STATE_EVENTS = {"active": "started", "failed": "failed", "restarting": "restarting"}
+# Hook to invoke instead if a charm has no hook for an event, e.g. because it
+# subscribed before the event existed. None skips the event.
+_EVENT_FALLBACKS = {"start-limit-hit": "failed", "failed": "stopped", "restarting": None}
+# Upper bounds, in seconds, of the buckets of the latency histograms.
+_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
 _service_hook_regex_filter = re.compile(r"service-(?P<service>[\w\\:-]*)-(?:started|stopped)")
 _DBUS_CHAR_MAPPINGS = {
     "_5f": "_",  # _ must be first since char mappings contain _.
@@ -156,34 +207,88 @@ class ServiceStoppedEvent(EventBase):
     """Event emitted when service has stopped."""
 
 
+class ServiceFailedEvent(EventBase):
+    """Event emitted when service has failed.
+
+    Attributes:
+        result: Why the service failed, as reported by the systemd `Result`
+            property, e.g. `exit-code`, `signal`, `timeout` or `core-dump`.
+    """
+
+    def __init__(self, handle: Handle, result: str = "") -> None:
+        super().__init__(handle)
+        self.result = result or os.environ.get(_RESULT_ENV, "")
+
+    def snapshot(self) -> dict:
+        """Snapshot the result of the failed service."""
+        return {"result": self.result}
+
+    def restore(self, snapshot: dict) -> None:
+        """Restore the result of the failed service."""
+        self.result = snapshot["result"]
+
+
+class ServiceRestartingEvent(EventBase):
+    """Event emitted when a failed service is waiting to be restarted by systemd."""
+
+
+class ServiceStartLimitHitEvent(ServiceFailedEvent):
+    """Event emitted when systemd gave up restarting a service that failed too often."""
+
+
+# Event type of each event, with the hook names of the events.
+_EVENT_TYPES = {
+    "started": ServiceStartedEvent,
+    "stopped": ServiceStoppedEvent,
+    "failed": ServiceFailedEvent,
+    "restarting": ServiceRestartingEvent,
+    "start-limit-hit": ServiceStartLimitHitEvent,
+}
+
+
 class SystemdNotices:
     """Observe systemd services on your machine base."""
 
-    def __init__(self, charm: CharmBase, services: List[str]) -> None:
-        """Instantiate systemd notices service."""
+    def __init__(
+        self, charm: CharmBase, services: List[str], debounce: float = _DEFAULT_DEBOUNCE
+    ) -> None:
+        """Instantiate systemd notices service.
+
+        Args:
+            charm: The charm observing the services.
+            services: The services to observe.
+            debounce: Seconds the daemon collects the state changes of a service
+                before notifying the charm of the last one.
+        """
         self._charm = charm
         self._services = services
+        self._debounce = debounce
         unit_name = self._charm.unit.name.replace("/", "-")
         self._service_file = Path(f"/etc/systemd/system/juju-{unit_name}-systemd-notices.service")
+        self._stats_socket = Path(f"/run/juju-{unit_name}-systemd-notices.sock")
 
         _logger.debug(
             "Attaching systemd notice events to charm %s", self._charm.__class__.__name__
         )
         for service in self._services:
-            self._charm.on.define_event(f"service_{service}_started", ServiceStartedEvent)
-            self._charm.on.define_event(f"service_{service}_stopped", ServiceStoppedEvent)
+            for event, event_type in _EVENT_TYPES.items():
+                event = event.replace("-", "_")
+                self._charm.on.define_event(f"service_{service}_{event}", event_type)
 
-    def subscribe(self) -> None:
-        """Subscribe charmed operator to observe status of systemd services."""
+    def _create_hooks(self) -> None:
+        """Create the legacy hooks the juju-systemd-notices daemon invokes."""
         _logger.debug("Generating systemd notice hooks for %s", self._services)
-        start_hooks = [Path(f"hooks/service-{service}-started") for service in self._services]
-        stop_hooks = [Path(f"hooks/service-{service}-stopped") for service in self._services]
-        for hook in start_hooks + stop_hooks:
-            if hook.exists():
-                _logger.debug("Hook %s already exists. Skipping...", hook.name)
-            else:
-                hook.symlink_to(self._charm.framework.charm_dir / "dispatch")
+        for service in self._services:
+            for event in _EVENT_TYPES:
+                hook = Path(f"hooks/service-{service}-{event}")
+                if hook.exists():
+                    _logger.debug("Hook %s already exists. Skipping...", hook.name)
+                else:
+                    hook.symlink_to(self._charm.framework.charm_dir / "dispatch")
 
+    def subscribe(self) -> None:
+        """Subscribe charmed operator to observe status of systemd services."""
+        self._create_hooks()
         _logger.debug("Starting %s daemon", self._service_file.name)
         if self._service_file.exists():
             _logger.debug("Overwriting existing service file %s", self._service_file.name)
@@ -199,7 +304,7 @@ class SystemdNotices:
                 Restart=always
                 WorkingDirectory={self._charm.framework.charm_dir}
                 Environment="PYTHONPATH={self._charm.framework.charm_dir / "venv"}"
-                ExecStart=/usr/bin/python3 {__file__} {self._charm.unit.name}
+                ExecStart=/usr/bin/python3 {__file__} --debounce {self._debounce} --stats-socket {self._stats_socket} {self._charm.unit.name}
 
                 [Install]
                 WantedBy=multi-user.target
@@ -214,6 +319,24 @@ class SystemdNotices:
         _start_service(self._service_file.name)
         _logger.debug("Started %s daemon", self._service_file.name)
 
+    def stats(self, timeout: float = 5) -> dict:
+        """Return the runtime statistics of the juju-systemd-notices daemon.
+
+        Args:
+            timeout: Seconds to wait for the daemon to respond.
+
+        Raises:
+            OSError: Raised if the daemon is not running.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(self._stats_socket))
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+
+        return json.loads(b"".join(chunks))
+
     def stop(self) -> None:
         """Stop charmed operator from observing the status of subscribed services."""
         _stop_service(self._service_file.name)
@@ -221,6 +344,69 @@ class SystemdNotices:
         _disable_service(self._service_file.name)
 
 
+class _Histogram:
+    """Cumulative histogram of latencies in seconds."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(_LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a latency."""
+        for i, bound in enumerate(_LATENCY_BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(_LATENCY_BUCKETS)
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        """Return the histogram, with the buckets keyed by their upper bound in ms."""
+        buckets = {}
+        total = 0
+        for bound, count in zip((*_LATENCY_BUCKETS, None), self.buckets):
+            total += count
+            buckets["le-inf" if bound is None else f"le-{int(bound * 1000)}ms"] = total
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+class _Stats:
+    """Runtime statistics of the juju-systemd-notices daemon."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.counters = collections.Counter()
+        self.dropped = collections.Counter()
+        # Seconds a hook ran, and from the signal of a state change to its hook completing.
+        self.hook_duration = _Histogram()
+        self.notify_latency = _Histogram()
+        self.reload_duration = _Histogram()
+
+    def to_dict(self) -> dict:
+        """Return the statistics, and the resources the daemon used so far."""
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "uptime": round(time.monotonic() - self.started, 3),
+            "cpu-time": round(usage.ru_utime + usage.ru_stime, 3),
+            "max-rss-kb": usage.ru_maxrss,
+            "messages": self.counters["messages"],
+            "dropped": dict(self.dropped),
+            "transitions": self.counters["transitions"],
+            "hooks": self.counters["hooks"],
+            "hook-failures": self.counters["hook-failures"],
+            "hook-duration": self.hook_duration.to_dict(),
+            "notify-latency": self.notify_latency.to_dict(),
+            "reloads": self.counters["reloads"],
+            "reload-duration": self.reload_duration.to_dict(),
+        }
+
+
+_stats = _Stats()
+
+
 def _name_to_dbus_path(name: str) -> str:
     """Convert the specified name into an org.freedesktop.systemd1.Unit path handle.
 
@@ -256,7 +442,87 @@ def _dbus_path_to_name(path: str) -> str:
     return name
 
 
-def _systemd_unit_changed(msg: Message) -> bool:
+def _unit_match_rule(service: str) -> str:
+    """Return the D-Bus match rule for state changes of a single unit.
+
+    Matching on the exact object path of the unit, rather than on the path
+    namespace of all units, keeps the bus from waking up the daemon for
+    changes of units it does not watch, such as the scopes of Slurm jobs.
+
+    Args:
+        service: The name of the service.
+    """
+    return (
+        "type='signal',interface='org.freedesktop.DBus.Properties',"
+        f"member='PropertiesChanged',path='{_name_to_dbus_path(service)}'"
+    )
+
+
+async def _update_match_rule(bus: "MessageBus", member: str, rule: str) -> bool:
+    """Add or remove a match rule on the bus.
+
+    Args:
+        bus: The message bus to update the match rule on.
+        member: Either `AddMatch` or `RemoveMatch`.
+        rule: The match rule.
+
+    Returns:
+        True if the bus accepted the update.
+    """
+    from dbus_fast.constants import MessageType
+    from dbus_fast.message import Message
+
+    reply = await bus.call(
+        Message(
+            destination="org.freedesktop.DBus",
+            path="/org/freedesktop/DBus",
+            interface="org.freedesktop.DBus",
+            member=member,
+            signature="s",
+            body=[rule],
+        )
+    )
+    if reply.message_type != MessageType.METHOD_RETURN:
+        _logger.error("%s of rule %s failed: %s", member, rule, reply.body)
+        return False
+    return True
+
+
+async def _sync_match_rules(bus: "MessageBus") -> None:
+    """Match the state changes of exactly the watched services.
+
+    Args:
+        bus: The message bus the daemon receives signals on.
+    """
+    for service in set(_service_states) - set(_match_rules):
+        rule = _unit_match_rule(service)
+        if await _update_match_rule(bus, "AddMatch", rule):
+            _logger.debug("Watching %s with match rule %s", service, rule)
+            _match_rules[service] = rule
+
+    for service in set(_match_rules) - set(_service_states):
+        if await _update_match_rule(bus, "RemoveMatch", _match_rules[service]):
+            _logger.debug("No longer watching %s", service)
+            del _match_rules[service]
+
+
+def _unit_state(properties: dict) -> Optional[str]:
+    """Return the state of a unit to notify of from its changed properties.
+
+    Args:
+        properties: The changed properties of the org.freedesktop.systemd1.Unit.
+
+    Returns:
+        The ActiveState of the unit, "restarting" if it failed and is waiting for
+        systemd to restart it, or None if the unit is transitioning.
+    """
+    if "SubState" in properties and properties["SubState"].value == "auto-restart":
+        return "restarting"
+    state = properties["ActiveState"].value
+    return None if state.endswith("ing") else state
+
+
+def _systemd_unit_changed(msg: "Message") -> bool:
     """Send Juju notification if systemd unit state changes on the DBus bus.
 
     Invoked when a PropertiesChanged event occurs on an org.freedesktop.systemd1.Unit
@@ -269,63 +535,170 @@ def _systemd_unit_changed(msg: Message) -> bool:
     Returns:
         True if the event is processed. False if otherwise.
     """
+    from dbus_fast.constants import MessageType
+
     _logger.debug(
         "Received message: path: %s, interface: %s, member: %s",
         msg.path,
         msg.interface,
         msg.member,
     )
+    if msg.message_type != MessageType.SIGNAL or msg.member != "PropertiesChanged":
+        return False
+
+    _stats.counters["messages"] += 1
     service = _dbus_path_to_name(msg.path)
     properties = msg.body[1]
+    # The Result of a service is a property of its org.freedesktop.systemd1.Service object.
+    if "Result" in properties and service in _service_states:
+        _service_results[service] = properties["Result"].value
+
     if "ActiveState" not in properties:
+        _stats.dropped["no-active-state"] += 1
         return False
 
-    global _service_states
     if service not in _service_states:
         _logger.debug("Dropping event for unwatched service: %s", service)
+        _stats.dropped["unwatched"] += 1
         return False
 
-    curr_state = properties["ActiveState"].value
+    curr_state = _unit_state(properties)
     prev_state = _service_states[service]
     # Drop transitioning and duplicate events
-    if curr_state.endswith("ing") or curr_state == prev_state:
+    if curr_state is None or curr_state == prev_state:
         _logger.debug("Dropping event - service: %s, state: %s", service, curr_state)
+        _stats.dropped["transitional" if curr_state is None else "duplicate"] += 1
         return False
 
     _service_states[service] = curr_state
     _logger.debug("Service %s changed state to %s", service, curr_state)
-    # Run the hook in a separate thread so the dbus notifications aren't
-    # blocked from being received.
-    asyncio.create_task(_send_juju_notification(service, curr_state))
+    _stats.counters["transitions"] += 1
+    _queue_notification(service, curr_state)
     return True
 
 
-async def _send_juju_notification(service: str, state: str) -> None:
+def _queue_notification(service: str, state: str) -> None:
+    """Queue a notification of a state change, starting the dispatcher of the service.
+
+    Every service has a single dispatcher task so that its hooks run one at a
+    time and in order, without blocking the dbus notifications from being received.
+
+    Args:
+        service: The name of the service which has changed state.
+        state: The state of the service.
+    """
+    _pending_states[service] = (state, time.monotonic())
+    dispatcher = _dispatchers.get(service)
+    if dispatcher is None or dispatcher.done():
+        _dispatchers[service] = asyncio.create_task(_dispatch_notifications(service))
+
+
+async def _dispatch_notifications(service: str) -> None:
+    """Notify Juju of the state changes of a service until none are pending.
+
+    State changes within the debounce window are collapsed into the last one,
+    e.g. a crash looping service does not queue a hook for every restart.
+
+    Args:
+        service: The name of the service to notify Juju of.
+    """
+    while service in _pending_states:
+        await asyncio.sleep(_debounce)
+        state, changed = _pending_states.pop(service)
+        if state == _notified_states.get(service):
+            _logger.debug("Dropping notification - service: %s, state: %s", service, state)
+            _stats.dropped["collapsed"] += 1
+            continue
+
+        if await _notify_with_retry(service, state):
+            _notified_states[service] = state
+            _stats.notify_latency.observe(time.monotonic() - changed)
+
+
+async def _notify_with_retry(service: str, state: str) -> bool:
+    """Invoke the hook of a state change, retrying failed hooks with backoff.
+
+    Retrying stops once the service changed state again, the hook of the new
+    state supersedes it.
+
+    Args:
+        service: The name of the service which has changed state.
+        state: The state of the service.
+
+    Returns:
+        True if the hook succeeded.
+    """
+    backoff = _HOOK_BACKOFF
+    for attempt in range(_hook_retries + 1):
+        if attempt:
+            _logger.info("Retrying hook of %s %s in %s seconds", service, state, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, _HOOK_BACKOFF_MAX)
+            if service in _pending_states:
+                return False
+
+        if await _send_juju_notification(service, state):
+            return True
+
+    _logger.error("Giving up on hook of %s %s", service, state)
+    return False
+
+
+async def _send_juju_notification(service: str, state: str) -> bool:
     """Invoke a Juju hook to notify an operator that a service state has changed.
 
     Args:
         service: The name of the service which has changed state.
         state: The state of the service.
+
+    Returns:
+        True if the hook succeeded.
     """
+    result = _service_results.get(service, "") if state == "failed" else ""
     if service.endswith(".service"):
         service = service[0:-len(".service")]  # fmt: skip
 
-    event_name = "started" if state == "active" else "stopped"
+    event_name = _STATE_EVENTS.get(state, "stopped")
+    if result == "start-limit-hit":
+        event_name = result
+    while event_name in _EVENT_FALLBACKS:
+        if (Path.cwd() / "hooks" / f"service-{service}-{event_name}").exists():
+            break
+        event_name = _EVENT_FALLBACKS[event_name]
+    if event_name is None:
+        _logger.debug("No hook for service %s in state %s", service, state)
+        return True
+
     hook = f"service-{service}-{event_name}"
     cmd = ["/usr/bin/juju-exec", _juju_unit, f"hooks/{hook}"]
+    if result:
+        # juju-exec runs the hook in a shell, pass the Result in its environment.
+        cmd[2:] = ["env", f"{_RESULT_ENV}={result}", f"hooks/{hook}"]
 
     _logger.debug("Invoking hook %s with command: %s", hook, " ".join(cmd))
-    process = await asyncio.create_subprocess_exec(*cmd)
+    _stats.counters["hooks"] += 1
+    start = time.monotonic()
+    try:
+        process = await asyncio.create_subprocess_exec(*cmd)
+    except OSError as e:
+        _logger.error("Hook command '%s' failed: %s", " ".join(cmd), e)
+        _stats.counters["hook-failures"] += 1
+        return False
+
     await process.wait()
+    _stats.hook_duration.observe(time.monotonic() - start)
     if process.returncode:
+        _stats.counters["hook-failures"] += 1
         _logger.error(
             "Hook command '%s' failed with returncode %s", " ".join(cmd), process.returncode
         )
-    else:
-        _logger.info("Hook command '%s' succeeded.", " ".join(cmd))
+        return False
+
+    _logger.info("Hook command '%s' succeeded.", " ".join(cmd))
+    return True
 
 
-async def _get_service_state(bus: MessageBus, service: str) -> str:
+async def _get_service_state(bus: "MessageBus", service: str) -> str:
     """Report the current state of a service.
 
     Args:
@@ -335,21 +708,29 @@ async def _get_service_state(bus: MessageBus, service: str) -> str:
     Returns:
         The state of the service. "active" or "inactive"
     """
+    from dbus_fast.constants import MessageType
+    from dbus_fast.message import Message
+
     obj_path = _name_to_dbus_path(service)
-    try:
-        _logger.debug("Retrieving state for service %s at object path: %s", service, obj_path)
-        introspection = await bus.introspect("org.freedesktop.systemd1", obj_path)
-        proxy = bus.get_proxy_object("org.freedesktop.systemd1", obj_path, introspection)
-        properties = proxy.get_interface("org.freedesktop.DBus.Properties")
-        state = await properties.call_get("org.freedesktop.systemd1.Unit", "ActiveState")  # noqa
-        return state.value
-    except DBusError:
-        # This will be thrown if the unit specified does not currently exist,
+    _logger.debug("Retrieving state for service %s at object path: %s", service, obj_path)
+    reply = await bus.call(
+        Message(
+            destination="org.freedesktop.systemd1",
+            path=obj_path,
+            interface="org.freedesktop.DBus.Properties",
+            member="Get",
+            signature="ss",
+            body=["org.freedesktop.systemd1.Unit", "ActiveState"],
+        )
+    )
+    if reply.message_type != MessageType.METHOD_RETURN:
+        # This will be returned if the unit specified does not currently exist,
         # which happens if the application needs to install the service, etc.
         return "unknown"
+    return reply.body[0].value
 
 
-async def _async_load_services() -> None:
+async def _async_load_services(bus: "MessageBus") -> None:
     """Load names of services to observe from legacy Juju hooks.
 
     Parses the hook names found in the charm hooks directory and determines
@@ -360,10 +741,14 @@ async def _async_load_services() -> None:
       - service-{service_name}-stopped
 
     Any other hooks are ignored and not loaded into the set of services
-    that should be watched. Upon finding a service hook it's current ActiveState
-    will be queried from systemd to determine it's initial state.
+    that should be watched. Only the difference to the services already
+    watched is applied: the initial ActiveState of new services is queried
+    from systemd concurrently, and services whose hooks no longer exist are
+    no longer watched.
+
+    Args:
+        bus: The message bus to query the initial states on.
     """
-    global _juju_unit
     hooks_dir = Path.cwd() / "hooks"
     _logger.info("Loading services from hooks in %s", hooks_dir)
 
@@ -371,84 +756,112 @@ async def _async_load_services() -> None:
         _logger.warning("Hooks dir %s does not exist.", hooks_dir)
         return
 
-    watched_services = []
+    watched_services = set()
     # Get service-{service}-(started|stopped) hooks defined by the charm.
     for hook in hooks_dir.iterdir():
         match = _service_hook_regex_filter.match(hook.name)
         if match:
-            watched_services.append(match.group("service"))
+            # The .service suffix is necessary and will cause lookup failures of the
+            # service unit when readying the watcher if absent from the service name.
+            watched_services.add(f"{match.group('service')}.service")
 
-    _logger.info("Services from hooks are %s", watched_services)
-    if not watched_services:
-        return
+    _logger.info("Services from hooks are %s", sorted(watched_services))
+    for service in set(_service_states) - watched_services:
+        _logger.debug("Removing service '%s'", service)
+        del _service_states[service]
+        _notified_states.pop(service, None)
+        _service_results.pop(service, None)
+
+    added = sorted(watched_services - set(_service_states))
+    states = await asyncio.gather(*(_get_service_state(bus, service) for service in added))
+    for service, state in zip(added, states):
+        _logger.debug("Adding service '%s' with initial state: %s", service, state)
+        _service_states[service] = _notified_states[service] = state
 
-    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
 
-    # Loop through all the services and be sure that a new watcher is
-    # started for new ones.
-    for service in watched_services:
-        # The .service suffix is necessary and will cause lookup failures of the
-        # service unit when readying the watcher if absent from the service name.
-        service = f"{service}.service"
-        if service not in _service_states:
-            state = await _get_service_state(bus, service)
-            _logger.debug("Adding service '%s' with initial state: %s", service, state)
-            _service_states[service] = state
+async def _reload_services(bus: "MessageBus", previous: Optional[asyncio.Task] = None) -> None:
+    """Reload the services to observe and update the match rules of the bus.
 
+    Args:
+        bus: The message bus the daemon receives signals on.
+        previous: Reload to finish first, so that reloads do not interleave.
+    """
+    if previous is not None:
+        await asyncio.wait([previous])
+
+    start = time.monotonic()
+    await _async_load_services(bus)
+    await _sync_match_rules(bus)
+    _stats.counters["reloads"] += 1
+    _stats.reload_duration.observe(time.monotonic() - start)
+    _logger.info("Reloaded services in %.3f seconds", time.monotonic() - start)
 
-def _load_services(loop: asyncio.AbstractEventLoop) -> None:  # pragma: no cover
-    """Load services synchronously using _async_load_services.
 
-    This is a synchronous form of the _load_services method. This is called from a
+def _load_services(loop: asyncio.AbstractEventLoop, bus: "MessageBus") -> None:
+    """Load services synchronously using _reload_services.
+
+    This is a synchronous form of the _reload_services method. This is called from a
     signal handler which cannot take coroutines, thus this method will schedule a
-    task to run in the current running loop.
+    task to run in the current running loop, after the reload scheduled last.
 
     Args:
         loop: Asynchronous event loop from main thread.
+        bus: The message bus the daemon receives signals on.
     """
-    loop.call_soon(_async_load_services)
+    global _reload_task
+    _reload_task = loop.create_task(_reload_services(bus, _reload_task))
+
 
+async def _serve_stats(_: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Write the runtime statistics to a client of the stats socket and disconnect it.
+
+    Args:
+        writer: Stream of the client connection.
+    """
+    writer.write(json.dumps(_stats.to_dict()).encode())
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
 
-async def _juju_systemd_notices_daemon() -> None:
+
+async def _juju_systemd_notices_daemon(stats_socket: Optional[Path] = None) -> None:
     """Start Juju systemd notices daemon.
 
     This start call will set up the notices service to listen for events.
-    It connects to the system message bus and registers for signals/events on the
-    org.freedesktop.systemd1.Unit object looking for any PropertyChanged events.
+    It connects to the system message bus and registers a match rule for
+    PropertiesChanged events of each observed org.freedesktop.systemd1.Unit.
     This method additionally sets up signal handlers for various signals to either
     terminate the process or reload the configuration from the hooks directory.
+
+    Args:
+        stats_socket: Unix socket to serve the runtime statistics on.
     """
+    from dbus_fast.aio import MessageBus
+    from dbus_fast.constants import BusType
+
     stop_event = asyncio.Event()
     loop = asyncio.get_event_loop()
     loop.add_signal_handler(signal.SIGINT, stop_event.set)
     loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+
+    sysbus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+    await _reload_services(sysbus)
     # The event loop must be early bound to the lambda, otherwise the event loop
     # will not exist within the lambda when the SIGHUP signal is received
     # by the running notices daemon.
     loop.add_signal_handler(  # pragma: no branch
-        signal.SIGHUP, lambda loop=loop: _load_services(loop)
+        signal.SIGHUP, lambda loop=loop: _load_services(loop, sysbus)
     )
 
-    sysbus = await MessageBus(bus_type=BusType.SYSTEM).connect()
-    await _async_load_services()
-
-    reply = await sysbus.call(
-        Message(
-            destination="org.freedesktop.DBus",
-            path="/org/freedesktop/DBus",
-            interface="org.freedesktop.DBus",
-            member="AddMatch",
-            signature="s",
-            body=[
-                "path_namespace='/org/freedesktop/systemd1/unit',type='signal',"
-                "interface='org.freedesktop.DBus.Properties'"
-            ],
-            serial=sysbus.next_serial(),
-        )
-    )
-    assert reply.message_type == MessageType.METHOD_RETURN
     sysbus.add_message_handler(_systemd_unit_changed)
+    if stats_socket is not None:
+        stats_socket.unlink(missing_ok=True)
+        await asyncio.start_unix_server(_serve_stats, path=str(stats_socket))
+        _logger.info("Serving statistics on %s", stats_socket)
+
     await stop_event.wait()
+    sysbus.disconnect()
 
 
 def _main():
@@ -460,14 +873,21 @@ def _main():
     Raises:
         argparse.ArgumentError: Raised if unit argument is absent.
     """
+    import argparse
+
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--debug", action="store_true")
+    parser.add_argument("--debounce", type=float, default=_DEFAULT_DEBOUNCE)
+    parser.add_argument("--hook-retries", type=int, default=_DEFAULT_HOOK_RETRIES)
+    parser.add_argument("--stats-socket", type=Path)
     parser.add_argument("unit", type=str)
     args = parser.parse_args()
 
     # Intentionally set as global.
-    global _juju_unit
+    global _juju_unit, _debounce, _hook_retries
     _juju_unit = args.unit
+    _debounce = args.debounce
+    _hook_retries = args.hook_retries
 
     console_handler = logging.StreamHandler()
     if args.debug:
@@ -479,7 +899,7 @@ def _main():
 
     _logger.addHandler(console_handler)
     _logger.info("Starting juju systemd notices service")
-    asyncio.run(_juju_systemd_notices_daemon())
+    asyncio.run(_juju_systemd_notices_daemon(args.stats_socket))
 
 
 if __name__ == "__main__":  # pragma: nocover
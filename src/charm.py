@@ -4,31 +4,75 @@
 
 """SlurmdCharm."""
 
+import base64
+import binascii
+import json
 import logging
+from functools import cached_property
 from pathlib import Path
+from typing import TYPE_CHECKING, List
 
-import distro
 from charms.fluentbit.v0.fluentbit import FluentbitClient
+from charms.operator_libs_linux.v0 import juju_systemd_notices
 from charms.operator_libs_linux.v0.juju_systemd_notices import (
+    ServiceFailedEvent,
+    ServiceRestartingEvent,
     ServiceStartedEvent,
+    ServiceStartLimitHitEvent,
     ServiceStoppedEvent,
     SystemdNotices,
 )
 from interface_slurmd import Slurmd
+from interface_slurmd_peer import SlurmdPeer
 from ops.charm import ActionEvent, CharmBase
 from ops.framework import StoredState
 from ops.main import main
 from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
-from slurm_ops_manager import SlurmManager
-from utils import monkeypatch, slurmd
+from utils import base, monkeypatch, nhc, reservation, slurmd, systemd_dbus
+from utils.health import MUNGED, HealthCache
+from utils.profiling import HookProfiler, observed_handlers
+from utils.reconcile import (
+    DAEMON_RELOAD,
+    RESTART_MUNGE,
+    RESTART_SLURMD,
+    Artifact,
+    Plan,
+    Reconciler,
+)
+
+if TYPE_CHECKING:  # pragma: nocover
+    from slurm_ops_manager import SlurmManager
 
 logger = logging.getLogger(__name__)
-if distro.id() == "centos":
+juju_systemd_notices = monkeypatch.juju_systemd_notices_dbus(juju_systemd_notices)
+if base.os_id() == "centos":
     logger.debug("Monkeypatching slurmd operator to support CentOS base")
     SystemdNotices = monkeypatch.juju_systemd_notices(SystemdNotices)
     slurmd = monkeypatch.slurmd_override_default(slurmd)
     slurmd = monkeypatch.slurmd_override_service(slurmd)
 
+MUNGE_KEY = Path("/etc/munge/munge.key")
+
+
+def _format_action_results(results: dict) -> dict:
+    """Format a nested dictionary so that it can be returned as action results.
+
+    Juju does not like underscores in dictionary keys. Lists of dictionaries
+    are keyed by their index, and other lists are rendered as space-separated
+    strings.
+    """
+    formatted = {}
+    for key, value in results.items():
+        if isinstance(value, list) and all(isinstance(v, dict) for v in value):
+            value = dict(enumerate(value))
+        if isinstance(value, dict):
+            value = _format_action_results(value)
+        elif isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        formatted[str(key).replace("_", "-")] = value
+
+    return formatted
+
 
 class SlurmdCharm(CharmBase):
     """Slurmd lifecycle events."""
@@ -40,28 +84,41 @@ class SlurmdCharm(CharmBase):
         super().__init__(*args, **kwargs)
 
         self._stored.set_default(
-            nhc_conf=str(),
             slurm_installed=False,
             slurmctld_available=False,
             slurmctld_started=False,
             cluster_name=str(),
         )
 
-        self._slurm_manager = SlurmManager(self, "slurmd")
         self._fluentbit = FluentbitClient(self, "fluentbit")
         # interface to slurmctld, should only have one slurmctld per slurmd app
-        self._slurmd = Slurmd(self, "slurmd")
-        self._systemd_notices = SystemdNotices(self, ["slurmd"])
+        self._slurmd_peer = SlurmdPeer(self, "slurmd-peers")
+        self._slurmd = Slurmd(
+            self, "slurmd", peer=self._slurmd_peer, reservation=self.system_reservation
+        )
+        self._systemd_notices = SystemdNotices(self, ["slurmd", "munge"])
+        self._health = HealthCache(ttl=self.config.get("health-check-ttl", 0))
+        self._profiler = HookProfiler(self.config.get("hook-profiling", ""))
 
         event_handler_bindings = {
             self.on.install: self._on_install,
             self.on.upgrade_charm: self._on_upgrade,
+            self.on.post_series_upgrade: self._on_post_series_upgrade,
             self.on.update_status: self._on_update_status,
             self.on.config_changed: self._on_config_changed,
             self.on.service_slurmd_started: self._on_slurmd_started,
             self.on.service_slurmd_stopped: self._on_slurmd_stopped,
+            self.on.service_slurmd_failed: self._on_slurmd_failed,
+            self.on.service_slurmd_restarting: self._on_slurmd_restarting,
+            self.on.service_slurmd_start_limit_hit: self._on_slurmd_start_limit_hit,
+            self.on.service_munge_started: self._on_munge_started,
+            self.on.service_munge_stopped: self._on_munge_stopped,
+            self.on.service_munge_failed: self._on_munge_failed,
+            self.on.service_munge_start_limit_hit: self._on_munge_start_limit_hit,
             self._slurmd.on.slurmctld_available: self._on_slurmctld_available,
             self._slurmd.on.slurmctld_unavailable: self._on_slurmctld_unavailable,
+            self._slurmd.on.nhc_params_changed: self._on_nhc_params_changed,
+            self._slurmd_peer.on.restart_granted: self._on_restart_granted,
             # fluentbit
             self.on["fluentbit"].relation_created: self._on_configure_fluentbit,
             # actions
@@ -70,12 +127,27 @@ class SlurmdCharm(CharmBase):
             self.on.get_node_inventory_action: self._on_get_node_inventory_action,
             self.on.set_node_inventory_action: self._on_set_node_inventory_action,
             self.on.show_nhc_config_action: self._on_show_nhc_config,
+            self.on.reconcile_action: self._on_reconcile_action,
+            self.on.notices_stats_action: self._on_notices_stats_action,
+            self.on.hook_profile_action: self._on_hook_profile_action,
+            self.on.nhc_profile_action: self._on_nhc_profile_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
+        self._profiler.instrument(
+            [*event_handler_bindings.values(), *observed_handlers(self._slurmd)]
+        )
+
+    @cached_property
+    def _slurm_manager(self) -> "SlurmManager":
+        """Return the slurm operations manager, imported by the hooks that need it."""
+        from slurm_ops_manager import SlurmManager
+
+        return SlurmManager(self, "slurmd")
 
     def _on_install(self, event):
         """Perform installation operations for slurmd."""
+        base.save()
         try:
             nhc_path = self.model.resources.fetch("nhc")
             logger.debug(f"## Found nhc resource: {nhc_path}")
@@ -90,11 +162,12 @@ class SlurmdCharm(CharmBase):
         successful_installation = self._slurm_manager.install(
             self.config.get("custom-slurm-repo"), nhc_path
         )
-        slurmd.override_service()
         logger.debug(f"### slurmd installed: {successful_installation}")
 
         if successful_installation:
             self._stored.slurm_installed = True
+            self._reconcile()
+            self._slurmd.cache_inventory()
             self._systemd_notices.subscribe()
         else:
             self.unit.status = BlockedStatus("Error installing slurmd")
@@ -104,21 +177,148 @@ class SlurmdCharm(CharmBase):
 
     def _on_configure_fluentbit(self, event):
         """Set up Fluentbit log forwarding."""
-        self._configure_fluentbit()
+        self._reconcile()
+
+    def _artifacts(self) -> List[Artifact]:
+        """Return the desired state of every charm managed artifact."""
+        artifacts = [
+            Artifact(
+                "slurmd-service-override",
+                slurmd.service_override(),
+                slurmd.SERVICE_OVERRIDE,
+                (DAEMON_RELOAD, RESTART_SLURMD),
+            ),
+            # slurmd runs the wrapper as its HealthCheckProgram, so it applies to the next run.
+            Artifact(
+                "nhc-wrapper",
+                nhc.wrapper(
+                    self._slurmd.nhc_params,
+                    self.config.get("nhc-budget", 0),
+                    slurmd.PYTHON_EXE,
+                ),
+                nhc.WRAPPER,
+                mode=0o755,
+            ),
+            Artifact("nhc-timing", nhc.timing_script(), nhc.TIMING_SCRIPT),
+            # The start window only applies to the next start of slurmd after boot.
+            Artifact(
+                "slurmd-start-window",
+                slurmd.start_window_file(self.config.get("start-delay-window", 0)),
+                slurmd.START_WINDOW_FILE,
+            ),
+        ]
+
+        if self._stored.slurmctld_available:
+            artifacts.append(
+                Artifact(
+                    "slurmd-default",
+                    slurmd.default_file(
+                        self._slurmd.slurmctld_hostname, self._slurmd.slurmctld_port
+                    ),
+                    slurmd.DEFAULT_FILE,
+                    (RESTART_SLURMD,),
+                )
+            )
+            if munge_key := self._slurmd.get_stored_munge_key():
+                artifacts.append(self._munge_key_artifact(munge_key))
+
+        if nhc_conf := self.config.get("nhc-conf"):
+            artifacts.append(
+                Artifact(
+                    "nhc-conf",
+                    nhc_conf,
+                    write=lambda: self._slurm_manager.render_nhc_config(nhc_conf),
+                )
+            )
 
-    def _configure_fluentbit(self):
-        logger.debug("## Configuring fluentbit")
-        cfg = []
-        cfg.extend(self._slurm_manager.fluentbit_config_nhc)
-        cfg.extend(self._slurm_manager.fluentbit_config_slurm)
-        self._fluentbit.configure(cfg)
+        # Only set up fluentbit if we have a relation to it.
+        if (relation := self._fluentbit._relation) is not None:
+            cfg = []
+            cfg.extend(self._slurm_manager.fluentbit_config_nhc)
+            cfg.extend(self._slurm_manager.fluentbit_config_slurm)
+            # The relation id is part of the inputs so that a new relation is configured.
+            artifacts.append(
+                Artifact(
+                    "fluentbit",
+                    json.dumps({"relation": relation.id, "config": cfg}, sort_keys=True),
+                    write=lambda: self._fluentbit.configure(cfg),
+                )
+            )
+
+        return artifacts
+
+    def _munge_key_artifact(self, munge_key: str) -> Artifact:
+        """Return the desired munge key, compared against the key on disk."""
+        try:
+            key, path = base64.b64decode(munge_key, validate=True), MUNGE_KEY
+        except binascii.Error:
+            # Fall back to tracking the key from the relation data.
+            key, path = munge_key, None
+
+        return Artifact(
+            "munge-key",
+            key,
+            path,
+            (RESTART_MUNGE, RESTART_SLURMD),
+            mode=0o400,
+            write=lambda: self._configure_munge_key(munge_key),
+        )
+
+    def _configure_munge_key(self, munge_key: str) -> None:
+        """Write the munge key, munged must be checked again afterwards."""
+        self._slurm_manager.configure_munge_key(munge_key)
+        self._health.invalidate(MUNGED)
+
+    def _reconcile(self, dry_run: bool = False) -> Plan:
+        """Bring the managed artifacts to their desired state with minimal actions.
+
+        Args:
+            dry_run: Only return the plan without changing anything.
+        """
+        reconciler = Reconciler(self._artifacts())
+        if dry_run:
+            return reconciler.plan()
+
+        plan = reconciler.apply(
+            {
+                DAEMON_RELOAD: systemd_dbus.daemon_reload,
+                RESTART_MUNGE: self._restart_munge,
+                RESTART_SLURMD: self._restart_slurmd,
+            }
+        )
+        if plan:
+            logger.info(f"## Reconciled {plan.changed} with actions {plan.actions}")
+        return plan
 
     def _on_upgrade(self, event):
         """Perform upgrade operations."""
+        # Units installed by earlier revisions have no cached base yet.
+        base.save()
         self.unit.set_workload_version(Path("version").read_text().strip())
+        if self._stored.slurm_installed:
+            # Create the hooks of new service events and run the upgraded notices daemon.
+            self._systemd_notices.stop()
+            self._systemd_notices.subscribe()
+
+    def _on_nhc_params_changed(self, _):
+        """Render the new NHC params in the NHC wrapper."""
+        if self._stored.slurm_installed:
+            self._reconcile()
+
+    def _on_post_series_upgrade(self, _):
+        """Cache the new base of the machine."""
+        base.save()
 
     def _on_update_status(self, event):
         """Handle update status."""
+        if self._stored.slurm_installed and self._slurmd.publish_inventory_drift():
+            logger.info("## Node hardware changed - published updated inventory")
+            self._slurmd.publish_reservation(self.system_reservation())
+        if self._slurmd_peer.pending:
+            self._slurmd_peer.publish_fleet_inventory()
+        # Reclaim restart slots of units that did not restart in time.
+        if self._slurmd_peer.restarts_in_progress:
+            self._slurmd_peer.schedule_restarts()
         self._check_status()
 
     def _check_status(self) -> bool:
@@ -133,6 +333,12 @@ class SlurmdCharm(CharmBase):
             self.unit.status = BlockedStatus("Error installing slurmd")
             return False
 
+        if self.config.get("start-delay-window", 0) > slurmd.MAX_START_WINDOW:
+            self.unit.status = BlockedStatus(
+                f"start-delay-window must be at most {slurmd.MAX_START_WINDOW} seconds"
+            )
+            return False
+
         if not self._slurmd.is_joined:
             self.unit.status = BlockedStatus("Need relations: slurmctld")
             return False
@@ -141,7 +347,7 @@ class SlurmdCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting on: slurmctld")
             return False
 
-        if not self._slurm_manager.check_munged():
+        if not self._health.check(MUNGED, lambda: self._slurm_manager.check_munged()):
             self.unit.status = BlockedStatus("Error configuring munge key")
             return False
 
@@ -159,47 +365,107 @@ class SlurmdCharm(CharmBase):
 
         logger.debug("#### Slurmctld available - setting overrides for configless")
         self._set_slurmctld_available(True)
-        # Get slurmctld host:port from relation and override systemd services.
-        slurmd.override_default(self._slurmd.slurmctld_hostname, self._slurmd.slurmctld_port)
+        self._health.invalidate(MUNGED)
         self._on_set_partition_info_on_app_relation_data(event)
-        self._write_munge_key_and_restart_munge()
-        # Only set up fluentbit if we have a relation to it.
-        if self._fluentbit._relation is not None:
-            self._configure_fluentbit()
-        slurmd.restart()
+        # Get slurmctld host:port and munge key from relation and only restart
+        # the services whose inputs changed.
+        if RESTART_SLURMD not in self._reconcile().actions:
+            # slurmd may have been stopped while slurmctld was unavailable.
+            slurmd.start()
         self._check_status()
 
+    def _restart_slurmd(self):
+        """Restart slurmd if it is configured."""
+        if not self._stored.slurmctld_available:
+            return
+        # Restart in batches coordinated by the leader if rolling restarts are enabled.
+        if not self._slurmd_peer.request_restart():
+            slurmd.restart()
+
+    def _on_restart_granted(self, _):
+        """Restart slurmd once the leader granted this unit a restart slot."""
+        logger.debug("## Restart slot granted - restarting slurmd")
+        slurmd.restart()
+        # The restart job only finishes once slurmd is ready. A fast restart is
+        # debounced by the notices daemon and may not notify slurmd-started.
+        self._slurmd_peer.restart_completed()
+
     def _on_slurmctld_unavailable(self, event):
         logger.debug("## Slurmctld unavailable")
         self._set_slurmctld_available(False)
+        self._health.invalidate(MUNGED)
         slurmd.stop()
         self._check_status()
 
     def _on_slurmd_started(self, _: ServiceStartedEvent) -> None:
         """Handle event emitted by systemd after slurmd daemon successfully starts."""
+        self._slurmd_peer.restart_completed()
         self.unit.status = ActiveStatus()
 
     def _on_slurmd_stopped(self, _: ServiceStoppedEvent) -> None:
         """Handle event emitted by systemd after slurmd daemon is stopped."""
         self.unit.status = BlockedStatus("slurmd not running")
 
+    def _on_slurmd_failed(self, event: ServiceFailedEvent) -> None:
+        """Handle event emitted by systemd after slurmd daemon failed."""
+        logger.error(f"## slurmd failed: {event.result}")
+        self.unit.status = BlockedStatus(f"slurmd failed: {event.result}")
+
+    def _on_slurmd_restarting(self, _: ServiceRestartingEvent) -> None:
+        """Handle event emitted by systemd while it waits to restart a failed slurmd."""
+        self.unit.status = WaitingStatus("slurmd restarting")
+
+    def _on_slurmd_start_limit_hit(self, _: ServiceStartLimitHitEvent) -> None:
+        """Handle event emitted by systemd after it gave up restarting slurmd."""
+        logger.error("## slurmd failed too often, systemd stopped restarting it")
+        self.unit.status = BlockedStatus("slurmd failed too often, see journalctl -u slurmd")
+
+    def _on_munge_started(self, _: ServiceStartedEvent) -> None:
+        """Handle event emitted by systemd after munged starts."""
+        self._health.invalidate(MUNGED)
+        if self._check_status() and systemd_dbus.service_running("slurmd"):
+            self.unit.status = ActiveStatus()
+
+    def _on_munge_stopped(self, _: ServiceStoppedEvent) -> None:
+        """Handle event emitted by systemd after munged is stopped."""
+        self._health.invalidate(MUNGED)
+        self.unit.status = BlockedStatus("munged not running")
+
+    def _on_munge_failed(self, event: ServiceFailedEvent) -> None:
+        """Handle event emitted by systemd after munged failed.
+
+        Jobs cannot launch on this node without munged, so it is restarted
+        right away instead of on the next update-status.
+        """
+        logger.error(f"## munged failed: {event.result}")
+        self.unit.status = BlockedStatus(f"munged failed: {event.result}")
+        self._restart_munge()
+
+    def _on_munge_start_limit_hit(self, _: ServiceStartLimitHitEvent) -> None:
+        """Handle event emitted by systemd after it gave up restarting munged."""
+        logger.error("## munged failed too often, systemd stopped restarting it")
+        self._health.invalidate(MUNGED)
+        self.unit.status = BlockedStatus("munged failed too often, see journalctl -u munge")
+
     def _on_config_changed(self, event):
         """Handle charm configuration changes."""
         if self.model.unit.is_leader():
             logger.debug("## slurmd config changed - leader")
             self._on_set_partition_info_on_app_relation_data(event)
+            if self._slurmd_peer.enabled:
+                self._slurmd_peer.publish_fleet_inventory(force=True)
+            elif self._slurmd.fleet_inventory:
+                self._slurmd.fleet_inventory = {}
 
-        nhc_conf = self.model.config.get("nhc-conf")
-        if nhc_conf:
-            if nhc_conf != self._stored.nhc_conf:
-                self._stored.nhc_conf = nhc_conf
-                self._slurm_manager.render_nhc_config(nhc_conf)
+        if self._slurmd.is_joined:
+            self._slurmd.sync_node_inventory()
+            self._slurmd.publish_reservation(self.system_reservation())
 
-    def _write_munge_key_and_restart_munge(self):
-        logger.debug("#### slurmd charm - writing munge key")
-
-        self._slurm_manager.configure_munge_key(self._slurmd.get_stored_munge_key())
+        if self._stored.slurm_installed:
+            self._reconcile()
 
+    def _restart_munge(self):
+        self._health.invalidate(MUNGED)
         if self._slurm_manager.restart_munged():
             logger.debug("## Munge restarted successfully")
         else:
@@ -229,28 +495,53 @@ class SlurmdCharm(CharmBase):
         inventory = self._slurmd.node_inventory
         logger.debug(f"### Node inventory: {inventory}")
 
-        # Juju does not like underscores in dictionaries
-        inv = {k.replace("_", "-"): v for k, v in inventory.items()}
-        event.set_results(inv)
+        event.set_results(_format_action_results(inventory))
 
     def _on_set_node_inventory_action(self, event):
         """Overwrite the node inventory."""
         inventory = self._slurmd.node_inventory
 
-        # update local copy of inventory
-        memory = event.params.get("real-memory", inventory["real_memory"])
-        inventory["real_memory"] = memory
-
-        # send it to slurmctld
-        self._slurmd.node_inventory = inventory
+        # The inventory is sent to slurmctld when the hook commits.
+        inventory.real_memory = event.params.get("real-memory", inventory.real_memory)
 
-        event.set_results({"real-memory": memory})
+        event.set_results({"real-memory": inventory.real_memory})
 
     def _on_show_nhc_config(self, event):
         """Show current nhc.conf."""
         nhc_conf = self._slurm_manager.get_nhc_config()
         event.set_results({"nhc.conf": nhc_conf})
 
+    def _on_reconcile_action(self, event):
+        """Apply, or only show, the changes to the charm managed artifacts."""
+        plan = self._reconcile(dry_run=event.params.get("dry-run", False))
+        event.set_results(_format_action_results(plan.to_dict()))
+
+    def _on_notices_stats_action(self, event):
+        """Return the runtime statistics of the systemd notices daemon."""
+        try:
+            stats = self._systemd_notices.stats()
+        except (OSError, ValueError) as e:
+            event.fail(f"Unable to read systemd notices statistics: {e}")
+            return
+
+        event.set_results(_format_action_results(stats))
+
+    def _on_hook_profile_action(self, event):
+        """Return percentiles of the profiled handler runs per event."""
+        summary = self._profiler.summary(event.params.get("event") or None)
+        if not summary:
+            event.fail("No profiled handler runs, enable them with the hook-profiling config")
+            return
+        event.set_results(_format_action_results(summary))
+
+    def _on_nhc_profile_action(self, event):
+        """Return the slowest NHC checks and percentiles of the NHC runs."""
+        summary = nhc.summary(top=event.params.get("top", 5))
+        if not summary:
+            event.fail("No NHC runs recorded yet")
+            return
+        event.set_results(_format_action_results(summary))
+
     def _on_set_partition_info_on_app_relation_data(self, event):
         """Set the slurm partition info on the application relation data."""
         # Only the leader can set data on the relation.
@@ -271,6 +562,12 @@ class SlurmdCharm(CharmBase):
             else:
                 event.defer()
 
+    def system_reservation(self) -> dict:
+        """Return the inventory fields reserving cores and memory for the system daemons."""
+        return reservation.compute(
+            self.config.get("reserved-cores", 0), self.config.get("reserved-memory", 0)
+        )
+
     @property
     def hostname(self) -> str:
         """Return the hostname."""
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """Slurmd."""
+
 import json
 import logging
+from typing import Any, Callable, Iterator, List, Optional, Set
 
 from ops.framework import (
     EventBase,
@@ -10,12 +12,121 @@ from ops.framework import (
     ObjectEvents,
     StoredState,
 )
+from interface_slurmd_peer import SlurmdPeer
 from ops.model import Relation
-from utils import machine
+from utils.inventory import InventoryCache
+from utils.reservation import FIELDS
 
 logger = logging.getLogger(__name__)
 
 
+class NodeInventory:
+    """Node inventory published on the unit relation data.
+
+    The inventory tracks which fields are modified so that it is only
+    written back to the relation data when something changed.
+    """
+
+    __slots__ = ("_data", "_changed")
+
+    def __init__(self, data: Optional[dict] = None) -> None:
+        self._data = dict(data or {})
+        self._changed = set()
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> "NodeInventory":
+        """Load the inventory from its serialized form on the relation data."""
+        return cls(json.loads(raw) if raw else None)
+
+    def to_json(self) -> str:
+        """Serialize the inventory for the relation data."""
+        return json.dumps(self._data)
+
+    def to_dict(self) -> dict:
+        """Return a copy of the inventory as a dictionary."""
+        return dict(self._data)
+
+    @property
+    def changed(self) -> Set[str]:
+        """Return the fields modified since the inventory was loaded."""
+        return set(self._changed)
+
+    def __repr__(self) -> str:
+        """Return the representation of the inventory."""
+        return f"NodeInventory({self._data!r})"
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the value of a field."""
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        """Set a field, recording it as changed if the value differs."""
+        if key not in self._data or self._data[key] != value:
+            self._data[key] = value
+            self._changed.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        """Return True if the field is set."""
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the fields of the inventory."""
+        return iter(self._data)
+
+    def __eq__(self, other: Any) -> bool:
+        """Compare the fields with another inventory or dictionary."""
+        if isinstance(other, NodeInventory):
+            other = other._data
+        return self._data == other
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value of a field, or `default` if it is not set."""
+        return self._data.get(key, default)
+
+    def items(self):
+        """Return the fields and values of the inventory."""
+        return self._data.items()
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove a field from the inventory and return its value."""
+        if key in self._data:
+            self._changed.add(key)
+        return self._data.pop(key, default)
+
+    def update(self, other: dict) -> None:
+        """Update multiple fields of the inventory."""
+        for key, value in other.items():
+            self[key] = value
+
+    @property
+    def node_name(self) -> str:
+        """Return the NodeName of the unit."""
+        return self._data.get("node_name", "")
+
+    @property
+    def node_addr(self) -> str:
+        """Return the NodeAddr of the unit."""
+        return self._data.get("node_addr", "")
+
+    @property
+    def real_memory(self) -> int:
+        """Return the RealMemory of the node in MB."""
+        return int(self._data.get("real_memory", 0))
+
+    @real_memory.setter
+    def real_memory(self, value: int) -> None:
+        self["real_memory"] = int(value)
+
+    @property
+    def new_node(self) -> bool:
+        """Return True if the node has not been configured yet."""
+        return bool(self._data.get("new_node", False))
+
+    @new_node.setter
+    def new_node(self, value: bool) -> None:
+        self["new_node"] = bool(value)
+
+
 class SlurmctldAvailableEvent(EventBase):
     """Emitted when slurmctld is available."""
 
@@ -24,24 +135,49 @@ class SlurmctldUnavailableEvent(EventBase):
     """Emit when the relation to slurmctld is broken."""
 
 
+class NhcParamsChangedEvent(EventBase):
+    """Emitted when slurmctld changes the NHC params."""
+
+
 class SlurmdEvents(ObjectEvents):
     """Slurmd emitted events."""
 
     slurmctld_available = EventSource(SlurmctldAvailableEvent)
     slurmctld_unavailable = EventSource(SlurmctldUnavailableEvent)
+    nhc_params_changed = EventSource(NhcParamsChangedEvent)
 
 
 class Slurmd(Object):
-    """Slurmd."""
+    """Slurmd.
+
+    Args:
+        charm: Charm the interface belongs to.
+        relation_name: Name of the slurmd relation.
+        peer: Peer interface the inventory is published on in fleet
+            inventory mode. Without it, the inventory is always published on
+            the slurmd relation.
+        reservation: Callable returning the inventory fields reserving cores
+            and memory for the system, set when the relation is created.
+    """
 
     _stored = StoredState()
     on = SlurmdEvents()
 
-    def __init__(self, charm, relation_name):
+    def __init__(
+        self,
+        charm,
+        relation_name,
+        peer: Optional[SlurmdPeer] = None,
+        reservation: Optional[Callable[[], dict]] = None,
+    ):
         """Set initial data and observe interface events."""
         super().__init__(charm, relation_name)
         self._charm = charm
         self._relation_name = relation_name
+        self._peer = peer
+        self._reservation = reservation or dict
+        self._inventory_cache = InventoryCache()
+        self._inventory = None
 
         self._stored.set_default(
             munge_key=str(),
@@ -71,18 +207,23 @@ class Slurmd(Object):
             self._on_relation_broken,
         )
 
+        # Write the node inventory to the relation data once, when the hook commits.
+        self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
+
     def _on_relation_created(self, event):
         """Handle the relation-created event.
 
         Set the node inventory on the relation data.
         """
-        # Generate the inventory and set it on the relation data.
-        node_name = self._charm.hostname
-        node_addr = event.relation.data[self.model.unit]["ingress-address"]
-
-        inv = machine.get_inventory(node_name, node_addr)
-        inv["new_node"] = True
-        self.node_inventory = inv
+        # Build the inventory from the cached hardware and set it on the relation data.
+        self.node_inventory = {
+            "node_name": self._charm.hostname,
+            "node_addr": event.relation.data[self.model.unit]["ingress-address"],
+            "state": "UNKNOWN",
+            **self._inventory_cache.hardware,
+            **self._reservation(),
+            "new_node": True,
+        }
 
     def _on_relation_joined(self, event):
         """Handle the relation-joined event.
@@ -121,7 +262,8 @@ class Slurmd(Object):
         - tls parameters changed
         """
         app_data = event.relation.data[event.app]
-        self._store_nhc_params(app_data.get("nhc_params"))
+        if self._store_nhc_params(app_data.get("nhc_params")):
+            self.on.nhc_params_changed.emit()
 
     def _on_relation_broken(self, event):
         """Perform relation broken operations."""
@@ -151,26 +293,123 @@ class Slurmd(Object):
         return self._stored.slurmctld_port
 
     @property
-    def node_inventory(self) -> dict:
-        """Return unit inventory."""
-        return json.loads(self._relation.data[self.model.unit]["inventory"])
+    def _inventory_relations(self) -> List[Relation]:
+        """Return the relations the unit inventory may be published on.
+
+        The first relation is where the inventory is published. In fleet
+        inventory mode this is the peer relation, and the leader aggregates
+        the inventories of all units.
+        """
+        if self._peer is None:
+            return [relation for relation in [self._relation] if relation]
+
+        relations = [self._relation, self._peer.relation]
+        if self._peer.enabled:
+            relations.reverse()
+
+        return [relation for relation in relations if relation]
+
+    @property
+    def node_inventory(self) -> NodeInventory:
+        """Return unit inventory.
+
+        The inventory is read from the relation data once per hook.
+        Modifications are written back when the hook commits.
+        """
+        if self._inventory is None:
+            raws = [r.data[self.model.unit].get("inventory") for r in self._inventory_relations]
+            if not raws or raws[0] or not any(raws):
+                self._inventory = NodeInventory.from_json(raws[0] if raws else None)
+            else:
+                # The fleet inventory mode was toggled, so move the inventory.
+                self._inventory = NodeInventory()
+                self._inventory.update(json.loads(next(raw for raw in raws if raw)))
+
+        return self._inventory
 
     @node_inventory.setter
     def node_inventory(self, inventory: dict):
         """Set unit inventory."""
-        self._relation.data[self.model.unit]["inventory"] = json.dumps(inventory)
+        current = self.node_inventory
+        for key in [key for key in current if key not in inventory]:
+            current.pop(key)
+        current.update(inventory)
+
+    def sync_node_inventory(self) -> None:
+        """Move the unit inventory to the relation matching the fleet inventory mode."""
+        # Loading the inventory marks it as changed if it is found on the other relation.
+        _ = self.node_inventory
+
+    def _on_pre_commit(self, _) -> None:
+        """Write the node inventory to the relation data if it was modified."""
+        inventory, self._inventory = self._inventory, None
+        if inventory is None or not inventory.changed or not self._inventory_relations:
+            return
+
+        logger.debug(f"## Publishing node inventory fields: {sorted(inventory.changed)}")
+        relation, *others = self._inventory_relations
+        relation.data[self.model.unit]["inventory"] = inventory.to_json()
+        for other in others:
+            other.data[self.model.unit].pop("inventory", None)
+
+        # The leader is not notified of changes to its own unit data.
+        if self._peer is not None and relation == self._peer.relation:
+            self._peer.publish_fleet_inventory()
 
     @property
     def new_node(self) -> bool:
         """Get `new_node` value in integration data."""
-        return self.node_inventory["new_node"]
+        return self.node_inventory.new_node
 
     @new_node.setter
     def new_node(self, value: bool) -> None:
         """Update `new_node` field in integration data."""
+        self.node_inventory.new_node = value
+
+    def cache_inventory(self) -> None:
+        """Probe the node hardware and store it in the inventory cache."""
+        self._inventory_cache.refresh()
+
+    def publish_inventory_drift(self) -> bool:
+        """Re-probe the node hardware and publish it if it changed.
+
+        Only the fields that changed are updated in the inventory, so values
+        overridden with the `set-node-inventory` action are kept unless the
+        underlying hardware changed.
+
+        Returns:
+            True if an updated inventory was published.
+        """
+        if not (changes := self._inventory_cache.refresh()):
+            return False
+
         inv = self.node_inventory
-        inv["new_node"] = value
-        self.node_inventory = inv
+        if "node_name" not in inv:
+            return False
+
+        for key, value in changes.items():
+            if value is None:
+                inv.pop(key)
+            else:
+                inv[key] = value
+        return True
+
+    def publish_reservation(self, reservation: dict) -> None:
+        """Set the cores and memory reserved for the system in the inventory.
+
+        Args:
+            reservation: Fields of `utils.reservation.FIELDS` to set. The
+                other fields are removed.
+        """
+        inv = self.node_inventory
+        if "node_name" not in inv:
+            return
+
+        for key in FIELDS:
+            if key in reservation:
+                inv[key] = reservation[key]
+            else:
+                inv.pop(key)
 
     def set_partition_info_on_app_relation_data(self, partition_info):
         """Set the slurmd partition on the app relation data.
@@ -184,17 +423,48 @@ class Slurmd(Object):
         for relation in relations:
             relation.data[self.model.app]["partition_info"] = json.dumps(partition_info)
 
+    @property
+    def fleet_inventory(self) -> dict:
+        """Return the fleet inventory published on the application relation data."""
+        if not self._relation or not (
+            raw := self._relation.data[self.model.app].get("fleet_inventory")
+        ):
+            return {}
+        return json.loads(raw)
+
+    @fleet_inventory.setter
+    def fleet_inventory(self, fleet: dict) -> None:
+        """Set the fleet inventory on the application relation data.
+
+        An empty fleet removes the payload from the relation data.
+        """
+        for relation in self._charm.framework.model.relations["slurmd"]:
+            if fleet:
+                relation.data[self.model.app]["fleet_inventory"] = json.dumps(fleet)
+            else:
+                relation.data[self.model.app].pop("fleet_inventory", None)
+
     def _store_munge_key(self, munge_key: str):
         """Store the munge_key in the StoredState."""
         self._stored.munge_key = munge_key
 
-    def _store_nhc_params(self, params: str):
-        """Store the NHC params."""
-        if params != self._stored.nhc_params:
-            self._stored.nhc_params = params
+    def _store_nhc_params(self, params: str) -> bool:
+        """Store the NHC params, the charm renders them in the NHC wrapper.
+
+        Returns:
+            True if the params changed.
+        """
+        if params == self._stored.nhc_params:
+            return False
 
-            logger.debug(f"## rendering /usr/sbin/omni-nhc-wrapper: {params}")
-            self._charm._slurm_manager.render_nhc_wrapper(params)
+        logger.debug(f"## NHC params changed: {params}")
+        self._stored.nhc_params = params
+        return True
+
+    @property
+    def nhc_params(self) -> str:
+        """Return the arguments of nhc-wrapper set by slurmctld."""
+        return self._stored.nhc_params or ""
 
     @property
     def slurmctld_address(self) -> str:
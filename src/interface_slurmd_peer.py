@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""SlurmdPeer."""
+
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from ops.framework import EventBase, EventSource, Object, ObjectEvents, StoredState
+from ops.model import Relation
+
+from utils.nodeset import group_node_sets
+
+logger = logging.getLogger(__name__)
+
+# Increment when the layout of the fleet inventory payload changes.
+FLEET_INVENTORY_VERSION = 1
+# Seconds after which a restart slot is reclaimed from a unit that never
+# reported slurmd as started. Matches the timeout of the slurmd wrapper.
+RESTART_TIMEOUT = 900
+
+
+class RestartGrantedEvent(EventBase):
+    """Emitted when the leader grants this unit a slot to restart slurmd."""
+
+
+class SlurmdPeerEvents(ObjectEvents):
+    """SlurmdPeer emitted events."""
+
+    restart_granted = EventSource(RestartGrantedEvent)
+
+
+class SlurmdPeer(Object):
+    """Aggregate the inventory of every slurmd unit on the leader.
+
+    When the `fleet-inventory` option is enabled, each unit publishes its
+    inventory in its peer relation data instead of the slurmd relation. The
+    leader collects them and publishes one versioned payload on the slurmd
+    application relation data, at most once per `fleet-inventory-window`
+    seconds, so that slurmctld reconfigures once per batch of joining nodes.
+    Nodes with the same hardware are also grouped into hostlist node sets that
+    slurmctld can render as one node definition each.
+
+    The leader also coordinates rolling restarts of slurmd. Units request a
+    restart in their peer relation data, and the leader grants at most
+    `restart-concurrency` restart slots at a time on the peer application
+    data. A slot is released once the unit reports that systemd started
+    slurmd again, so that the next batch only restarts once the previous
+    batch is back online.
+    """
+
+    on = SlurmdPeerEvents()
+    _stored = StoredState()
+
+    def __init__(self, charm, relation_name):
+        """Set initial data and observe interface events."""
+        super().__init__(charm, relation_name)
+        self._charm = charm
+        self._relation_name = relation_name
+
+        self._stored.set_default(
+            fleet_serial=0,
+            fleet_published=0.0,
+            fleet_pending=False,
+            restart_token=0,
+            restart_granted=0,
+            restart_expired={},
+        )
+
+        self.framework.observe(
+            self._charm.on[self._relation_name].relation_changed,
+            self._on_relation_changed,
+        )
+
+        self.framework.observe(
+            self._charm.on[self._relation_name].relation_departed,
+            self._on_relation_changed,
+        )
+
+    def _on_relation_changed(self, event):
+        """Publish the fleet inventory and schedule restarts when peers change."""
+        self.publish_fleet_inventory()
+        self.schedule_restarts()
+        self._restart_if_granted()
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if fleet inventory mode is enabled."""
+        return bool(self._charm.config.get("fleet-inventory"))
+
+    @property
+    def relation(self) -> Optional[Relation]:
+        """Return the peer relation."""
+        return self.framework.model.get_relation(self._relation_name)
+
+    def collect(self) -> List[dict]:
+        """Return the inventories of all units, ordered by node name."""
+        if not (relation := self.relation):
+            return []
+
+        inventories = []
+        for unit in {self.model.unit, *relation.units}:
+            if raw := relation.data[unit].get("inventory"):
+                inventories.append(json.loads(raw))
+
+        return sorted(inventories, key=lambda inv: inv.get("node_name", ""))
+
+    def publish_fleet_inventory(self, force: bool = False) -> bool:
+        """Publish the aggregated inventory on the slurmd application relation data.
+
+        Changes arriving within `fleet-inventory-window` seconds of the last
+        publish are held back and published by a later event, such as
+        update-status.
+
+        Args:
+            force: Publish even if the join window has not elapsed yet.
+
+        Returns:
+            True if an updated fleet inventory was published.
+        """
+        if not self.model.unit.is_leader() or not self.enabled:
+            return False
+
+        window = int(self._charm.config.get("fleet-inventory-window", 0))
+        if not force and time.time() - self._stored.fleet_published < window:
+            logger.debug("## Fleet inventory changed within join window - deferring publish")
+            self._stored.fleet_pending = True
+            return False
+
+        nodes = self.collect()
+        self._stored.fleet_pending = False
+        self._stored.fleet_published = time.time()
+        current = self._charm._slurmd.fleet_inventory
+        if current and current.get("nodes") == nodes:
+            return False
+
+        self._stored.fleet_serial += 1
+        logger.debug(
+            f"## Publishing fleet inventory {self._stored.fleet_serial}: {len(nodes)} nodes"
+        )
+        self._charm._slurmd.fleet_inventory = {
+            "version": FLEET_INVENTORY_VERSION,
+            "serial": self._stored.fleet_serial,
+            "nodes": nodes,
+            "node_sets": group_node_sets(
+                nodes, float(self._charm.config.get("node-set-memory-tolerance", 0))
+            ),
+        }
+        return True
+
+    @property
+    def pending(self) -> bool:
+        """Return True if a fleet inventory change is waiting to be published."""
+        return self._stored.fleet_pending
+
+    @property
+    def restart_concurrency(self) -> int:
+        """Return the number of units allowed to restart slurmd at the same time."""
+        return int(self._charm.config.get("restart-concurrency", 0))
+
+    def _restart_grants(self) -> Dict[str, dict]:
+        """Return the restart slots granted by the leader, keyed by unit name."""
+        if not (relation := self.relation):
+            return {}
+        raw = relation.data[self.model.app].get("restart_grants")
+        return json.loads(raw) if raw else {}
+
+    @property
+    def restarts_in_progress(self) -> bool:
+        """Return True if restart slots are granted to units."""
+        return bool(self._restart_grants())
+
+    def request_restart(self) -> bool:
+        """Request a slot from the leader to restart slurmd.
+
+        Returns:
+            True if the restart is scheduled by the leader, False if rolling
+            restarts are disabled and slurmd should be restarted right away.
+        """
+        if self.restart_concurrency <= 0 or not (relation := self.relation):
+            return False
+
+        self._stored.restart_token += 1
+        logger.debug(f"## Requesting restart slot {self._stored.restart_token}")
+        relation.data[self.model.unit]["restart_request"] = str(self._stored.restart_token)
+        # The leader is not notified of changes to its own unit data.
+        self.schedule_restarts()
+        self._restart_if_granted()
+        return True
+
+    def restart_completed(self) -> None:
+        """Release the restart slot of this unit once slurmd is started."""
+        if not (token := self._stored.restart_granted) or not (relation := self.relation):
+            return
+        if relation.data[self.model.unit].get("restart_done") == str(token):
+            return
+
+        logger.debug(f"## Restart {token} completed")
+        relation.data[self.model.unit]["restart_done"] = str(token)
+        self.schedule_restarts()
+
+    def _restart_if_granted(self) -> None:
+        """Restart slurmd if the leader granted a slot to the pending request."""
+        grant = self._restart_grants().get(self.model.unit.name)
+        token = self._stored.restart_token
+        if grant and grant["token"] == str(token) and self._stored.restart_granted != token:
+            logger.debug(f"## Restart slot {token} granted")
+            self._stored.restart_granted = token
+            self.on.restart_granted.emit()
+
+    def _release_restart_slots(
+        self, requests: Dict[str, str], done: Dict[str, str], now: float
+    ) -> Dict[str, dict]:
+        """Return the restart slots that are still in use."""
+        grants = {}
+        for name, grant in self._restart_grants().items():
+            if done.get(name) == grant["token"] or requests.get(name) is None:
+                continue
+            if now - grant["granted"] > RESTART_TIMEOUT:
+                logger.warning(f"## {name} did not restart in time - releasing its slot")
+                self._stored.restart_expired[name] = grant["token"]
+                continue
+            grants[name] = grant
+
+        return grants
+
+    def schedule_restarts(self) -> bool:
+        """Grant restart slots to the units waiting for one.
+
+        Slots of units that finished restarting, left the relation, or did
+        not finish within RESTART_TIMEOUT are released first. Free slots are
+        then granted in unit order.
+
+        Returns:
+            True if the restart slots changed.
+        """
+        if not self.model.unit.is_leader() or not (relation := self.relation):
+            return False
+        # Avoid reading the data of every unit while rolling restarts are disabled.
+        if self.restart_concurrency <= 0 and not self.restarts_in_progress:
+            return False
+
+        requests, done = {}, {}
+        for unit in {self.model.unit, *relation.units}:
+            if token := relation.data[unit].get("restart_request"):
+                requests[unit.name] = token
+            done[unit.name] = relation.data[unit].get("restart_done")
+
+        now = time.time()
+        grants = self._release_restart_slots(requests, done, now)
+        waiting = sorted(
+            (name for name, token in requests.items() if name not in grants),
+            key=lambda name: int(name.split("/")[-1]),
+        )
+        for name in waiting:
+            if len(grants) >= max(self.restart_concurrency, 1):
+                break
+            token = requests[name]
+            if token in (done.get(name), self._stored.restart_expired.get(name)):
+                continue
+            logger.debug(f"## Granting restart slot to {name}")
+            grants[name] = {"token": token, "granted": now}
+
+        if grants == self._restart_grants():
+            return False
+        relation.data[self.model.app]["restart_grants"] = json.dumps(grants) if grants else ""
+        return True
@@ -0,0 +1,63 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detect the base of the machine once and cache it for later hooks.
+
+The base decides how the charm is patched when it is imported, so it is
+needed by every hook. Detecting it with `distro` costs an import and reading
+the os-release files, while the base only changes with a series upgrade.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from .persist import write_atomic
+
+_logger = logging.getLogger(__name__)
+
+BASE_STATE = Path("/var/cache/slurmd-operator/base.json")
+
+
+def detect() -> Dict[str, str]:
+    """Return the id and version of the distribution of the machine."""
+    import distro
+
+    return {"id": distro.id(), "version": distro.version()}
+
+
+def os_id(state: Optional[Path] = None) -> str:
+    """Return the id of the distribution, e.g. `ubuntu` or `centos`.
+
+    Args:
+        state: File caching the detected base. Detects the base if it is missing.
+    """
+    state = state or BASE_STATE
+    try:
+        return json.loads(state.read_text())["id"]
+    except (OSError, ValueError, KeyError):
+        return detect()["id"]
+
+
+def save(state: Optional[Path] = None) -> Dict[str, str]:
+    """Detect the base and cache it for later hooks.
+
+    Args:
+        state: File caching the detected base.
+    """
+    state = state or BASE_STATE
+    base = detect()
+    write_atomic(state, json.dumps(base, sort_keys=True))
+    return base
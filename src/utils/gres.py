@@ -0,0 +1,247 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detect generic resources (GRES) such as GPUs from sysfs.
+
+GPUs are found by PCI vendor and class id. Integrated GPUs, which are VGA
+controllers of the same vendors, are not published so that GPU jobs are
+never scheduled on nodes without a real GPU. Each GPU is mapped to its device
+file, the Slurm core indexes local to it, and, where the kernel exposes it,
+the interconnect link matrix to the other GPUs on the node. The result can be
+rendered as `gres.conf` lines by slurmctld.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional
+
+from .probe import PciDevice, Probe, format_cpulist, parse_cpulist
+
+_logger = logging.getLogger(__name__)
+
+PCI_BASE_CLASS_DISPLAY = 0x03
+PCI_CLASS_3D_CONTROLLER = 0x0302
+GPU_VENDORS = {0x10DE: "nvidia", 0x1002: "amd", 0x8086: "intel"}
+# Vendors without integrated GPUs, any of their display controllers is a GPU.
+DISCRETE_VENDORS = {0x10DE}
+# Discrete GPUs of the other vendors that are not 3D controllers, by vendor and device id.
+DISCRETE_GPUS = {
+    (0x1002, 0x738C),  # Instinct MI100
+    (0x1002, 0x7408),  # Instinct MI250X
+    (0x1002, 0x740C),  # Instinct MI250X / MI250
+    (0x1002, 0x740F),  # Instinct MI210
+    (0x8086, 0x0BD5),  # Data Center GPU Max 1550
+    (0x8086, 0x0BDA),  # Data Center GPU Max 1100
+    (0x8086, 0x56C0),  # Data Center GPU Flex 170
+    (0x8086, 0x56C1),  # Data Center GPU Flex 140
+}
+KFD_TOPOLOGY_NODES = "/sys/class/kfd/kfd/topology/nodes"
+# Link type of xGMI in the KFD topology (CRAT_IOLINK_TYPE_XGMI).
+KFD_IOLINK_TYPE_XGMI = 11
+
+
+def _normalize_type(name: str) -> str:
+    """Convert a marketing name into a gres.conf Type, e.g. `tesla_v100-sxm2-16gb`."""
+    return re.sub(r"[^a-z0-9_.-]+", "_", name.strip().lower()).strip("_")
+
+
+def _is_gpu(device: PciDevice) -> bool:
+    """Return True if a PCI device is a discrete GPU of a supported vendor."""
+    if device.vendor not in GPU_VENDORS or device.pci_class >> 16 != PCI_BASE_CLASS_DISPLAY:
+        return False
+
+    return (
+        device.pci_class >> 8 == PCI_CLASS_3D_CONTROLLER
+        or device.vendor in DISCRETE_VENDORS
+        or (device.vendor, device.device) in DISCRETE_GPUS
+    )
+
+
+def _kfd_properties(probe: Probe, path: str) -> Dict[str, int]:
+    """Parse a KFD topology `properties` file into a dictionary."""
+    properties = {}
+    for line in (probe.read(path) or "").splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            properties[key] = int(value)
+        except ValueError:
+            continue
+
+    return properties
+
+
+class GresDetector:
+    """Detect GPUs on the machine.
+
+    Args:
+        probe: Hardware probe to read sysfs and procfs through.
+    """
+
+    def __init__(self, probe: Optional[Probe] = None) -> None:
+        self._probe = probe or Probe()
+        self._core_index = None
+        self._gpus = None
+
+    def gpus(self) -> List[PciDevice]:
+        """Return the PCI devices of all supported GPUs, ordered by address."""
+        if self._gpus is None:
+            self._gpus = [device for device in self._probe.pci_devices() if _is_gpu(device)]
+
+        return self._gpus
+
+    def detect(self) -> List[dict]:
+        """Return the structured GRES description of every usable GPU.
+
+        GPUs without a device file are skipped since Slurm can not bind them.
+        """
+        gpus = []
+        for device in self.gpus():
+            if (device_file := self.device_file(device)) is None:
+                _logger.warning(f"## No device file found for GPU {device.address}. Skipping")
+                continue
+            gpus.append(
+                {
+                    "name": "gpu",
+                    "type": self.gpu_type(device),
+                    "file": device_file,
+                    "cores": self.cores(device),
+                    "pci_address": device.address,
+                }
+            )
+
+        links = self.links([gpu["pci_address"] for gpu in gpus])
+        # Only describe links if the topology could be read for at least one GPU.
+        if any(count > 0 for row in links for count in row):
+            for gpu, row in zip(gpus, links):
+                gpu["links"] = ",".join(str(count) for count in row)
+
+        return gpus
+
+    def device_file(self, device: PciDevice) -> Optional[str]:
+        """Return the /dev file of a GPU, or None if it does not exist."""
+        vendor = GPU_VENDORS[device.vendor]
+        if vendor == "nvidia":
+            path = f"/dev/nvidia{self._nvidia_minor(device)}"
+        else:
+            # AMD and Intel GPUs are accessed through their DRM render node.
+            drm_dir = self._probe.path(f"/sys/bus/pci/devices/{device.address}/drm")
+            render = sorted(drm_dir.glob("renderD*")) if drm_dir.is_dir() else []
+            if not render:
+                return None
+            path = f"/dev/dri/{render[0].name}"
+
+        return path if self._probe.path(path).exists() else None
+
+    def _nvidia_minor(self, device: PciDevice) -> int:
+        """Return the device minor of an NVIDIA GPU.
+
+        The minor is read from the driver's procfs entry, and falls back to the
+        position of the GPU among the NVIDIA GPUs ordered by PCI address.
+        """
+        information = self._probe.read(f"/proc/driver/nvidia/gpus/{device.address}/information")
+        for line in (information or "").splitlines():
+            key, _, value = line.partition(":")
+            if key.strip() == "Device Minor" and value.strip().isdigit():
+                return int(value)
+
+        nvidia = [gpu.address for gpu in self.gpus() if GPU_VENDORS[gpu.vendor] == "nvidia"]
+        return nvidia.index(device.address)
+
+    def gpu_type(self, device: PciDevice) -> str:
+        """Return the gres.conf Type of a GPU."""
+        vendor = GPU_VENDORS[device.vendor]
+        name = None
+        if vendor == "nvidia":
+            information = self._probe.read(
+                f"/proc/driver/nvidia/gpus/{device.address}/information"
+            )
+            for line in (information or "").splitlines():
+                key, _, value = line.partition(":")
+                if key.strip() == "Model":
+                    name = value
+        else:
+            name = self._probe.read(f"/sys/bus/pci/devices/{device.address}/product_name")
+
+        return _normalize_type(name) if name else f"{vendor}_{device.device:04x}"
+
+    def cores(self, device: PciDevice) -> str:
+        """Return the Slurm core indexes local to a GPU as a cpulist.
+
+        Slurm numbers cores by socket then core rather than by Linux cpu id,
+        so the cpus in `local_cpulist` are converted into core indexes.
+        """
+        local = self._probe.read(f"/sys/bus/pci/devices/{device.address}/local_cpulist")
+        if not local:
+            return ""
+
+        if self._core_index is None:
+            topology = self._probe.cpu_topology()
+            cores = sorted({(cpu["package"], cpu["core"]) for cpu in topology.values()})
+            index = {core: i for i, core in enumerate(cores)}
+            self._core_index = {
+                cpu: index[(info["package"], info["core"])] for cpu, info in topology.items()
+            }
+
+        return format_cpulist(
+            self._core_index[cpu] for cpu in parse_cpulist(local) if cpu in self._core_index
+        )
+
+    def _kfd_nodes(self) -> Dict[int, str]:
+        """Map KFD topology node ids to PCI addresses through the node location id."""
+        nodes_dir = self._probe.path(KFD_TOPOLOGY_NODES)
+        if not nodes_dir.is_dir():
+            return {}
+
+        kfd_nodes = {}
+        for node in nodes_dir.iterdir():
+            if not node.name.isdigit():
+                continue
+            properties = _kfd_properties(
+                self._probe, f"{KFD_TOPOLOGY_NODES}/{node.name}/properties"
+            )
+            # CPU nodes have no location id.
+            if not (location := properties.get("location_id")):
+                continue
+            kfd_nodes[int(node.name)] = "{:04x}:{:02x}:{:02x}.{:x}".format(
+                properties.get("domain", 0), location >> 8, (location >> 3) & 0x1F, location & 0x7
+            )
+
+        return kfd_nodes
+
+    def links(self, addresses: List[str]) -> List[List[int]]:
+        """Return the interconnect link matrix between GPUs.
+
+        Each row holds the number of links from one GPU to every GPU in
+        `addresses`, with -1 for the GPU itself. xGMI links are read from the
+        KFD topology. NVLink is not exposed through sysfs, so NVIDIA GPUs only
+        report links to themselves.
+        """
+        position = {address: i for i, address in enumerate(addresses)}
+        matrix = [[-1 if i == j else 0 for j in position.values()] for i in position.values()]
+
+        kfd_nodes = self._kfd_nodes()
+        for node, address in kfd_nodes.items():
+            if address not in position:
+                continue
+            links_dir = self._probe.path(f"{KFD_TOPOLOGY_NODES}/{node}/io_links")
+            for link in sorted(links_dir.iterdir()) if links_dir.is_dir() else []:
+                properties = _kfd_properties(
+                    self._probe, f"{KFD_TOPOLOGY_NODES}/{node}/io_links/{link.name}/properties"
+                )
+                peer = kfd_nodes.get(properties.get("node_to"))
+                if properties.get("type") == KFD_IOLINK_TYPE_XGMI and peer in position:
+                    if peer != address:
+                        matrix[position[address]][position[peer]] += 1
+
+        return matrix
@@ -0,0 +1,110 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache the results of health checks across hooks.
+
+Health checks such as `SlurmManager.check_munged()` run a subprocess round
+trip. A passing check is trusted for a TTL, and the last time each check
+passed is recorded in a state file. Failing checks are not cached, so
+recovery shows up on the next hook. Events that can change the outcome, such
+as munged changing state or a new munge key, invalidate the check so that it
+runs again on the next call.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .persist import write_atomic
+
+_logger = logging.getLogger(__name__)
+
+HEALTH_STATE = Path("/var/cache/slurmd-operator/health.json")
+# Seconds a passing health check is trusted by default, the default update-status interval.
+DEFAULT_TTL = 300
+# Seconds a check is trusted past its TTL, so that a hook running one TTL after
+# the check, such as the next update-status, reliably hits the cache.
+TTL_SLACK = 60
+
+MUNGED = "munged"
+
+
+class HealthCache:
+    """Cache of passing health checks.
+
+    Args:
+        state: File recording the results of the checks.
+        ttl: Seconds a passing check is trusted, plus `TTL_SLACK`. 0 disables caching.
+        clock: Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        state: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._state_file = state or HEALTH_STATE
+        self._ttl = ttl
+        self._clock = clock
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self._state_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, state: Dict[str, dict]) -> None:
+        write_atomic(self._state_file, json.dumps(state, sort_keys=True))
+
+    def check(self, name: str, probe: Callable[[], bool]) -> bool:
+        """Return the result of a health check, running it only if needed.
+
+        Args:
+            name: Name of the check.
+            probe: Runs the check, returning True if it passed.
+        """
+        state = self._load()
+        entry = state.get(name, {})
+        now = self._clock()
+        fresh = "checked" in entry and now - entry["checked"] < self._ttl + TTL_SLACK
+        if self._ttl > 0 and entry.get("ok") and fresh:
+            _logger.debug(f"## Health check {name} passed {now - entry['checked']:.0f}s ago")
+            return True
+
+        ok = bool(probe())
+        entry.update(ok=ok, checked=now)
+        if ok:
+            entry["last_good"] = now
+        else:
+            _logger.warning(
+                f"## Health check {name} failed, last passed: {entry.get('last_good')}"
+            )
+        state[name] = entry
+        self._save(state)
+        return ok
+
+    def invalidate(self, name: str) -> None:
+        """Run a check again on its next call, keeping when it last passed.
+
+        Args:
+            name: Name of the check.
+        """
+        state = self._load()
+        if "checked" in state.get(name, {}):
+            _logger.debug(f"## Invalidating health check {name}")
+            del state[name]["checked"]
+            self._save(state)
@@ -0,0 +1,127 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compress and expand Slurm hostlist expressions such as `node[001-512]`.
+
+The numeric part of a host name is its last run of digits. Zero padding is
+preserved, and the width of a range is the width of its lower bound, like
+Slurm does.
+"""
+
+import itertools
+import re
+from typing import Iterable, List, Tuple
+
+_HOST_REGEX = re.compile(r"^(?P<prefix>.*?)(?P<digits>\d+)(?P<suffix>\D*)$")
+_BRACKET_REGEX = re.compile(r"\[([^\[\]]*)\]")
+
+
+def sort_key(host: str) -> Tuple[str, str, int, str]:
+    """Return a key that orders hosts numerically, e.g. `node2` before `node10`."""
+    if match := _HOST_REGEX.match(host):
+        return match["prefix"], match["suffix"], int(match["digits"]), match["digits"]
+    return host, "", -1, ""
+
+
+def _split(expression: str) -> List[str]:
+    """Split a hostlist expression on the commas that are not inside brackets."""
+    items = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(expression):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(expression[start:i])
+            start = i + 1
+    items.append(expression[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def _expand_ranges(ranges: str) -> List[str]:
+    """Expand the inside of a bracket, e.g. `001-003,007`."""
+    values = []
+    for chunk in ranges.split(","):
+        lo, sep, hi = chunk.strip().partition("-")
+        if not sep:
+            values.append(lo)
+            continue
+        if int(hi) < int(lo):
+            raise ValueError(f"invalid range {chunk!r} in hostlist")
+        values.extend(f"{num:0{len(lo)}d}" for num in range(int(lo), int(hi) + 1))
+
+    return values
+
+
+def expand(expression: str) -> List[str]:
+    """Expand a hostlist expression into the list of hosts it describes.
+
+    Args:
+        expression: Hostlist such as `node[001-003,007],gpu[1-2]-ib`.
+
+    Raises:
+        ValueError: Raised if a range in the expression is invalid.
+    """
+    hosts = []
+    for item in _split(expression):
+        parts = _BRACKET_REGEX.split(item)
+        # Odd parts are the contents of brackets, even parts are literals.
+        choices = [[part] if i % 2 == 0 else _expand_ranges(part) for i, part in enumerate(parts)]
+        hosts.extend("".join(combination) for combination in itertools.product(*choices))
+
+    return hosts
+
+
+def compress(hosts: Iterable[str], sort: bool = True) -> str:
+    """Compress hosts into a hostlist expression.
+
+    Args:
+        hosts: Host names to compress.
+        sort: Sort the hosts first. If False, the order of the hosts is kept
+            so that the expression expands back into the same sequence.
+    """
+    hosts = list(hosts)
+    if sort:
+        hosts = sorted(set(hosts), key=sort_key)
+
+    groups = []
+    for host in hosts:
+        prefix, suffix, num, digits = sort_key(host)
+        if num < 0:
+            groups.append((host, None, []))
+            continue
+
+        if groups and groups[-1][1] == suffix and groups[-1][0] == prefix and groups[-1][2]:
+            ranges = groups[-1][2]
+            lo, hi = ranges[-1]
+            if int(hi) + 1 == num and f"{num:0{len(lo)}d}" == digits:
+                ranges[-1] = (lo, digits)
+                continue
+            ranges.append((digits, digits))
+        else:
+            groups.append((prefix, suffix, [(digits, digits)]))
+
+    expressions = []
+    for prefix, suffix, ranges in groups:
+        if suffix is None:
+            expressions.append(prefix)
+        elif len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+            expressions.append(f"{prefix}{ranges[0][0]}{suffix}")
+        else:
+            inner = ",".join(lo if lo == hi else f"{lo}-{hi}" for lo, hi in ranges)
+            expressions.append(f"{prefix}[{inner}]{suffix}")
+
+    return ",".join(expressions)
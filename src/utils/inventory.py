@@ -0,0 +1,100 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache the probed node hardware on disk and detect drift.
+
+The hardware is probed once at install and stored together with a content
+hash. Later probes are compared against the hash so that the inventory on the
+relation is only rewritten when the hardware actually changed, e.g. after a
+DIMM or GPU failure or a memory hot-add.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from . import machine
+from .persist import write_atomic
+from .probe import Probe
+
+_logger = logging.getLogger(__name__)
+
+INVENTORY_CACHE = Path("/var/cache/slurmd-operator/inventory.json")
+
+
+def fingerprint(hardware: dict) -> str:
+    """Return the content hash of the probed hardware."""
+    return hashlib.sha256(json.dumps(hardware, sort_keys=True).encode()).hexdigest()
+
+
+class InventoryCache:
+    """Probed hardware of the node cached on disk.
+
+    Args:
+        path: Location of the cache file. Defaults to INVENTORY_CACHE.
+        probe: Hardware probe to use. Defaults to probing the running machine.
+    """
+
+    def __init__(
+        self, path: Optional[Union[str, Path]] = None, probe: Optional[Probe] = None
+    ) -> None:
+        self._path = Path(path or INVENTORY_CACHE)
+        self._probe = probe
+        self._cache = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._cache is None:
+            try:
+                self._cache = json.loads(self._path.read_text())
+            except (OSError, ValueError):
+                self._cache = {}
+
+        return self._cache
+
+    def _save(self, hardware: dict, digest: str) -> None:
+        self._cache = {"fingerprint": digest, "hardware": hardware}
+        write_atomic(self._path, json.dumps(self._cache, sort_keys=True))
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """Return the content hash of the cached hardware."""
+        return self._load().get("fingerprint")
+
+    @property
+    def hardware(self) -> dict:
+        """Return the cached hardware, probing it if the cache is empty."""
+        if "hardware" not in self._load():
+            self.refresh()
+
+        return dict(self._load()["hardware"])
+
+    def refresh(self) -> Dict[str, Any]:
+        """Probe the hardware and update the cache if it has drifted.
+
+        Returns:
+            The hardware fields that changed since the cached probe. Fields
+            that are gone are set to None. Empty if nothing changed.
+        """
+        hardware = machine.get_hardware(self._probe)
+        if (digest := fingerprint(hardware)) == self.fingerprint:
+            return {}
+
+        previous = self._load().get("hardware", {})
+        changes = {key: value for key, value in hardware.items() if previous.get(key) != value}
+        changes.update({key: None for key in previous if key not in hardware})
+        _logger.info(f"## Node hardware changed: {sorted(changes)}")
+        self._save(hardware, digest)
+        return changes
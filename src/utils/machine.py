@@ -3,77 +3,85 @@
 
 """machine.py module for slurmd charm."""
 
-import os
-import subprocess
-import sys
+from typing import Optional
 
-from slurm_ops_manager.utils import get_real_mem
+from .gres import GresDetector
+from .probe import Probe, format_cpulist
 
 
-def lscpu():
-    """Return lscpu as a python dictionary."""
-
-    def format_key(lscpu_key):
-        key_lower = lscpu_key.lower()
-        replace_hyphen = key_lower.replace("-", "_")
-        replace_lparen = replace_hyphen.replace("(", "")
-        replace_rparen = replace_lparen.replace(")", "")
-        return replace_rparen.replace(" ", "_")
+def cpu_info(probe: Optional[Probe] = None) -> dict:
+    """Return cpu info needed to generate node inventory."""
+    probe = probe or Probe()
+    topology = probe.cpu_topology()
 
-    lscpu_out = subprocess.check_output(["lscpu"])
-    lscpu_lines = lscpu_out.decode().strip().split("\n")
+    cpus = len(topology)
+    sockets = len({cpu["package"] for cpu in topology.values()}) or 1
+    cores = len({(cpu["package"], cpu["core"]) for cpu in topology.values()}) or 1
 
     return {
-        format_key(line.split(":")[0].strip()): line.split(":")[1].strip() for line in lscpu_lines
+        "cpus": cpus,
+        "threads_per_core": max(cpus // cores, 1),
+        "cores_per_socket": max(cores // sockets, 1),
+        "sockets_per_board": sockets,
     }
 
 
-def cpu_info():
-    """Return cpu info needed to generate node inventory."""
-    ls_cpu = lscpu()
+def real_memory(probe: Optional[Probe] = None) -> int:
+    """Return the total memory of the machine in MB."""
+    probe = probe or Probe()
+    return probe.meminfo().get("MemTotal", 0) // 1024
+
+
+def numa_info(probe: Optional[Probe] = None) -> dict:
+    """Return the NUMA and last level cache topology of the machine.
+
+    Machines without NUMA support in sysfs are reported as a single node
+    holding every online cpu and all memory.
+    """
+    probe = probe or Probe()
+    nodes = probe.numa_nodes()
+    if not nodes:
+        nodes = {0: probe.online_cpus()}
+        memory = {0: real_memory(probe)}
+    else:
+        memory = {node: probe.meminfo(node).get("MemTotal", 0) // 1024 for node in nodes}
+
+    cpu_numa_map = [-1] * (max((max(cpus) for cpus in nodes.values() if cpus), default=-1) + 1)
+    for node, cpus in nodes.items():
+        for cpu in cpus:
+            cpu_numa_map[cpu] = node
 
     return {
-        "cpus": ls_cpu["cpus"],
-        "threads_per_core": ls_cpu["threads_per_core"],
-        "cores_per_socket": ls_cpu["cores_per_socket"],
-        "sockets_per_board": ls_cpu["sockets"],
+        "numa_nodes": {
+            str(node): {"cpus": format_cpulist(cpus), "real_memory": memory[node]}
+            for node, cpus in nodes.items()
+        },
+        "cpu_numa_map": cpu_numa_map,
+        "l3_caches": [format_cpulist(domain) for domain in probe.cache_domains(3)],
     }
 
 
-def lspci_nvidia():
-    """Check for and return the count of nvidia gpus."""
-    gpus = 0
-    try:
-        gpus = int(
-            subprocess.check_output(
-                "lspci | grep -i nvidia | awk '{print $1}' " "| cut -d : -f 1 | sort -u | wc -l",
-                shell=True,
-            )
-            .decode()
-            .strip()
-        )
-    except subprocess.CalledProcessError as e:
-        print(e)
-        sys.exit(-1)
-
-    for graphics_processing_unit in range(gpus):
-        gpu_path = "/dev/nvidia" + str(graphics_processing_unit)
-        if not os.path.exists(gpu_path):
-            return 0
-    return gpus
-
-
-def get_inventory(node_name, node_addr):
+def get_hardware(probe: Optional[Probe] = None) -> dict:
+    """Return the probed hardware of the machine."""
+    probe = probe or Probe()
+    hardware = {
+        "real_memory": real_memory(probe),
+        **cpu_info(probe),
+        **numa_info(probe),
+    }
+
+    gpus = GresDetector(probe).detect()
+    if gpus:
+        hardware["gres"] = len(gpus)
+        hardware["gres_devices"] = gpus
+    return hardware
+
+
+def get_inventory(node_name, node_addr, probe: Optional[Probe] = None):
     """Assemble and return the node info."""
-    inventory = {
+    return {
         "node_name": node_name,
         "node_addr": node_addr,
         "state": "UNKNOWN",
-        "real_memory": get_real_mem(),
-        **cpu_info(),
+        **get_hardware(probe),
     }
-
-    gpus = lspci_nvidia()
-    if gpus > 0:
-        inventory["gres"] = gpus
-    return inventory
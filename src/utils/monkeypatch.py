@@ -12,22 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Monkeypatch slurmd operator classes and methods to work on CentOS 7."""
+"""Monkeypatch slurmd operator classes and methods, e.g. to work on CentOS 7."""
 
 import inspect
 import logging
 import textwrap
 from pathlib import Path
 
-from charms.operator_libs_linux.v0.juju_systemd_notices import (
-    SystemdNotices,
-    _daemon_reload,
-    _enable_service,
-    _start_service,
-)
-from charms.operator_libs_linux.v1 import systemd
+from charms.operator_libs_linux.v0 import juju_systemd_notices as notices_module
+from charms.operator_libs_linux.v0.juju_systemd_notices import SystemdNotices
 
-from . import slurmd
+from . import slurmd, systemd_dbus
 
 _logger = logging.getLogger(__name__)
 
@@ -44,22 +39,12 @@ def juju_systemd_notices(notices: SystemdNotices) -> SystemdNotices:
     """
     _logger.debug("Monkeypatching SystemdNotices subscribe method")
 
-    def patched_subscribe(self) -> None:  # pragma: nocover
-        _logger.debug("Generating systemd notice hooks for %s", self._services)
-        start_hooks = [Path(f"hooks/service-{service}-started") for service in self._services]
-        stop_hooks = [Path(f"hooks/service-{service}-stopped") for service in self._services]
-        for hook in start_hooks + stop_hooks:
-            if hook.exists():
-                _logger.debug("Hook %s already exists. Skipping...", hook.name)
-            else:
-                hook.symlink_to(self._charm.framework.charm_dir / "dispatch")
-
+    def patched_subscribe(self) -> None:
+        self._create_hooks()
         _logger.debug("Starting %s daemon", self._service_file.name)
         if self._service_file.exists():
             _logger.debug("Overwriting existing service file %s", self._service_file.name)
-        self._service_file.write_text(
-            textwrap.dedent(
-                f"""
+        self._service_file.write_text(textwrap.dedent(f"""
                 [Unit]
                 Description=Juju systemd notices daemon
                 After=multi-user.target
@@ -69,19 +54,18 @@ def juju_systemd_notices(notices: SystemdNotices) -> SystemdNotices:
                 Restart=always
                 WorkingDirectory={self._charm.framework.charm_dir}
                 Environment="PYTHONPATH={self._charm.framework.charm_dir / "venv"}"
-                ExecStart=/usr/bin/env python3.8 {inspect.getfile(notices)} {self._charm.unit.name}
+                ExecStart=/usr/bin/env python3.8 {inspect.getfile(notices)} --debounce {self._debounce} --stats-socket {self._stats_socket} {self._charm.unit.name}
 
                 [Install]
                 WantedBy=multi-user.target
-                """
-            ).strip()
-        )
+                """).strip())
         _logger.debug("Service file %s written. Reloading systemd", self._service_file.name)
-        _daemon_reload()
+        # Looked up on the module, where `juju_systemd_notices_dbus` may route them over D-Bus.
+        notices_module._daemon_reload()
         # Notices daemon is enabled so that the service will start even after machine reboot.
         # This functionality is needed in the event that a charm is rebooted to apply updates.
-        _enable_service(self._service_file.name)
-        _start_service(self._service_file.name)
+        notices_module._enable_service(self._service_file.name)
+        notices_module._start_service(self._service_file.name)
         _logger.debug("Started %s daemon", self._service_file.name)
 
     notices.subscribe = patched_subscribe
@@ -89,66 +73,44 @@ def juju_systemd_notices(notices: SystemdNotices) -> SystemdNotices:
 
 
 def slurmd_override_default(slurmd_module: slurmd) -> slurmd:
-    """Patch override_default function for slurmd utility.
+    """Patch the default file of the slurmd utility.
 
-    This function will patch the override_default function of the slurmd utility
-    to save
+    CentOS reads the environment of the slurmd service from
+    /etc/sysconfig/slurmd rather than /etc/default/slurmd.
 
     Args:
         slurmd_module: slurmd utility module reference to patch.
     """
-    _logger.debug("Monkeypatching slurmd.override_default function")
-
-    def patched_override_default(host: str, port: int) -> None:  # pragma: nocover
-        _logger.debug(f"Overriding /etc/default/slurmd with hostname {host} and port {port}")
-        Path("/etc/sysconfig/slurmd").write_text(
-            textwrap.dedent(
-                f"""
-                SLURMD_OPTIONS="--conf-server {host}:{port}"
-                PYTHONPATH={Path.cwd() / "lib"}
-                """
-            ).strip()
-        )
-
-    slurmd_module.override_default = patched_override_default
+    _logger.debug("Monkeypatching slurmd.DEFAULT_FILE")
+    slurmd_module.DEFAULT_FILE = Path("/etc/sysconfig/slurmd")
     return slurmd_module
 
 
 def slurmd_override_service(slurmd_module: slurmd) -> slurmd:
-    """Patch override_service function from slurmd utility.
+    """Patch the python executable of the slurmd service drop-in.
 
-    This function will patch the override_service function of the slurmd utility
-    to use `/usr/bin/env python3.8` as the PYTHONEXE for running the custom slurmd
-    ExecStart script in the slurmd service file.
+    This function will patch the slurmd utility to use `/usr/bin/env python3.8`
+    as the PYTHONEXE for running the custom slurmd ExecStart script in the
+    slurmd service file.
 
     Args:
         slurmd_module: slurmd utility module reference to patch.
     """
-    _logger.debug("Monkeypatching slurmd.override_service function")
-
-    def patched_override_service() -> None:  # pragma: nocover
-        _logger.debug("Overriding default slurmd service file")
-        if not (override_dir := Path("/etc/systemd/system/slurmd.service.d")).is_dir():
-            override_dir.mkdir()
-
-        overrides = override_dir / "99-slurmd-charm.conf"
-        overrides.write_text(
-            textwrap.dedent(
-                f"""
-                    [Unit]
-                    ConditionPathExists=
-
-                    [Service]
-                    Type=forking
-                    ExecStart=
-                    ExecStart=/usr/bin/env python3.8 {inspect.getfile(slurmd_module)}
-                    LimitMEMLOCK=infinity
-                    LimitNOFILE=1048576
-                    TimeoutSec=900
-                    """
-            ).strip()
-        )
-        systemd.daemon_reload()
-
-    slurmd_module.override_service = patched_override_service
+    _logger.debug("Monkeypatching slurmd.PYTHON_EXE")
+    slurmd_module.PYTHON_EXE = "/usr/bin/env python3.8"
     return slurmd_module
+
+
+def juju_systemd_notices_dbus(module: notices_module) -> notices_module:
+    """Route the systemctl calls of the juju_systemd_notices library over D-Bus.
+
+    Args:
+        module: juju_systemd_notices library module reference to patch.
+    """
+    _logger.debug("Monkeypatching juju_systemd_notices to control systemd over D-Bus")
+    module._daemon_reload = systemd_dbus.daemon_reload
+    module._start_service = systemd_dbus.service_start
+    module._stop_service = systemd_dbus.service_stop
+    module._enable_service = systemd_dbus.service_enable
+    module._disable_service = systemd_dbus.service_disable
+    return module
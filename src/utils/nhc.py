@@ -0,0 +1,478 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run Node Health Check and record the runtime of its checks.
+
+slurmd runs `omni-nhc-wrapper` as its HealthCheckProgram. The charm renders
+it to execute this module, which runs NHC with a copy of nhc.conf where
+every check is wrapped by `nhc_timed`, a function the charm installs in the
+NHC scripts directory. `nhc_timed` appends the start and end of each check
+to a file, and each run is then appended as a JSON line to a log that keeps
+the most recent `MAX_RUNS` runs.
+
+NHC runs its checks serially. Groups of independent checks, declared with
+`@parallel` comments in nhc.conf, are run by concurrent NHC processes with
+their own timeout, and merged into one result like a single NHC run.
+
+This module is run by slurmd outside of the charm environment, it must only
+import the standard library and the modules of `utils` that do likewise.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .persist import append_rolling
+from .stats import percentile
+
+_logger = logging.getLogger(__name__)
+
+WRAPPER = Path("/usr/sbin/omni-nhc-wrapper")
+TIMING_SCRIPT = Path("/etc/nhc/scripts/charm_timing.nhc")
+NHC_CONF = Path("/etc/nhc/nhc.conf")
+NHC_WRAPPER = "/usr/sbin/nhc-wrapper"
+NHC_HELPERS = Path("/usr/libexec/nhc")
+PROFILE_LOG = Path("/var/log/slurmd-operator/nhc-profile.jsonl")
+# NHC runs kept in the log.
+MAX_RUNS = 1000
+
+DEFAULT_GROUP = "default"
+# Seconds a group may run past its timeout before it is killed, NHC enforces the timeout.
+TIMEOUT_GRACE = 5
+# Output of NHC when a check fails.
+FAILED = "ERROR:  nhc:  Health check failed:  "
+
+# The check of a `target || check` line of nhc.conf.
+_CHECK = re.compile(r"^(\s*[^#\s].*?\|\|\s*)(check_\w+)", re.MULTILINE)
+_PARALLEL = re.compile(r"^\s*#\s*@parallel\s+([\w.-]+)(?:\s+(\d+(?:\.\d+)?))?\s*$")
+_SERIAL = re.compile(r"^\s*#\s*@serial\s*$")
+_FAILED = re.compile(rf"^{re.escape(FAILED)}(.*)$", re.MULTILINE)
+
+
+def timing_script() -> str:
+    """Return the NHC script defining `nhc_timed`."""
+    return textwrap.dedent("""\
+        # Managed by the slurmd charm.
+        # Record the start and end of the checks wrapped by the charm in $NHC_TIMING.
+        function nhc_timed() {
+            local RET
+
+            if [[ -z "$NHC_TIMING" ]]; then
+                "$@"
+                return
+            fi
+            echo "S ${EPOCHREALTIME:-$(date +%s.%N)} $*" >> "$NHC_TIMING"
+            "$@"
+            RET=$?
+            echo "E ${EPOCHREALTIME:-$(date +%s.%N)} $RET $*" >> "$NHC_TIMING"
+            return $RET
+        }
+        """)
+
+
+def wrapper(params: str, budget: float = 0, python: str = "/usr/bin/python3") -> str:
+    """Return the desired contents of the NHC wrapper run by slurmd.
+
+    Args:
+        params: Arguments of nhc-wrapper, set by slurmctld.
+        budget: Seconds over which a run is reported. 0 disables the budget.
+        python: Python executable running this module.
+    """
+    return textwrap.dedent(f"""\
+        #!/bin/sh
+        # Managed by the slurmd charm.
+        export PYTHONPATH={Path(__file__).parents[1]}
+        exec {python} -m utils.nhc --budget {budget:g} -- {params or ""}
+        """)
+
+
+def instrument(conf: str) -> str:
+    """Wrap every check of an nhc.conf with `nhc_timed`."""
+    return _CHECK.sub(r"\1nhc_timed \2", conf)
+
+
+def parse_timing(lines: List[str], end: float) -> List[dict]:
+    """Return the runtime of the checks recorded by `nhc_timed`.
+
+    Args:
+        lines: Lines written by `nhc_timed`.
+        end: Time the run ended. A check without an end ended the run, e.g.
+            because it failed.
+
+    Returns:
+        The check, its runtime and its return code, which is None for a
+        check that ended the run, in the order the checks started.
+    """
+    started: Dict[str, List[float]] = {}
+    checks = []
+    for line in lines:
+        try:
+            kind, stamp, rest = line.split(" ", 2)
+            if kind == "S":
+                started.setdefault(rest, []).append(float(stamp))
+            elif kind == "E":
+                returncode, check = rest.split(" ", 1)
+                start = started[check].pop(0)
+                checks.append((start, check, float(stamp) - start, int(returncode)))
+        except (ValueError, KeyError, IndexError):
+            _logger.debug(f"## Ignoring malformed NHC timing: {line}")
+
+    for check, starts in started.items():
+        checks.extend((start, check, end - start, None) for start in starts)
+
+    return [
+        {"check": check, "seconds": round(max(seconds, 0), 6), "returncode": returncode}
+        for _, check, seconds, returncode in sorted(checks, key=lambda c: c[0])
+    ]
+
+
+def _warn(message: str) -> None:
+    """Report a slow run in the journal, slurmd discards the output of NHC."""
+    import syslog
+
+    _logger.warning(message)
+    syslog.openlog("omni-nhc-wrapper")
+    syslog.syslog(syslog.LOG_WARNING, message)
+
+
+def _append(record: dict, log: Path) -> None:
+    """Append an NHC run to the log, dropping the oldest runs beyond `MAX_RUNS`."""
+    append_rolling(log, json.dumps(record, sort_keys=True), MAX_RUNS)
+
+
+class Group(NamedTuple):
+    """Checks of an nhc.conf run by one NHC process.
+
+    Args:
+        name: Name of the group, from its `@parallel` directive.
+        conf: nhc.conf holding the checks of the group and every setting.
+        timeout: Seconds after which NHC fails the group. NHC's default if None.
+    """
+
+    name: str
+    conf: str
+    timeout: Optional[float] = None
+
+
+def groups(conf: str) -> List[Group]:
+    """Split an nhc.conf into the groups of checks run concurrently.
+
+    A `# @parallel <name> [<timeout>]` comment starts a group of checks
+    that are independent of the other groups, and `# @serial` returns to
+    the default group. NHC ignores these comments. Lines other than
+    checks, such as settings, are kept in the config of every group.
+
+    Returns:
+        The groups with at least one check, or no group if the config has
+        no `@parallel` directive.
+    """
+    owners: List[Tuple[Optional[str], str]] = []
+    timeouts: Dict[str, Optional[float]] = {DEFAULT_GROUP: None}
+    current, owner, parallel = DEFAULT_GROUP, None, False
+    for line in conf.splitlines():
+        if match := _PARALLEL.match(line):
+            current, parallel = match[1], True
+            timeouts[current] = float(match[2]) if match[2] else None
+            continue
+        if _SERIAL.match(line):
+            current = DEFAULT_GROUP
+            continue
+        # Continued lines belong to the line they continue.
+        if not (owners and owners[-1][1].endswith("\\")):
+            owner = current if _CHECK.match(line) else None
+        owners.append((owner, line))
+
+    if not parallel:
+        return []
+    return [
+        Group(
+            name,
+            "\n".join(line for owner, line in owners if owner in (None, name)) + "\n",
+            timeouts[name],
+        )
+        for name in timeouts
+        if any(owner == name for owner, _ in owners)
+    ]
+
+
+def _run_group(
+    program: str,
+    args: List[str],
+    conf: Optional[str],
+    directory: Path,
+    group: Optional[Group] = None,
+) -> dict:
+    """Run NHC once, timing its checks.
+
+    Args:
+        program: Program running NHC.
+        args: Arguments of the program.
+        conf: nhc.conf to instrument, or None to run NHC without timing its checks.
+        directory: Empty directory for the instrumented config and the timing.
+        group: Group run concurrently with others. Its output is captured and
+            it does not mark the node, which is done once for all groups.
+
+    Returns:
+        The runtime, return code and checks of the run, and its output if captured.
+    """
+    env = dict(os.environ)
+    timing = directory / "timing"
+    if conf is not None:
+        # NHC reads its config from $CONFFILE.
+        (directory / "nhc.conf").write_text(instrument(conf))
+        env.update(CONFFILE=str(directory / "nhc.conf"), NHC_TIMING=str(timing))
+    timeout = None
+    if group is not None:
+        env["MARK_OFFLINE"] = "0"
+        if group.timeout:
+            env["TIMEOUT"] = f"{group.timeout:g}"
+            timeout = group.timeout + TIMEOUT_GRACE
+
+    start, begin = time.time(), time.perf_counter()
+    process = subprocess.Popen(
+        [program, *args],
+        env=env,
+        stdout=subprocess.PIPE if group else None,
+        stderr=subprocess.STDOUT if group else None,
+        text=True,
+        start_new_session=group is not None,
+    )
+    timed_out = False
+    try:
+        output, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # NHC did not enforce its own timeout, e.g. because a check is stuck in the kernel.
+        os.killpg(process.pid, signal.SIGKILL)
+        output, _ = process.communicate()
+        output += f"{FAILED}Group {group.name} timed out after {group.timeout:g} seconds\n"
+        timed_out = True
+    seconds = time.perf_counter() - begin
+    try:
+        lines = timing.read_text().splitlines()
+    except OSError:
+        lines = []
+
+    result = {
+        "seconds": round(seconds, 6),
+        "returncode": 1 if timed_out else process.returncode,
+        "checks": parse_timing(lines, start + seconds),
+    }
+    if group is not None:
+        result.update(group=group.name, timed_out=timed_out, output=output or "")
+        for check in result["checks"]:
+            check["group"] = group.name
+    return result
+
+
+def _mark_node(reason: Optional[str]) -> None:
+    """Mark the node offline with a reason, or back online, like NHC does.
+
+    NHC only brings back online nodes it marked offline itself.
+    """
+    host = socket.gethostname().split(".")[0]
+    if reason:
+        command = [str(NHC_HELPERS / "node-mark-offline"), host, reason]
+    else:
+        command = [str(NHC_HELPERS / "node-mark-online"), host]
+    try:
+        subprocess.call(command, stdout=subprocess.DEVNULL)
+    except OSError as e:
+        _logger.warning(f"## Unable to mark node {host}: {e}")
+
+
+def _run_parallel(
+    program: str, args: List[str], directory: Path, conf_groups: List[Group]
+) -> Tuple[int, List[dict], List[dict]]:
+    """Run the groups concurrently and merge their results like one NHC run.
+
+    The groups do not mark the node themselves, as a passing group would
+    bring back online a node drained by another group. The node is marked
+    once with the reason of the first failed group in config order.
+
+    Returns:
+        The return code of the first failed group, or 0, the checks of every
+        group and the runtime of every group.
+    """
+    for group in conf_groups:
+        (directory / group.name).mkdir()
+    with ThreadPoolExecutor(len(conf_groups)) as pool:
+        results = list(
+            pool.map(
+                lambda g: _run_group(program, args, g.conf, directory / g.name, g), conf_groups
+            )
+        )
+
+    returncode, reason = 0, None
+    for result in results:
+        output = result.pop("output")
+        sys.stdout.write(output)
+        if result["returncode"] != 0 and not returncode:
+            returncode = result["returncode"]
+            reasons = _FAILED.findall(output)
+            reason = reasons[-1] if reasons else f"Group {result['group']} failed"
+    sys.stdout.flush()
+    if os.environ.get("MARK_OFFLINE") != "0":
+        _mark_node(reason)
+
+    checks = [check for result in results for check in result.pop("checks")]
+    return returncode, checks, results
+
+
+def run(
+    args: List[str],
+    budget: float = 0,
+    program: str = NHC_WRAPPER,
+    log: Optional[Path] = None,
+) -> int:
+    """Run NHC, timing its checks, and record the run.
+
+    The groups of checks of an nhc.conf with `@parallel` directives are run
+    concurrently, see `groups()`.
+
+    Args:
+        args: Arguments of the program.
+        budget: Seconds over which the run is reported. 0 disables the budget.
+        program: Program running NHC.
+        log: JSON lines file the run is appended to.
+
+    Returns:
+        The return code of the program.
+    """
+    log = log or PROFILE_LOG
+    path = Path(os.environ.get("CONFFILE", NHC_CONF))
+    try:
+        conf = path.read_text()
+    except OSError as e:
+        _logger.warning(f"## Unable to time the checks of {path}: {e}")
+        conf = None
+
+    start, begin = time.time(), time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="nhc-profile-") as tmp:
+        if conf_groups := groups(conf or ""):
+            returncode, checks, results = _run_parallel(program, args, Path(tmp), conf_groups)
+        else:
+            result = _run_group(program, args, conf, Path(tmp))
+            returncode, checks, results = result["returncode"], result["checks"], []
+    seconds = time.perf_counter() - begin
+
+    record = {
+        "time": round(start, 6),
+        "seconds": round(seconds, 6),
+        "returncode": returncode,
+        "checks": checks,
+    }
+    if results:
+        record["groups"] = results
+    if budget and seconds > budget:
+        record["over_budget"] = True
+        message = f"NHC run took {seconds:.2f} seconds, over the budget of {budget:g} seconds"
+        if slowest := max(record["checks"], key=lambda c: c["seconds"], default=None):
+            message += f", slowest check: {slowest['check']} ({slowest['seconds']:.2f} seconds)"
+        _warn(message)
+    _append(record, log)
+    return returncode
+
+
+def records(log: Optional[Path] = None) -> List[dict]:
+    """Return the recorded NHC runs, oldest first."""
+    log = log or PROFILE_LOG
+    try:
+        return [json.loads(line) for line in log.read_text().splitlines() if line]
+    except (OSError, ValueError):
+        return []
+
+
+def summary(top: int = 5, log: Optional[Path] = None) -> dict:
+    """Aggregate the recorded NHC runs.
+
+    Args:
+        top: Number of slowest checks to return.
+        log: JSON lines file the runs were appended to.
+
+    Returns:
+        The number of runs, failed runs and runs over the budget, the
+        percentiles of the runtime of a run and of each group of checks run
+        concurrently, and the `top` checks with the highest p95 runtime.
+        Empty if no run was recorded.
+    """
+    runs = records(log)
+    if not runs:
+        return {}
+
+    checks: Dict[str, List[float]] = {}
+    group_runs: Dict[str, List[dict]] = {}
+    for record in runs:
+        for check in record["checks"]:
+            checks.setdefault(check["check"], []).append(check["seconds"])
+        for group in record.get("groups", []):
+            group_runs.setdefault(group["group"], []).append(group)
+
+    def stats(values: List[float]) -> dict:
+        return {
+            "p50": round(percentile(values, 50), 6),
+            "p95": round(percentile(values, 95), 6),
+            "max": round(max(values), 6),
+        }
+
+    slowest = sorted(checks.items(), key=lambda c: percentile(c[1], 95), reverse=True)
+    result = {
+        "runs": len(runs),
+        "failed": sum(1 for r in runs if r["returncode"] != 0),
+        "over_budget": sum(1 for r in runs if r.get("over_budget")),
+        "seconds": stats([r["seconds"] for r in runs]),
+        "slowest_checks": [
+            {"check": check, "runs": len(values), **stats(values)}
+            for check, values in slowest[:top]
+        ],
+    }
+    if group_runs:
+        result["groups"] = {
+            name: {
+                "runs": len(results),
+                "timed_out": sum(1 for r in results if r["timed_out"]),
+                **stats([r["seconds"] for r in results]),
+            }
+            for name, results in group_runs.items()
+        }
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run NHC as the HealthCheckProgram of slurmd."""
+    parser = argparse.ArgumentParser(description="Run NHC and record the runtime of its checks.")
+    parser.add_argument(
+        "--budget", type=float, default=0, help="Report runs over this many seconds."
+    )
+    parser.add_argument("--program", default=NHC_WRAPPER, help="Program running NHC.")
+    parser.add_argument("--log", type=Path, default=PROFILE_LOG, help="Log of the NHC runs.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments of the program.")
+    ns = parser.parse_args(argv)
+    args = ns.args[1:] if ns.args[:1] == ["--"] else ns.args
+    return run(args, ns.budget, ns.program, ns.log)
+
+
+if __name__ == "__main__":  # pragma: nocover
+    sys.exit(main())
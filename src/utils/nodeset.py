@@ -0,0 +1,93 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Group node inventories with the same hardware into hostlist node sets."""
+
+from typing import Iterable, List
+
+from . import hostlist, reservation
+
+# Fields that must be equal for nodes to be part of the same node set.
+NODE_SET_FIELDS = (
+    "cpus",
+    "threads_per_core",
+    "cores_per_socket",
+    "sockets_per_board",
+    "gres",
+    "state",
+    "new_node",
+    *reservation.FIELDS,
+)
+# Fields of the GPUs of a node that must be equal for nodes to be part of the
+# same node set, the PCI address does not matter to slurmctld.
+GRES_DEVICE_FIELDS = ("name", "type", "file", "cores", "links")
+
+
+def _gres_layout(inventory: dict) -> tuple:
+    """Return the type and device layout of the GPUs of a node, in device order."""
+    return tuple(
+        tuple((field, device[field]) for field in GRES_DEVICE_FIELDS if field in device)
+        for device in inventory.get("gres_devices") or ()
+    )
+
+
+def group_node_sets(inventories: Iterable[dict], memory_tolerance: float = 0.0) -> List[dict]:
+    """Group homogeneous node inventories into node sets.
+
+    Nodes with equal NODE_SET_FIELDS and GPU types and layout whose RealMemory is within
+    `memory_tolerance` percent of the smallest node of the set are grouped.
+    Each set is described once, with its NodeName and NodeAddr compressed
+    into hostlist expressions in matching order and the smallest RealMemory
+    of the set, so that no node is drained for having less memory than
+    configured.
+
+    Args:
+        inventories: Node inventories to group.
+        memory_tolerance: Allowed RealMemory jitter within a set, in percent.
+    """
+    groups = {}
+    for inventory in inventories:
+        key = (*(inventory.get(field) for field in NODE_SET_FIELDS), _gres_layout(inventory))
+        groups.setdefault(key, []).append(inventory)
+
+    node_sets = []
+    for key, members in groups.items():
+        members.sort(key=lambda inv: int(inv.get("real_memory", 0)))
+        sets = []
+        for inventory in members:
+            memory = int(inventory.get("real_memory", 0))
+            if sets and memory <= sets[-1][0] * (1 + memory_tolerance / 100):
+                sets[-1][1].append(inventory)
+            else:
+                sets.append((memory, [inventory]))
+
+        for memory, nodes in sets:
+            nodes.sort(key=lambda inv: hostlist.sort_key(inv["node_name"]))
+            node_set = {
+                **{
+                    field: value for field, value in zip(NODE_SET_FIELDS, key) if value is not None
+                },
+                "node_name": hostlist.compress((inv["node_name"] for inv in nodes), False),
+                "real_memory": memory,
+                "count": len(nodes),
+            }
+            if gres_layout := key[-1]:
+                node_set["gres_devices"] = [dict(device) for device in gres_layout]
+            if all(inv.get("node_addr") for inv in nodes):
+                node_set["node_addr"] = hostlist.compress(
+                    (inv["node_addr"] for inv in nodes), False
+                )
+            node_sets.append((hostlist.sort_key(nodes[0]["node_name"]), node_set))
+
+    return [node_set for _, node_set in sorted(node_sets, key=lambda item: item[0])]
@@ -0,0 +1,60 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Write the state and logs of the charm atomically.
+
+Files are written to a temporary file that then replaces them, so that a
+hook or process reading them never sees a partial write. Failing to write is
+logged rather than raised, as the files only cache state or record logs.
+
+This module only imports the standard library, as the NHC wrapper run by
+slurmd outside of the charm environment uses it.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+
+def write_atomic(path: Path, content: str) -> bool:
+    """Replace the contents of a file, creating its directory if needed.
+
+    Returns:
+        True if the file was written.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(content)
+        os.replace(tmp, path)
+    except OSError as e:
+        _logger.warning(f"## Unable to write {path}: {e}")
+        return False
+    return True
+
+
+def append_rolling(path: Path, line: str, keep: int) -> bool:
+    """Append a line to a log, dropping the oldest lines beyond `keep`.
+
+    Returns:
+        True if the log was written.
+    """
+    try:
+        lines = path.read_text().splitlines() if path.exists() else []
+    except OSError as e:
+        _logger.warning(f"## Unable to read {path}: {e}")
+        return False
+    return write_atomic(path, "\n".join(lines[max(len(lines) - keep + 1, 0) :] + [line]) + "\n")
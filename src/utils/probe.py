@@ -0,0 +1,278 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Probe machine hardware by reading sysfs and procfs directly.
+
+The probe never forks child processes. All paths are resolved relative to a
+configurable root so that the probe can be pointed at a fake sysfs tree.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+_logger = logging.getLogger(__name__)
+
+
+class PciDevice(NamedTuple):
+    """PCI device found under /sys/bus/pci/devices."""
+
+    address: str
+    vendor: int
+    device: int
+    pci_class: int
+
+
+class Process(NamedTuple):
+    """Process found under /proc, with its resident set size in kB."""
+
+    pid: int
+    comm: str
+    cmdline: str
+    rss: int
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """Expand a kernel cpulist such as `0-3,8,10-11` into a sorted list of ids.
+
+    Args:
+        cpulist: Comma-separated list of ids and inclusive ranges.
+    """
+    cpus = set()
+    for chunk in cpulist.strip().split(","):
+        if not chunk:
+            continue
+        if "-" in chunk:
+            start, end = chunk.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(chunk))
+
+    return sorted(cpus)
+
+
+def format_cpulist(cpus: Iterable[int]) -> str:
+    """Collapse ids into a kernel cpulist such as `0-3,8,10-11`.
+
+    Args:
+        cpus: Ids to collapse. Duplicates are ignored.
+    """
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+class Probe:
+    """Read hardware information from sysfs and procfs.
+
+    Args:
+        root: Prefix that /sys and /proc are resolved under. Defaults to `/`.
+    """
+
+    def __init__(self, root: Union[str, Path] = "/") -> None:
+        self._root = Path(root)
+
+    @property
+    def root(self) -> Path:
+        """Return the filesystem prefix of the probe."""
+        return self._root
+
+    def path(self, path: str) -> Path:
+        """Resolve an absolute machine path under the probe root."""
+        return self._root / path.lstrip("/")
+
+    def read(self, path: str) -> Optional[str]:
+        """Return the stripped contents of a file, or None if it cannot be read."""
+        try:
+            return self.path(path).read_text().strip()
+        except OSError:
+            return None
+
+    def read_int(self, path: str, base: int = 10) -> Optional[int]:
+        """Return the contents of a file as an integer, or None if unavailable."""
+        value = self.read(path)
+        if value is None:
+            return None
+        try:
+            return int(value, base)
+        except ValueError:
+            _logger.debug(f"## Unable to parse {value!r} in {path} as an integer")
+            return None
+
+    def online_cpus(self) -> List[int]:
+        """Return the ids of all online cpus."""
+        if (online := self.read("/sys/devices/system/cpu/online")) is not None:
+            return parse_cpulist(online)
+
+        # Fall back to enumerating cpuN directories if `online` is missing.
+        cpu_dir = self.path("/sys/devices/system/cpu")
+        if not cpu_dir.is_dir():
+            return []
+        return sorted(
+            int(entry.name[3:])
+            for entry in cpu_dir.iterdir()
+            if entry.name.startswith("cpu") and entry.name[3:].isdigit()
+        )
+
+    def cpu_topology(self) -> Dict[int, Dict[str, int]]:
+        """Return the package and core id of each online cpu."""
+        topology = {}
+        for cpu in self.online_cpus():
+            base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+            topology[cpu] = {
+                "package": self.read_int(f"{base}/physical_package_id") or 0,
+                "core": self.read_int(f"{base}/core_id") or 0,
+            }
+
+        return topology
+
+    def cache_domains(self, level: int) -> List[List[int]]:
+        """Return the sets of online cpus sharing a cache of the given level.
+
+        Args:
+            level: Cache level to look up, e.g. 3 for the last level cache.
+        """
+        domains = []
+        seen = set()
+        for cpu in self.online_cpus():
+            # Every cpu of a domain reports the same shared_cpu_list.
+            if cpu in seen:
+                continue
+            cache_dir = self.path(f"/sys/devices/system/cpu/cpu{cpu}/cache")
+            if not cache_dir.is_dir():
+                continue
+            for index in sorted(cache_dir.glob("index*")):
+                base = f"/sys/devices/system/cpu/cpu{cpu}/cache/{index.name}"
+                if self.read_int(f"{base}/level") != level:
+                    continue
+                if (shared := self.read(f"{base}/shared_cpu_list")) is None:
+                    continue
+                domain = parse_cpulist(shared)
+                seen.update(domain)
+                domains.append(domain)
+                break
+
+        return domains
+
+    def numa_nodes(self) -> Dict[int, List[int]]:
+        """Return the cpus of each online NUMA node."""
+        if (online := self.read("/sys/devices/system/node/online")) is not None:
+            nodes = parse_cpulist(online)
+        elif (node_dir := self.path("/sys/devices/system/node")).is_dir():
+            nodes = sorted(
+                int(entry.name[4:])
+                for entry in node_dir.iterdir()
+                if entry.name.startswith("node") and entry.name[4:].isdigit()
+            )
+        else:
+            return {}
+
+        return {
+            node: parse_cpulist(self.read(f"/sys/devices/system/node/node{node}/cpulist") or "")
+            for node in nodes
+        }
+
+    def meminfo(self, node: Optional[int] = None) -> Dict[str, int]:
+        """Return meminfo as a dictionary of values in kB.
+
+        Args:
+            node: NUMA node to read meminfo of. Reads /proc/meminfo if not set.
+        """
+        if node is None:
+            content = self.read("/proc/meminfo")
+        else:
+            content = self.read(f"/sys/devices/system/node/node{node}/meminfo")
+        if content is None:
+            return {}
+
+        info = {}
+        for line in content.splitlines():
+            key, sep, value = line.partition(":")
+            if not sep or not (fields := value.split()):
+                continue
+            # Per node meminfo lines are prefixed with `Node <id> `.
+            if node is not None:
+                key = key.split()[-1]
+            try:
+                info[key.strip()] = int(fields[0])
+            except ValueError:
+                continue
+
+        return info
+
+    def pci_devices(self) -> List[PciDevice]:
+        """Return all devices found on the PCI bus."""
+        pci_dir = self.path("/sys/bus/pci/devices")
+        if not pci_dir.is_dir():
+            return []
+
+        devices = []
+        for entry in sorted(pci_dir.iterdir()):
+            base = f"/sys/bus/pci/devices/{entry.name}"
+            vendor = self.read_int(f"{base}/vendor", 16)
+            device = self.read_int(f"{base}/device", 16)
+            pci_class = self.read_int(f"{base}/class", 16)
+            if None in (vendor, device, pci_class):
+                continue
+            devices.append(PciDevice(entry.name, vendor, device, pci_class))
+
+        return devices
+
+    def default_interface(self) -> Optional[str]:
+        """Return the network interface of the default IPv4 route."""
+        for line in (self.read("/proc/net/route") or "").splitlines()[1:]:
+            fields = line.split()
+            if len(fields) > 1 and fields[1] == "00000000":
+                return fields[0]
+
+        return None
+
+    def interface_numa_node(self, interface: str) -> Optional[int]:
+        """Return the NUMA node of the device behind a network interface.
+
+        Returns:
+            None for virtual interfaces and devices without NUMA affinity.
+        """
+        node = self.read_int(f"/sys/class/net/{interface}/device/numa_node")
+        return node if node is not None and node >= 0 else None
+
+    def processes(self) -> List[Process]:
+        """Return the running processes, skipping those that exited while reading."""
+        proc_dir = self.path("/proc")
+        if not proc_dir.is_dir():
+            return []
+
+        processes = []
+        for entry in proc_dir.iterdir():
+            if not entry.name.isdigit():
+                continue
+            base = f"/proc/{entry.name}"
+            if (status := self.read(f"{base}/status")) is None:
+                continue
+            rss = 0
+            for line in status.splitlines():
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                    break
+            cmdline = (self.read(f"{base}/cmdline") or "").replace("\0", " ").strip()
+            processes.append(
+                Process(int(entry.name), self.read(f"{base}/comm") or "", cmdline, rss)
+            )
+
+        return sorted(processes)
@@ -0,0 +1,297 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in profiling of charm event handlers.
+
+Instrumented handlers record their wall time, every process they spawned
+with its duration, the Juju hook tools they called and every systemd call.
+Each handler run is appended as a JSON line to a log that keeps the most
+recent `MAX_RECORDS` runs. In `cprofile` mode, each handler run is also
+profiled with cProfile and dumped next to the log.
+
+Handlers are instrumented by shadowing them on their object, which is where
+the ops framework looks them up, so handlers do not change when profiling
+is off.
+"""
+
+import functools
+import json
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import systemd_dbus
+from .persist import append_rolling
+from .stats import percentile
+
+_logger = logging.getLogger(__name__)
+
+PROFILE_LOG = Path("/var/log/slurmd-operator/hook-profile.jsonl")
+# Handler runs kept in the log, and cProfile dumps kept next to it.
+MAX_RECORDS = 1000
+MAX_DUMPS = 20
+
+TIMING = "timing"
+CPROFILE = "cprofile"
+MODES = ("", TIMING, CPROFILE)
+
+# Juju hook tools, the charm reads and writes the model through these.
+HOOK_TOOLS = {
+    "action-fail",
+    "action-get",
+    "action-log",
+    "action-set",
+    "application-version-set",
+    "close-port",
+    "config-get",
+    "credential-get",
+    "goal-state",
+    "is-leader",
+    "juju-log",
+    "juju-reboot",
+    "leader-get",
+    "leader-set",
+    "network-get",
+    "open-port",
+    "opened-ports",
+    "relation-get",
+    "relation-ids",
+    "relation-list",
+    "relation-set",
+    "resource-get",
+    "state-delete",
+    "state-get",
+    "state-set",
+    "status-get",
+    "status-set",
+    "storage-get",
+    "storage-list",
+    "unit-get",
+}
+SYSTEMD_CALLS = (
+    "service_start",
+    "service_stop",
+    "service_restart",
+    "service_reload",
+    "service_running",
+    "service_enable",
+    "service_disable",
+    "daemon_reload",
+)
+
+
+def observed_handlers(obj: Any) -> List[Callable]:
+    """Return the event handlers of an object, by the `_on_` naming convention."""
+    return [getattr(obj, name) for name in dir(type(obj)) if name.startswith("_on_")]
+
+
+class _Recorder:
+    """Record the processes and systemd calls of the running handlers."""
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self._patched: Dict[Any, Dict[str, Any]] = {}
+
+    def _record(self, kind: str, name: str, seconds: float) -> None:
+        for record in self.records:
+            if kind == "hook_tools":
+                tool = record["hook_tools"].setdefault(name, {"calls": 0, "seconds": 0.0})
+                tool["calls"] += 1
+                tool["seconds"] = round(tool["seconds"] + seconds, 6)
+            else:
+                record[kind].append({"call": name, "seconds": round(seconds, 6)})
+
+    def _record_process(self, args: Any, seconds: float) -> None:
+        if isinstance(args, (str, bytes, os.PathLike)):
+            argv = os.fsdecode(args).split()
+        else:
+            argv = [os.fsdecode(arg) for arg in args]
+        tool = os.path.basename(argv[0]) if argv else ""
+        if tool in HOOK_TOOLS:
+            self._record("hook_tools", tool, seconds)
+        else:
+            self._record("processes", " ".join(argv), seconds)
+
+    def _patch(self, owner: Any, name: str, replacement: Callable) -> None:
+        self._patched.setdefault(owner, {})[name] = getattr(owner, name)
+        setattr(owner, name, replacement)
+
+    def start(self) -> None:
+        """Start recording the processes and systemd calls of the process."""
+        init, wait = subprocess.Popen.__init__, subprocess.Popen.wait
+        recorder = self
+
+        def patched_init(popen, args, *a, **kw):
+            popen._profile_start = time.perf_counter()
+            init(popen, args, *a, **kw)
+
+        def patched_wait(popen, *a, **kw):
+            returncode = wait(popen, *a, **kw)
+            start = popen.__dict__.pop("_profile_start", None)
+            if start is not None:
+                recorder._record_process(popen.args, time.perf_counter() - start)
+            return returncode
+
+        self._patch(subprocess.Popen, "__init__", patched_init)
+        self._patch(subprocess.Popen, "wait", patched_wait)
+        for name in SYSTEMD_CALLS:
+            self._patch(systemd_dbus, name, self._timed(name, getattr(systemd_dbus, name)))
+
+    def _timed(self, name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                call = " ".join([name, *(str(arg) for arg in args)])
+                self._record("systemd", call, time.perf_counter() - start)
+
+        return timed
+
+    def stop(self) -> None:
+        """Restore the instrumented functions."""
+        for owner, originals in self._patched.items():
+            for name, original in originals.items():
+                setattr(owner, name, original)
+        self._patched.clear()
+
+
+class HookProfiler:
+    """Profile event handlers if enabled.
+
+    Args:
+        mode: `timing` to record handler runs, `cprofile` to also dump a
+            cProfile of each run. Profiling is off otherwise.
+        log: JSON lines file the handler runs are appended to.
+    """
+
+    def __init__(self, mode: str = "", log: Optional[Path] = None) -> None:
+        if mode not in MODES:
+            _logger.warning(f"## Unknown hook profiling mode {mode}, profiling is off")
+            mode = ""
+        self.mode = mode
+        self._log = log or PROFILE_LOG
+        self._recorder = _Recorder()
+
+    def instrument(self, handlers: Iterable[Callable]) -> None:
+        """Profile the runs of bound event handlers, if profiling is enabled."""
+        if not self.mode:
+            return
+        for handler in handlers:
+            setattr(handler.__self__, handler.__name__, self._wrap(handler))
+
+    def _wrap(self, handler: Callable) -> Callable:
+        handler_name = f"{type(handler.__self__).__name__}.{handler.__name__}"
+
+        @functools.wraps(handler)
+        def profiled(event):
+            record = {
+                "event": event.handle.kind,
+                "handler": handler_name,
+                "hook": os.environ.get("JUJU_DISPATCH_PATH", ""),
+                "time": time.time(),
+                "processes": [],
+                "hook_tools": {},
+                "systemd": [],
+            }
+            outermost = not self._recorder.records
+            self._recorder.records.append(record)
+            if outermost:
+                self._recorder.start()
+            profile = None
+            if self.mode == CPROFILE:
+                import cProfile
+
+                profile = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                if profile is not None:
+                    return profile.runcall(handler, event)
+                return handler(event)
+            finally:
+                record["wall"] = round(time.perf_counter() - start, 6)
+                self._recorder.records.remove(record)
+                if outermost:
+                    self._recorder.stop()
+                if profile is not None:
+                    record["profile"] = self._dump(profile, record)
+                self._append(record)
+
+        return profiled
+
+    def _dump(self, profile: Any, record: dict) -> Optional[str]:
+        """Dump a cProfile, keeping the most recent `MAX_DUMPS` dumps."""
+        dumps = self._log.parent / "profiles"
+        path = dumps / f"{record['time']:.6f}-{record['event']}.prof"
+        try:
+            dumps.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(path)
+            for old in sorted(dumps.glob("*.prof"))[:-MAX_DUMPS]:
+                old.unlink()
+        except OSError as e:
+            _logger.warning(f"## Unable to dump profile of {record['event']}: {e}")
+            return None
+        return str(path)
+
+    def _append(self, record: dict) -> None:
+        """Append a handler run to the log, dropping the oldest runs beyond `MAX_RECORDS`."""
+        append_rolling(self._log, json.dumps(record, sort_keys=True), MAX_RECORDS)
+
+    def records(self) -> List[dict]:
+        """Return the recorded handler runs, oldest first."""
+        try:
+            return [json.loads(line) for line in self._log.read_text().splitlines() if line]
+        except (OSError, ValueError):
+            return []
+
+    def summary(self, event: Optional[str] = None) -> Dict[str, dict]:
+        """Aggregate the recorded handler runs per event.
+
+        Args:
+            event: Only summarize the runs of this event.
+
+        Returns:
+            The number of runs and the percentiles of the wall time, the time
+            spent in processes and systemd calls, and the hook tool calls of
+            the handlers of each event.
+        """
+        runs: Dict[str, List[dict]] = {}
+        for record in self.records():
+            if event is None or record["event"] == event:
+                runs.setdefault(record["event"], []).append(record)
+
+        summary = {}
+        for name, records in runs.items():
+            metrics = {
+                "wall": [r["wall"] for r in records],
+                "processes": [sum(p["seconds"] for p in r["processes"]) for r in records],
+                "systemd": [sum(c["seconds"] for c in r["systemd"]) for r in records],
+                "hook_tools": [
+                    sum(t["seconds"] for t in r["hook_tools"].values()) for r in records
+                ],
+                "hook_tool_calls": [
+                    sum(t["calls"] for t in r["hook_tools"].values()) for r in records
+                ],
+            }
+            summary[name] = {"runs": len(records)}
+            for metric, values in metrics.items():
+                summary[name][metric] = {
+                    f"p{q}": round(percentile(values, q), 6) for q in (50, 90, 99)
+                }
+                summary[name][metric]["max"] = round(max(values), 6)
+        return summary
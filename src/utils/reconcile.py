@@ -0,0 +1,172 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reconcile charm managed artifacts with their desired state.
+
+Every artifact declares its desired contents and the actions, such as
+`daemon-reload` or a service restart, that a change to it requires. The
+reconciler compares the desired contents with the current state by hash and
+only writes the artifacts that differ and runs the union of their actions,
+once each and in a fixed order.
+
+Artifacts with a `path` are compared against the file on disk. Artifacts
+rendered by other components, such as the NHC config or the fluentbit
+relation data, have no path. They are compared against the hash of the
+inputs they were last written with, which is recorded in a state file.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .persist import write_atomic
+
+_logger = logging.getLogger(__name__)
+
+RECONCILE_STATE = Path("/var/cache/slurmd-operator/artifacts.json")
+
+DAEMON_RELOAD = "daemon-reload"
+RESTART_MUNGE = "restart-munge"
+RESTART_SLURMD = "restart-slurmd"
+# Actions run in this order, e.g. systemd must reload a changed unit file
+# before the service is restarted, and slurmd needs a running munge.
+ACTIONS = (DAEMON_RELOAD, RESTART_MUNGE, RESTART_SLURMD)
+
+
+def digest(content: Union[str, bytes]) -> str:
+    """Return the sha256 hex digest of the contents of an artifact."""
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+class Artifact(NamedTuple):
+    """Desired state of a charm managed artifact.
+
+    Args:
+        name: Unique name of the artifact.
+        content: Desired contents of the file, or the inputs of `write`.
+        path: File the artifact is written to. If None, the artifact is
+            compared against the inputs it was last written with.
+        actions: Actions to run when the artifact changes.
+        mode: Permissions of the file.
+        write: Custom writer for artifacts rendered by another component.
+    """
+
+    name: str
+    content: Union[str, bytes]
+    path: Optional[Path] = None
+    actions: Tuple[str, ...] = ()
+    mode: int = 0o644
+    write: Optional[Callable[[], None]] = None
+
+
+class Plan(NamedTuple):
+    """Artifacts that differ from their desired state, and the actions to run."""
+
+    changed: List[str]
+    actions: List[str]
+
+    def __bool__(self) -> bool:
+        """Return True if anything needs to be done."""
+        return bool(self.changed)
+
+    def to_dict(self) -> dict:
+        """Return the plan as a dictionary."""
+        return {"changed": self.changed, "actions": self.actions}
+
+
+class Reconciler:
+    """Apply the minimal set of changes to reach the desired artifacts.
+
+    Args:
+        artifacts: Desired state of the managed artifacts.
+        state: File recording the inputs of artifacts without a path.
+    """
+
+    def __init__(self, artifacts: Iterable[Artifact], state: Optional[Path] = None) -> None:
+        self._artifacts = {artifact.name: artifact for artifact in artifacts}
+        self._state_file = state or RECONCILE_STATE
+
+    def _load_state(self) -> Dict[str, str]:
+        try:
+            return json.loads(self._state_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, str]) -> None:
+        write_atomic(self._state_file, json.dumps(state, sort_keys=True))
+
+    def _current(self, artifact: Artifact, state: Dict[str, str]) -> Optional[str]:
+        """Return the digest of the current state of an artifact."""
+        if artifact.path is None:
+            return state.get(artifact.name)
+        try:
+            return digest(artifact.path.read_bytes())
+        except OSError:
+            return None
+
+    def plan(self) -> Plan:
+        """Return what `apply()` would do without changing anything."""
+        state = self._load_state()
+        changed = [
+            name
+            for name, artifact in self._artifacts.items()
+            if self._current(artifact, state) != digest(artifact.content)
+        ]
+        actions = {action for name in changed for action in self._artifacts[name].actions}
+        return Plan(changed, [action for action in ACTIONS if action in actions])
+
+    def apply(self, handlers: Dict[str, Callable[[], None]]) -> Plan:
+        """Write the changed artifacts and run the actions they require.
+
+        Args:
+            handlers: Callable running each action. Actions without a handler
+                are skipped.
+
+        Returns:
+            The plan that was applied.
+        """
+        plan = self.plan()
+        if not plan:
+            _logger.debug("## Managed artifacts are up to date")
+            return plan
+
+        state = self._load_state()
+        for name in plan.changed:
+            artifact = self._artifacts[name]
+            _logger.debug(f"## Updating {name}")
+            if artifact.write is not None:
+                artifact.write()
+            else:
+                artifact.path.parent.mkdir(parents=True, exist_ok=True)
+                content = artifact.content
+                if isinstance(content, str):
+                    content = content.encode()
+                artifact.path.write_bytes(content)
+                artifact.path.chmod(artifact.mode)
+            if artifact.path is None:
+                state[name] = digest(artifact.content)
+
+        if any(self._artifacts[name].path is None for name in plan.changed):
+            self._save_state(state)
+
+        for action in plan.actions:
+            if handler := handlers.get(action):
+                _logger.debug(f"## Running {action}")
+                handler()
+
+        return plan
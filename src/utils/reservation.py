@@ -0,0 +1,144 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reserve cores and memory of the node for the system daemons.
+
+Slurm hands every cpu and all of RealMemory to jobs unless some are
+specialized for the system. The reservation is published in the node
+inventory as `cpu_spec_list` and `mem_spec_limit`, the CpuSpecList and
+MemSpecLimit of the node.
+
+Reserved cores are taken from the NUMA node of the NIC carrying the default
+route first, where the daemons and the network interrupts are served, and
+from the highest numbered cores like CoreSpecCount does. CpuSpecList is
+used rather than CoreSpecCount, which is mutually exclusive with it, as it
+is the only way to choose the cores.
+
+The reserved memory is measured from the resident size of the daemons run
+by the charm, with headroom, on top of a configured amount.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .probe import Probe, format_cpulist
+
+_logger = logging.getLogger(__name__)
+
+FIELDS = ("cpu_spec_list", "mem_spec_limit")
+# Daemons run on the node by the charm, by process name.
+DAEMONS = ("slurmd", "munged", "fluent-bit", "td-agent-bit")
+# The systemd notices daemon is a python process, matched on its command line.
+NOTICES_DAEMON = "juju_systemd_notices"
+# Growth allowed over the measured resident size of the daemons.
+MEMORY_HEADROOM = 1.5
+# MB the memory reservation is rounded up to, so that it does not change with
+# every fluctuation of the resident size of the daemons.
+MEMORY_GRANULARITY = 256
+
+
+def daemon_memory(probe: Optional[Probe] = None) -> int:
+    """Return the resident size in MB of the daemons run by the charm."""
+    probe = probe or Probe()
+    rss = sum(
+        process.rss
+        for process in probe.processes()
+        if process.comm in DAEMONS or NOTICES_DAEMON in process.cmdline
+    )
+    return math.ceil(rss / 1024)
+
+
+def nic_numa_node(probe: Optional[Probe] = None) -> Optional[int]:
+    """Return the NUMA node of the NIC carrying the default route."""
+    probe = probe or Probe()
+    if (interface := probe.default_interface()) is None:
+        return None
+    return probe.interface_numa_node(interface)
+
+
+def _cores(probe: Probe) -> Dict[Tuple[int, int], List[int]]:
+    """Return the cpus of each (package, core), ordered like Slurm abstract ids."""
+    cores: Dict[Tuple[int, int], List[int]] = {}
+    for cpu, topology in sorted(probe.cpu_topology().items()):
+        cores.setdefault((topology["package"], topology["core"]), []).append(cpu)
+    return dict(sorted(cores.items()))
+
+
+def reserved_cores(count: int, probe: Optional[Probe] = None) -> List[Tuple[int, int]]:
+    """Return the cores to reserve, preferring the NUMA node of the NIC.
+
+    Args:
+        count: Number of cores to reserve. At least one core is left to jobs.
+        probe: Probe of the node.
+    """
+    probe = probe or Probe()
+    cores = _cores(probe)
+    if count >= len(cores):
+        _logger.warning(f"## Unable to reserve {count} of {len(cores)} cores, leaving one to jobs")
+        count = len(cores) - 1
+
+    numa_map = {cpu: node for node, cpus in probe.numa_nodes().items() for cpu in cpus}
+    preferred = nic_numa_node(probe)
+    # Cores on the NUMA node of the NIC first, then the highest numbered cores.
+    ranked = sorted(
+        cores,
+        key=lambda core: (numa_map.get(cores[core][0]) != preferred, -core[0], -core[1]),
+    )
+    return sorted(ranked[: max(count, 0)])
+
+
+def abstract_cpus(cores: List[Tuple[int, int]], probe: Optional[Probe] = None) -> List[int]:
+    """Return the Slurm abstract ids of the cpus of cores.
+
+    Slurm numbers cpus by socket, then core, then thread, whatever the ids of
+    the kernel are.
+    """
+    probe = probe or Probe()
+    ids = []
+    for index, (core, cpus) in enumerate(_cores(probe).items()):
+        if core in cores:
+            ids.extend(index * len(cpus) + thread for thread in range(len(cpus)))
+    return ids
+
+
+def compute(cores: int = 0, memory: int = 0, probe: Optional[Probe] = None) -> dict:
+    """Return the inventory fields reserving cores and memory for the system.
+
+    Args:
+        cores: Number of cores to reserve.
+        memory: MB to reserve on top of the measured resident size of the
+            daemons run by the charm.
+        probe: Probe of the node.
+
+    Returns:
+        `cpu_spec_list` and `mem_spec_limit`, or no field if neither cores
+        nor memory are reserved.
+    """
+    if cores <= 0 and memory <= 0:
+        return {}
+
+    probe = probe or Probe()
+    reservation = {}
+    if cores > 0 and (reserved := reserved_cores(cores, probe)):
+        reservation["cpu_spec_list"] = format_cpulist(abstract_cpus(reserved, probe))
+
+    limit = memory + math.ceil(daemon_memory(probe) * MEMORY_HEADROOM)
+    limit = math.ceil(limit / MEMORY_GRANULARITY) * MEMORY_GRANULARITY
+    # Never reserve more than half of the memory of the node.
+    if (total := probe.meminfo().get("MemTotal", 0) // 1024) and limit > total // 2:
+        _logger.warning(f"## Unable to reserve {limit} of {total} MB, reserving half of it")
+        limit = total // 2
+    reservation["mem_spec_limit"] = limit
+    return reservation
@@ -21,16 +21,44 @@ This module also provides a wrapper for starting the slurmd service using system
 import datetime
 import logging
 import os
+import random
 import shlex
+import socket
 import subprocess
 import sys
 import textwrap
+import time
+import zlib
 from pathlib import Path
+from typing import List, Optional, Tuple
 
-import charms.operator_libs_linux.v1.systemd as systemd
+try:
+    from utils import systemd_dbus as systemd
+except ImportError:  # pragma: nocover
+    # Executed as the slurmd service wrapper, which does not control systemd.
+    import charms.operator_libs_linux.v1.systemd as systemd
 
 _logger = logging.getLogger(__name__)
 
+DEFAULT_FILE = Path("/etc/default/slurmd")
+# Read by the service on start only, so that changing it does not restart slurmd.
+START_WINDOW_FILE = Path("/etc/default/slurmd-start-window")
+SERVICE_OVERRIDE = Path("/etc/systemd/system/slurmd.service.d/99-slurmd-charm.conf")
+PYTHON_EXE = "/usr/bin/python3"
+SLURMD_PORT = 6818
+SLURMCTLD_PORT = 6817
+CONF_SERVER_TIMEOUT = 2
+SLURMD_PID_FILE = Path("/run/slurmd.pid")
+# Written once slurmd started, /run is emptied on boot.
+STARTED_MARKER = Path("/run/slurmd-charm/started")
+# Seconds systemd waits for the slurmd service to start.
+SERVICE_TIMEOUT = 900
+# Largest start window, leaving time within the service timeout to start slurmd.
+MAX_START_WINDOW = 600
+READY_POLL_INTERVAL = 0.05
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 60
+
 
 def start() -> None:
     """Start slurmd service."""
@@ -47,57 +75,207 @@ def restart() -> None:
     systemd.service_restart("slurmd")
 
 
-def override_default(host: str, port: int) -> None:
-    """Override the /etc/default/slurmd file.
+def default_file(host: str, port: int) -> str:
+    """Return the desired contents of the /etc/default/slurmd file.
 
     Args:
         host: Hostname of slurmctld service.
         port: Port number of slurmctld service
     """
-    _logger.debug(f"Overriding /etc/default/slurmd with hostname {host} and port {port}")
-    Path("/etc/default/slurmd").write_text(
-        textwrap.dedent(
-            f"""
+    return textwrap.dedent(f"""
             SLURMD_OPTIONS="--conf-server {host}:{port}"
             PYTHONPATH={Path.cwd() / "lib"}
-            """
-        ).strip()
-    )
+            """).strip()
 
 
-def override_service() -> None:
-    """Override the default slurmd systemd service file.
+def start_window_file(start_window: int = 0) -> str:
+    """Return the desired contents of the start window environment file.
 
-    Notes:
-        This method makes an invokes `systemd daemon-reload` after writing
-        the overrides.conf file for slurmd. This invocation will reload
-        all systemd units on the machine.
+    Args:
+        start_window: Seconds over which the start of slurmd after boot is spread
+            across nodes, at most `MAX_START_WINDOW`.
     """
-    _logger.debug("Overriding default slurmd service file")
-    if not (override_dir := Path("/etc/systemd/system/slurmd.service.d")).is_dir():
-        override_dir.mkdir()
+    return f"SLURMD_START_WINDOW={min(start_window, MAX_START_WINDOW)}"
+
 
-    overrides = override_dir / "99-slurmd-charm.conf"
-    overrides.write_text(
-        textwrap.dedent(
-            f"""
+def service_override() -> str:
+    """Return the desired contents of the slurmd service drop-in."""
+    return textwrap.dedent(f"""
             [Unit]
             ConditionPathExists=
 
             [Service]
             Type=forking
+            EnvironmentFile=-{START_WINDOW_FILE}
             ExecStart=
-            ExecStart=/usr/bin/python3 {__file__}
+            ExecStart={PYTHON_EXE} {__file__}
             LimitMEMLOCK=infinity
             LimitNOFILE=1048576
-            TimeoutSec=900
-            """
-        ).strip()
-    )
-    systemd.daemon_reload()
+            TimeoutSec={SERVICE_TIMEOUT}
+            """).strip()
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    """Write `content` to `path` unless the file already holds it.
+
+    Returns:
+        True if the file was written.
+    """
+    try:
+        if path.read_text() == content:
+            return False
+    except OSError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return True
+
+
+def override_default(host: str, port: int) -> bool:
+    """Override the /etc/default/slurmd file.
+
+    Args:
+        host: Hostname of slurmctld service.
+        port: Port number of slurmctld service
+
+    Returns:
+        True if the file changed.
+    """
+    _logger.debug(f"Overriding {DEFAULT_FILE} with hostname {host} and port {port}")
+    return _write_if_changed(DEFAULT_FILE, default_file(host, port))
+
+
+def override_service() -> bool:
+    """Override the default slurmd systemd service file.
+
+    Notes:
+        This method invokes `systemd daemon-reload` after writing the
+        overrides.conf file for slurmd, but only if the file changed. This
+        invocation will reload all systemd units on the machine.
+
+    Returns:
+        True if the file changed.
+    """
+    _logger.debug("Overriding default slurmd service file")
+    if changed := _write_if_changed(SERVICE_OVERRIDE, service_override()):
+        systemd.daemon_reload()
+    return changed
+
+
+def _conf_servers(options: str) -> List[Tuple[str, int]]:
+    """Return the configless servers passed to slurmd with `--conf-server`.
+
+    Args:
+        options: Command line options of slurmd, e.g. the value of $SLURMD_OPTIONS.
+    """
+    args = shlex.split(options)
+    servers = []
+    for i, arg in enumerate(args):
+        if arg.startswith("--conf-server="):
+            value = arg.split("=", 1)[1]
+        elif arg == "--conf-server" and i + 1 < len(args):
+            value = args[i + 1]
+        else:
+            continue
+        for server in value.split(","):
+            host, _, port = server.partition(":")
+            servers.append((host, int(port or SLURMCTLD_PORT)))
+
+    return servers
 
 
-def _start_slurmd_service() -> None:
+def _conf_server_reachable(servers: List[Tuple[str, int]]) -> bool:
+    """Check if any of the configless servers accepts connections.
+
+    Args:
+        servers: Host and port of each configless server. If empty, slurmd
+            reads its configuration locally and there is nothing to wait for.
+    """
+    for host, port in servers:
+        try:
+            with socket.create_connection((host, port), timeout=CONF_SERVER_TIMEOUT):
+                return True
+        except OSError as e:
+            _logger.debug(f"Configless server {host}:{port} is not reachable: {e}")
+
+    return not servers
+
+
+def _start_delay(hostname: str, window: float) -> float:
+    """Return the start delay slot of a node within the start window.
+
+    The slot is derived from a hash of the hostname so that it is stable for
+    a node and spread uniformly across the nodes of a cluster.
+
+    Args:
+        hostname: Hostname of the node.
+        window: Seconds over which the start of slurmd is spread.
+    """
+    if window <= 0:
+        return 0.0
+    return (zlib.crc32(hostname.encode()) % 1000) / 1000 * window
+
+
+def _jitter(delay: float) -> float:
+    """Return `delay` with random jitter so that retrying nodes do not synchronize."""
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _slurmd_ready(pid: int, port: int, pid_file: Path) -> bool:
+    """Check if a running slurmd daemon is ready to serve requests.
+
+    slurmd is ready once it either accepts connections on its port
+    or has written its pid file.
+
+    Args:
+        pid: Process id of the slurmd daemon.
+        port: Port slurmd listens on.
+        pid_file: Pid file written by slurmd.
+    """
+    try:
+        if pid_file.read_text().strip() == str(pid):
+            return True
+    except OSError:
+        pass
+
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+            return True
+    except OSError:
+        return False
+
+
+def _wait_for_slurmd(process: subprocess.Popen, port: int, pid_file: Path, timeout: float) -> bool:
+    """Wait until slurmd is ready or exits.
+
+    Args:
+        process: The slurmd process.
+        port: Port slurmd listens on.
+        pid_file: Pid file written by slurmd.
+        timeout: Seconds to wait for a readiness signal. If slurmd is still
+            running once the timeout is reached it is considered started.
+
+    Returns:
+        True if slurmd is running, False if it exited.
+    """
+    deadline = time.monotonic() + timeout
+    while process.poll() is None:
+        if _slurmd_ready(process.pid, port, pid_file) or time.monotonic() >= deadline:
+            return True
+        time.sleep(READY_POLL_INTERVAL)
+
+    _logger.warning(f"slurmd exited with return code {process.returncode}")
+    return False
+
+
+def _start_slurmd_service(
+    slurmd: str = "/usr/sbin/slurmd",
+    port: int = SLURMD_PORT,
+    pid_file: Path = SLURMD_PID_FILE,
+    ready_timeout: float = 30,
+    started: Optional[Path] = None,
+) -> None:
     """Start the slurmd service on machine.
 
     This method is invoked when the slurmd utils module is executed as a runnable
@@ -105,31 +283,61 @@ def _start_slurmd_service() -> None:
     the slurmd service is started with `systemctl start slurmd`. The difference
     is that this method attempts to start the slurmd daemon over the course of
     15 minutes since the slurm.conf file may not be ready on the slurmctld server.
+    slurmd is only launched once the configless server accepts connections,
+    and failed attempts are retried with jittered exponential backoff. The
+    first start since boot is delayed by a per-node slot within
+    $SLURMD_START_WINDOW, which counts against the 15 minutes. Restarts, e.g.
+    by the charm, are not delayed.
+
+    Args:
+        slurmd: Path to the slurmd binary.
+        port: Port slurmd listens on.
+        pid_file: Pid file written by slurmd.
+        ready_timeout: Seconds to wait for slurmd to signal readiness.
+        started: Marker of slurmd having started since boot.
     """
+    started = started or STARTED_MARKER
     # Environment variables must be expanded here because the Popen
     # command will fail to execute if the inline environment variable
     # has a whitespace-delimited value. $SLURMD_OPTIONS is white-space
     # delimited, so it is expanded here to simplify the call to Popen.
-    slurmd_cmd = shlex.split(os.path.expandvars("/usr/sbin/slurmd -D -s $SLURMD_OPTIONS"))
+    slurmd_cmd = shlex.split(os.path.expandvars(f"{slurmd} -D -s $SLURMD_OPTIONS"))
+
+    servers = _conf_servers(os.environ.get("SLURMD_OPTIONS", ""))
 
-    # Try to start slurmd with ~30 seconds in-between each attempt. Timeout after 15 minutes.
+    # Try to start slurmd with jittered exponential backoff between attempts.
+    # Timeout after 15 minutes.
     end_time = datetime.datetime.now() + datetime.timedelta(minutes=15)
+
+    # Spread the first start of slurmd after boot across nodes so that a
+    # cluster wide reboot does not hit the configless server all at once.
+    window = min(float(os.environ.get("SLURMD_START_WINDOW") or 0), MAX_START_WINDOW)
+    if not started.exists() and (start_delay := _start_delay(socket.gethostname(), window)):
+        _logger.info(f"Delaying start of slurmd by {start_delay:.1f} seconds")
+        time.sleep(start_delay)
+
+    delay = BACKOFF_INITIAL
     while True:
         if datetime.datetime.now() >= end_time:
             _logger.error("Failed to start slurmd daemon. Timeout exceeded")
             sys.exit(1)
+
+        # Only launch slurmd once the configless server accepts connections.
+        if not _conf_server_reachable(servers):
+            _logger.info("Configless server is not reachable")
         else:
-            try:
-                process = subprocess.Popen(slurmd_cmd, env=os.environ)
-                # There needs to be a slight delay here to give slurmd
-                # enough time to fail if configuration file is not ready yet.
-                # If timeout is reached, this means the slurmd is running.
-                # If exit code is returned, this means slurmd failed and is not running.
-                process.wait(timeout=30)
-            except subprocess.TimeoutExpired:
+            process = subprocess.Popen(slurmd_cmd, env=os.environ)
+            if _wait_for_slurmd(process, port, pid_file, ready_timeout):
                 _logger.info("Slurmd successfully started")
+                started.parent.mkdir(parents=True, exist_ok=True)
+                started.touch()
                 break
 
+        sleep = _jitter(delay)
+        _logger.info(f"Retrying to start slurmd in {sleep:.1f} seconds")
+        time.sleep(sleep)
+        delay = min(delay * 2, BACKOFF_MAX)
+
 
 if __name__ == "__main__":  # pragma: nocover
     _start_slurmd_service()
@@ -0,0 +1,34 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Statistics of the recorded runtimes of hooks and health checks.
+
+This module only imports the standard library, as the NHC wrapper run by
+slurmd outside of the charm environment uses it.
+"""
+
+import math
+from typing import List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the nearest-rank percentile of values.
+
+    Args:
+        values: Values to compute the percentile of.
+        q: Percentile between 0 and 100.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
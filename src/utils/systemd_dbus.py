@@ -0,0 +1,296 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Control systemd over a persistent D-Bus connection.
+
+The functions of this module mirror `charms.operator_libs_linux.v1.systemd`,
+but talk to `org.freedesktop.systemd1.Manager` over one system bus connection
+per process instead of forking a `systemctl` process per call. Like
+`systemctl`, unit jobs block until systemd reports them as finished. If the
+system bus is unavailable, the calls fall back to `systemctl`.
+
+`dbus_fast` is imported on the first call, so that hooks which do not
+control systemd do not pay for importing it.
+"""
+
+import asyncio
+import functools
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import charms.operator_libs_linux.v1.systemd as systemctl
+from charms.operator_libs_linux.v1.systemd import SystemdError
+
+if TYPE_CHECKING:  # pragma: nocover
+    from dbus_fast import Message
+
+_logger = logging.getLogger(__name__)
+
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_PATH = "/org/freedesktop/systemd1"
+MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+UNIT_INTERFACE = "org.freedesktop.systemd1.Unit"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+# Seconds to wait for systemd to finish a unit job.
+JOB_TIMEOUT = 900
+
+
+def _unit_name(name: str) -> str:
+    """Return the full unit name, defaulting to a service like `systemctl` does."""
+    return name if "." in name else f"{name}.service"
+
+
+class SystemdBus:
+    """Persistent connection to the systemd manager.
+
+    Args:
+        address: D-Bus address to connect to. Defaults to the system bus.
+        timeout: Seconds to wait for unit jobs to finish.
+    """
+
+    def __init__(self, address: Optional[str] = None, timeout: float = JOB_TIMEOUT) -> None:
+        self._address = address
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._bus = None
+        # Results of jobs that finished before their path was known, futures
+        # of the jobs being waited for, and the number of jobs being queued.
+        self._results: Dict[str, str] = {}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._queuing = 0
+
+    def _run(self, coro) -> Any:
+        return self._loop.run_until_complete(coro)
+
+    def connect(self) -> "SystemdBus":
+        """Connect to the bus and subscribe to job completion signals."""
+        self._run(self._connect())
+        return self
+
+    async def _connect(self) -> None:
+        from dbus_fast import BusType
+        from dbus_fast.aio import MessageBus
+
+        self._bus = await MessageBus(bus_address=self._address, bus_type=BusType.SYSTEM).connect()
+        self._bus.add_message_handler(self._on_message)
+        match = (
+            f"type='signal',sender='{SYSTEMD_BUS_NAME}',path='{SYSTEMD_PATH}',"
+            f"interface='{MANAGER_INTERFACE}',member='JobRemoved'"
+        )
+        await self._call(
+            "AddMatch",
+            "s",
+            [match],
+            destination="org.freedesktop.DBus",
+            path="/org/freedesktop/DBus",
+            interface="org.freedesktop.DBus",
+        )
+        # systemd only emits signals once a client subscribed.
+        await self._call("Subscribe")
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self._bus is not None:
+            self._bus.disconnect()
+            self._bus = None
+        self._loop.close()
+
+    def _on_message(self, msg: "Message") -> None:
+        """Record the result of the jobs queued by this process."""
+        from dbus_fast import MessageType
+
+        if msg.message_type != MessageType.SIGNAL or msg.member != "JobRemoved":
+            return
+        _, job, _, result = msg.body
+        if (waiter := self._waiters.pop(job, None)) is not None and not waiter.done():
+            waiter.set_result(result)
+        elif self._queuing:
+            # The job may be ours while its path is not known yet, the
+            # results of other jobs are dropped once the paths are known.
+            self._results[job] = result
+
+    async def _call(
+        self,
+        member: str,
+        signature: str = "",
+        body: Optional[List[Any]] = None,
+        destination: str = SYSTEMD_BUS_NAME,
+        path: str = SYSTEMD_PATH,
+        interface: str = MANAGER_INTERFACE,
+    ) -> List[Any]:
+        from dbus_fast import Message, MessageType
+
+        reply = await self._bus.call(
+            Message(
+                destination=destination,
+                path=path,
+                interface=interface,
+                member=member,
+                signature=signature,
+                body=body or [],
+            )
+        )
+        if reply.message_type == MessageType.ERROR:
+            raise SystemdError(f"Could not {member}: {reply.error_name}: {reply.body}")
+        return reply.body
+
+    async def _job(self, member: str, name: str) -> bool:
+        """Queue a unit job and wait until systemd finished it."""
+        unit = _unit_name(name)
+        self._queuing += 1
+        try:
+            (job,) = await self._call(member, "ss", [unit, "replace"])
+        finally:
+            self._queuing -= 1
+        result = self._results.pop(job, None)
+        if not self._queuing:
+            self._results.clear()
+        if result is None:
+            waiter = self._waiters[job] = self._loop.create_future()
+            try:
+                result = await asyncio.wait_for(waiter, self._timeout)
+            except asyncio.TimeoutError:
+                self._waiters.pop(job, None)
+                raise SystemdError(f"Timed out waiting for {member} of {unit}")
+
+        if result != "done":
+            raise SystemdError(f"Could not {member} {unit}: job {result}")
+        return True
+
+    def start(self, name: str) -> bool:
+        """Start a unit."""
+        return self._run(self._job("StartUnit", name))
+
+    def stop(self, name: str) -> bool:
+        """Stop a unit."""
+        return self._run(self._job("StopUnit", name))
+
+    def restart(self, name: str) -> bool:
+        """Restart a unit."""
+        return self._run(self._job("RestartUnit", name))
+
+    def reload(self, name: str) -> bool:
+        """Reload the configuration of a unit."""
+        return self._run(self._job("ReloadUnit", name))
+
+    async def _active_state(self, name: str) -> str:
+        try:
+            (path,) = await self._call("GetUnit", "s", [_unit_name(name)])
+        except SystemdError:
+            # Units that are not loaded are inactive.
+            return "inactive"
+        (state,) = await self._call(
+            "Get",
+            "ss",
+            [UNIT_INTERFACE, "ActiveState"],
+            path=path,
+            interface=PROPERTIES_INTERFACE,
+        )
+        return state.value
+
+    def is_active(self, name: str) -> bool:
+        """Return True if a unit is active."""
+        return self._run(self._active_state(name)) in ("active", "reloading")
+
+    async def _enable(self, name: str, enable: bool) -> bool:
+        if enable:
+            await self._call("EnableUnitFiles", "asbb", [[_unit_name(name)], False, False])
+        else:
+            await self._call("DisableUnitFiles", "asb", [[_unit_name(name)], False])
+        # `systemctl enable` reloads systemd after changing the unit files.
+        await self._call("Reload")
+        return True
+
+    def enable(self, name: str) -> bool:
+        """Enable a unit."""
+        return self._run(self._enable(name, True))
+
+    def disable(self, name: str) -> bool:
+        """Disable a unit."""
+        return self._run(self._enable(name, False))
+
+    def daemon_reload(self) -> bool:
+        """Reload the systemd manager configuration."""
+        self._run(self._call("Reload"))
+        return True
+
+
+@functools.lru_cache(maxsize=None)
+def backend() -> Optional[SystemdBus]:
+    """Return the connection to systemd of this process, or None if there is no bus."""
+    from dbus_fast.errors import DBusFastError
+
+    bus = SystemdBus()
+    try:
+        return bus.connect()
+    except (OSError, EOFError, DBusFastError, SystemdError) as e:
+        _logger.debug(f"## D-Bus unavailable, falling back to systemctl: {e}")
+        bus.close()
+        return None
+
+
+def service_start(name: str) -> bool:
+    """Start a service."""
+    if (bus := backend()) is not None:
+        return bus.start(name)
+    return systemctl.service_start(name)
+
+
+def service_stop(name: str) -> bool:
+    """Stop a service."""
+    if (bus := backend()) is not None:
+        return bus.stop(name)
+    return systemctl.service_stop(name)
+
+
+def service_restart(name: str) -> bool:
+    """Restart a service."""
+    if (bus := backend()) is not None:
+        return bus.restart(name)
+    return systemctl.service_restart(name)
+
+
+def service_reload(name: str) -> bool:
+    """Reload the configuration of a service."""
+    if (bus := backend()) is not None:
+        return bus.reload(name)
+    return systemctl.service_reload(name)
+
+
+def service_running(name: str) -> bool:
+    """Return True if a service is active."""
+    if (bus := backend()) is not None:
+        return bus.is_active(name)
+    return systemctl.service_running(name)
+
+
+def service_enable(name: str) -> bool:
+    """Enable a service."""
+    if (bus := backend()) is not None:
+        return bus.enable(name)
+    return systemctl._systemctl("enable", name)
+
+
+def service_disable(name: str) -> bool:
+    """Disable a service."""
+    if (bus := backend()) is not None:
+        return bus.disable(name)
+    return systemctl._systemctl("disable", name)
+
+
+def daemon_reload() -> bool:
+    """Reload the systemd manager configuration."""
+    if (bus := backend()) is not None:
+        return bus.daemon_reload()
+    return systemctl.daemon_reload()
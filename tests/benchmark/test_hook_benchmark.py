@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the hooks and actions of the charm against stored baselines.
+
+Every scenario drives `SlurmdCharm` through Harness into a known state, then
+runs one hook or action while counting its Juju hook tool calls, processes,
+systemd calls and the bytes it wrote to relation data. Processes, systemd and
+hook tools are stand-ins which sleep for a fixed latency, so that the wall
+time of a hook mostly reflects how many of them it uses.
+
+A scenario fails if it makes more calls or writes more bytes than its
+baseline, or is much slower. Run with `UPDATE_HOOK_BASELINES=1` to record new
+baselines after an intended change.
+"""
+
+import base64
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from unittest.mock import patch
+
+from ops.testing import Harness
+
+import charm
+from charm import SlurmdCharm
+from utils.probe import Probe
+
+# The sysfs builder is shared with the unit tests.
+sys.path.insert(0, str(Path(__file__).parents[1] / "unit" / "utils"))
+import fake_sysfs  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+BASELINES = Path(__file__).parent / "hook_baselines.json"
+UPDATE_BASELINES = os.environ.get("UPDATE_HOOK_BASELINES") == "1"
+ROUNDS = 3
+# Injected latency of a forked process, a systemd call over D-Bus and a hook tool.
+PROCESS_LATENCY = 0.005
+SYSTEMD_LATENCY = 0.002
+HOOK_TOOL_LATENCY = 0.002
+# Slack on the baseline wall time, which varies with the machine running the benchmark.
+WALL_TOLERANCE = 1.5
+WALL_SLACK_MS = 10.0
+COUNTERS = ("hook_tools", "processes", "systemd", "relation_bytes")
+
+# Backend methods running a hook tool. Harness writes relation data in
+# update_relation_data, where the real backend runs relation-set.
+HOOK_TOOLS = (
+    "action_fail",
+    "action_get",
+    "action_log",
+    "action_set",
+    "add_metrics",
+    "application_version_set",
+    "close_port",
+    "config_get",
+    "credential_get",
+    "is_leader",
+    "juju_log",
+    "network_get",
+    "open_port",
+    "opened_ports",
+    "planned_units",
+    "reboot",
+    "relation_get",
+    "relation_ids",
+    "relation_list",
+    "relation_set",
+    "resource_get",
+    "status_get",
+    "status_set",
+    "storage_get",
+    "storage_list",
+    "update_relation_data",
+)
+MUNGE_KEY = base64.b64encode(b"munge" * 200).decode()
+SLURMCTLD_APP_DATA = {
+    "munge_key": MUNGE_KEY,
+    "slurmctld_host": "ctld-0",
+    "slurmctld_port": "6817",
+    "cluster_name": "cluster",
+    "nhc_params": "-X 5",
+}
+
+
+class _Calls:
+    """Counters of the stand-ins while a hook runs."""
+
+    def __init__(self) -> None:
+        self.recording = False
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        if self.recording:
+            self.counts[counter] += amount
+
+
+_calls = _Calls()
+
+
+class _Popen:
+    """Stand-in for a forked process, which exits successfully after a latency."""
+
+    def __init__(self, args: Any, *_, stdout: Any = None, **kwargs) -> None:
+        _calls.add("processes")
+        time.sleep(PROCESS_LATENCY)
+        self.args = args
+        self.pid = 0
+        self.returncode = 0
+        self.stdin = self.stderr = None
+        self._text = bool(kwargs.get("text") or kwargs.get("universal_newlines"))
+        self._output = b"" if stdout == subprocess.PIPE else None
+        self.stdout = None
+
+    def communicate(self, input: Any = None, timeout: Optional[float] = None):
+        output = self._output.decode() if self._text and self._output is not None else self._output
+        return output, None
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        return self.returncode
+
+    def poll(self) -> int:
+        return self.returncode
+
+    def kill(self) -> None:
+        pass
+
+    terminate = kill
+
+    def __enter__(self) -> "_Popen":
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+class _SystemdBus:
+    """Stand-in for the D-Bus connection to systemd."""
+
+    def _call(self, *_) -> bool:
+        _calls.add("systemd")
+        time.sleep(SYSTEMD_LATENCY)
+        return True
+
+    start = stop = restart = reload = is_active = enable = disable = _call
+
+    def daemon_reload(self) -> bool:
+        return self._call()
+
+
+class _SlurmManager:
+    """Stand-in for the slurm operations manager, forking the processes it runs."""
+
+    hostname = "node-0"
+    fluentbit_config_nhc = [{"input": [("name", "tail"), ("path", "/var/log/nhc.log")]}]
+    fluentbit_config_slurm = [{"input": [("name", "tail"), ("path", "/var/log/slurm/*.log")]}]
+
+    def __init__(self, charm, component) -> None:
+        self._nhc_conf = ""
+
+    def install(self, custom_repo, nhc_path) -> bool:
+        subprocess.run(["apt-get", "update"], check=True)
+        subprocess.run(["apt-get", "install", "-y", "slurmd", "munge", "mailutils"], check=True)
+        subprocess.run(["tar", "--extract", "--file", str(nhc_path)], check=True)
+        subprocess.run(["make", "install"], check=True)
+        return True
+
+    def check_munged(self) -> bool:
+        return subprocess.run("munge -n | unmunge", shell=True).returncode == 0
+
+    def restart_munged(self) -> bool:
+        subprocess.run(["systemctl", "restart", "munge"], check=True)
+        return self.check_munged()
+
+    def configure_munge_key(self, munge_key: str) -> None:
+        charm.MUNGE_KEY.write_bytes(base64.b64decode(munge_key))
+
+    def render_nhc_config(self, nhc_conf: str) -> None:
+        self._nhc_conf = nhc_conf
+
+    def get_nhc_config(self) -> str:
+        return self._nhc_conf
+
+    def slurm_version(self) -> str:
+        return subprocess.run(["slurmd", "-V"], capture_output=True, text=True).stdout
+
+    def munge_version(self) -> str:
+        return subprocess.run(["munged", "-V"], capture_output=True, text=True).stdout
+
+
+class TestHookBenchmark(unittest.TestCase):
+    """Compare the cost of every hook and action with its baseline."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        if UPDATE_BASELINES:
+            BASELINES.write_text(json.dumps(cls.baselines, indent=2, sort_keys=True) + "\n")
+
+    def _harness(self, installed: bool = True, joined: bool = False) -> Harness:
+        """Return a charm on a fresh machine, optionally installed and related to slurmctld."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        fake_sysfs.add_cpus(root, sockets=2, cores_per_socket=16, threads_per_core=2)
+        fake_sysfs.add_meminfo(root, 256 * 1024 * 1024)
+        (root / "hooks").mkdir()
+        (root / "version").write_text("1.0.0")
+        cwd = os.getcwd()
+        os.chdir(root)
+        self.addCleanup(os.chdir, cwd)
+        profile = {"event": "update_status", "wall": 0.01, "processes": [], "systemd": []}
+        (root / "hook-profile.jsonl").write_text(json.dumps({**profile, "hook_tools": {}}))
+        nhc_run = {
+            "seconds": 0.5,
+            "returncode": 0,
+            "checks": [{"check": "check_ps", "seconds": 0.1}],
+        }
+        (root / "nhc-profile.jsonl").write_text(json.dumps(nhc_run))
+
+        for target, value in {
+            "charm.MUNGE_KEY": root / "munge.key",
+            "utils.base.BASE_STATE": root / "base.json",
+            "utils.base.detect": lambda: {"id": "ubuntu", "version": "22.04"},
+            "utils.health.HEALTH_STATE": root / "health.json",
+            "utils.nhc.PROFILE_LOG": root / "nhc-profile.jsonl",
+            "utils.nhc.TIMING_SCRIPT": root / "charm_timing.nhc",
+            "utils.nhc.WRAPPER": root / "omni-nhc-wrapper",
+            "utils.inventory.INVENTORY_CACHE": root / "inventory.json",
+            "utils.machine.Probe": functools.partial(Probe, root),
+            "utils.profiling.PROFILE_LOG": root / "hook-profile.jsonl",
+            "utils.reconcile.RECONCILE_STATE": root / "artifacts.json",
+            "utils.slurmd.DEFAULT_FILE": root / "default",
+            "utils.slurmd.SERVICE_OVERRIDE": root / "override.conf",
+            "utils.slurmd.START_WINDOW_FILE": root / "start-window",
+            "utils.systemd_dbus.backend": _SystemdBus,
+            "slurm_ops_manager.SlurmManager": _SlurmManager,
+            "subprocess.Popen": _Popen,
+            "charms.operator_libs_linux.v0.juju_systemd_notices.SystemdNotices.stats": lambda _: {
+                "messages": 0
+            },
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        harness = self.harness = Harness(SlurmdCharm)
+        self.addCleanup(harness.cleanup)
+        self._count_hook_tools(harness)
+        harness.add_resource("nhc", b"nhc")
+        harness.set_leader(True)
+        harness.begin()
+        notices = harness.charm._systemd_notices
+        notices._service_file = root / "juju-slurmd-0-systemd-notices.service"
+
+        if installed:
+            harness.charm.on.install.emit()
+        if joined:
+            self._relate(harness)()
+            harness.update_relation_data(self.relation, "slurmctld", SLURMCTLD_APP_DATA)
+            self._join(harness)()
+        harness.framework.commit()
+        return harness
+
+    def _relate(self, harness: Harness) -> Callable[[], None]:
+        """Relate to slurmctld, returning the relation-created hook."""
+        with harness.hooks_disabled():
+            self.relation = harness.add_relation("slurmd", "slurmctld")
+            # Juju sets the address of the unit before relation-created.
+            harness.update_relation_data(
+                self.relation, "slurmd/0", {"ingress-address": "10.0.0.10"}
+            )
+        relation = harness.model.get_relation("slurmd", self.relation)
+        return lambda: harness.charm.on["slurmd"].relation_created.emit(relation, relation.app)
+
+    def _join(self, harness: Harness) -> Callable[[], None]:
+        """Add the slurmctld unit, returning the relation-joined hook."""
+        with harness.hooks_disabled():
+            harness.add_relation_unit(self.relation, "slurmctld/0")
+            harness.update_relation_data(
+                self.relation, "slurmctld/0", {"ingress-address": "10.0.0.1"}
+            )
+        relation = harness.model.get_relation("slurmd", self.relation)
+        unit = harness.model.get_unit("slurmctld/0")
+        return lambda: harness.charm.on["slurmd"].relation_joined.emit(relation, unit.app, unit)
+
+    def _count_hook_tools(self, harness: Harness) -> None:
+        """Count the hook tool calls of the charm and the bytes it writes to relation data."""
+        backend = harness._backend
+
+        def counted(name: str, method: Callable) -> Callable:
+            @functools.wraps(method)
+            def hook_tool(*args, **kwargs):
+                _calls.add("hook_tools")
+                if _calls.recording:
+                    time.sleep(HOOK_TOOL_LATENCY)
+                if name in ("relation_set", "update_relation_data"):
+                    data = kwargs.get("data", {})
+                    _calls.add("relation_bytes", sum(len(k) + len(v) for k, v in data.items()))
+                return method(*args, **kwargs)
+
+            return hook_tool
+
+        for name in HOOK_TOOLS:
+            setattr(backend, name, counted(name, getattr(backend, name)))
+
+    def _measure(self, name: str, scenario: Callable[[], Callable[[], Any]]) -> None:
+        """Run a scenario and compare it with its baseline.
+
+        Args:
+            name: Name of the scenario in the baselines.
+            scenario: Sets up the charm and returns the hook or action to measure.
+        """
+        walls = []
+        for _ in range(ROUNDS):
+            run = scenario()
+            _calls.counts = dict.fromkeys(COUNTERS, 0)
+            _calls.recording = True
+            start = time.perf_counter()
+            try:
+                run()
+                # Like at the end of a hook, where the charm publishes its relation data.
+                self.harness.framework.commit()
+            finally:
+                walls.append(time.perf_counter() - start)
+                _calls.recording = False
+            self.doCleanups()
+        result = {**_calls.counts, "wall_ms": round(min(walls) * 1e3, 3)}
+        logger.info(f"{name}: {result}")
+
+        if UPDATE_BASELINES or name not in self.baselines:
+            self.baselines[name] = result
+            if not UPDATE_BASELINES:
+                self.fail(f"No baseline for {name}, record it with UPDATE_HOOK_BASELINES=1")
+            return
+
+        baseline = self.baselines[name]
+        for counter in COUNTERS:
+            self.assertLessEqual(
+                result[counter], baseline[counter], f"{name} regressed in {counter}: {result}"
+            )
+        self.assertLessEqual(
+            result["wall_ms"],
+            baseline["wall_ms"] * WALL_TOLERANCE + WALL_SLACK_MS,
+            f"{name} regressed in wall time: {result}",
+        )
+
+    def _action(self, name: str, params: Optional[Dict[str, Any]] = None) -> None:
+        def scenario():
+            harness = self._harness(joined=True)
+            return lambda: harness.run_action(name, params)
+
+        self._measure(f"action-{name}", scenario)
+
+    def test_install(self) -> None:
+        def scenario():
+            harness = self._harness(installed=False)
+            return harness.charm.on.install.emit
+
+        self._measure("install", scenario)
+
+    def test_config_changed(self) -> None:
+        def scenario():
+            harness = self._harness(joined=True)
+            return lambda: harness.update_config({"nhc-conf": "* || check_fs_mount_rw -f /"})
+
+        self._measure("config-changed", scenario)
+
+    def test_update_status(self) -> None:
+        def scenario():
+            harness = self._harness(joined=True)
+            # The munge health check is cached by the previous update-status.
+            harness.charm.on.update_status.emit()
+            return harness.charm.on.update_status.emit
+
+        self._measure("update-status", scenario)
+
+    def test_slurmd_relation_created(self) -> None:
+        def scenario():
+            return self._relate(self._harness())
+
+        self._measure("slurmd-relation-created", scenario)
+
+    def test_slurmd_relation_joined(self) -> None:
+        def scenario():
+            harness = self._harness()
+            self._relate(harness)()
+            harness.update_relation_data(self.relation, "slurmctld", SLURMCTLD_APP_DATA)
+            harness.framework.commit()
+            return self._join(harness)
+
+        self._measure("slurmd-relation-joined", scenario)
+
+    def test_slurmd_relation_changed(self) -> None:
+        def scenario():
+            harness = self._harness(joined=True)
+            with harness.hooks_disabled():
+                data = {**SLURMCTLD_APP_DATA, "nhc_params": "-X 10"}
+                harness.update_relation_data(self.relation, "slurmctld", data)
+            relation = harness.model.get_relation("slurmd", self.relation)
+            return lambda: harness.charm.on["slurmd"].relation_changed.emit(relation, relation.app)
+
+        self._measure("slurmd-relation-changed", scenario)
+
+    def test_slurmd_relation_broken(self) -> None:
+        def scenario():
+            harness = self._harness(joined=True)
+            return lambda: harness.remove_relation(self.relation)
+
+        self._measure("slurmd-relation-broken", scenario)
+
+    def test_action_version(self) -> None:
+        self._action("version")
+
+    def test_action_node_configured(self) -> None:
+        self._action("node-configured")
+
+    def test_action_get_node_inventory(self) -> None:
+        self._action("get-node-inventory")
+
+    def test_action_set_node_inventory(self) -> None:
+        self._action("set-node-inventory", {"real-memory": 1024})
+
+    def test_action_show_nhc_config(self) -> None:
+        self._action("show-nhc-config")
+
+    def test_action_reconcile(self) -> None:
+        self._action("reconcile", {"dry-run": True})
+
+    def test_action_notices_stats(self) -> None:
+        self._action("notices-stats")
+
+    def test_action_hook_profile(self) -> None:
+        self._action("hook-profile")
+
+    def test_action_nhc_profile(self) -> None:
+        self._action("nhc-profile")
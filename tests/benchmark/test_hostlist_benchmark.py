@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark hostlist compression and node set grouping at 10k nodes."""
+
+import json
+import logging
+import random
+import timeit
+import unittest
+
+from utils import hostlist
+from utils.nodeset import group_node_sets
+
+logger = logging.getLogger(__name__)
+
+NODES = 10_000
+
+
+def _fleet() -> list:
+    """Return 10k inventories of four hardware types with RealMemory jitter."""
+    rng = random.Random(0)
+    nodes = []
+    for i in range(NODES):
+        cpus = (64, 128)[i % 2]
+        nodes.append(
+            {
+                "node_name": f"node{i:05d}",
+                "node_addr": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                "state": "UNKNOWN",
+                "cpus": cpus,
+                "threads_per_core": 2,
+                "cores_per_socket": cpus // 4,
+                "sockets_per_board": 2,
+                "real_memory": (257000, 515000)[i // 5000] - rng.randint(0, 1000),
+                "new_node": True,
+            }
+        )
+    rng.shuffle(nodes)
+    return nodes
+
+
+class TestHostlistBenchmark(unittest.TestCase):
+    """Measure hostlist and node set operations on a 10k node fleet."""
+
+    def test_compress_expand(self) -> None:
+        hosts = [f"node{i:05d}" for i in range(NODES)]
+        random.Random(0).shuffle(hosts)
+        compress = min(timeit.repeat(lambda: hostlist.compress(hosts), number=1, repeat=5))
+        expression = hostlist.compress(hosts)
+        expand = min(timeit.repeat(lambda: hostlist.expand(expression), number=1, repeat=5))
+        logger.info(f"compress: {compress * 1e3:.2f} ms, expand: {expand * 1e3:.2f} ms")
+        self.assertEqual(expression, f"node[00000-{NODES - 1:05d}]")
+        self.assertLess(compress + expand, 0.5)
+
+    def test_group_node_sets(self) -> None:
+        nodes = _fleet()
+        elapsed = min(timeit.repeat(lambda: group_node_sets(nodes, 1.0), number=1, repeat=5))
+        node_sets = group_node_sets(nodes, 1.0)
+        per_node = len(json.dumps(sorted(nodes, key=lambda inv: inv["node_name"])))
+        grouped = len(json.dumps(node_sets))
+        logger.info(
+            f"grouped {NODES} nodes into {len(node_sets)} node sets in {elapsed * 1e3:.2f} ms, "
+            f"{per_node} bytes -> {grouped} bytes"
+        )
+        self.assertEqual(len(node_sets), 4)
+        self.assertEqual(sum(node_set["count"] for node_set in node_sets), NODES)
+        self.assertLess(elapsed, 1.0)
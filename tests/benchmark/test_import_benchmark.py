@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the startup of the charm in a new interpreter, like every hook."""
+
+import compileall
+import json
+import logging
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).parents[2]
+ROUNDS = 10
+# Modules the charm imported in every hook before they were imported by the handlers
+# needing them, and the base detection done on import.
+EAGER = "import cProfile, dbus_fast.aio, distro, slurm_ops_manager; distro.id()"
+HEAVY = ["cProfile", "dbus_fast", "distro", "slurm_ops_manager"]
+# ops is imported by every hook whatever the charm does, so it is not timed.
+STARTUP = """
+import json, sys, time
+from pathlib import Path
+import ops.main
+import utils.base
+utils.base.BASE_STATE = Path({base!r})
+start = time.perf_counter()
+{eager}
+import charm
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+class TestImportBenchmark(unittest.TestCase):
+    """Compare the startup of a hook with eager and lazy imports, with and without bytecode."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # The base is cached by the install hook.
+        self.base = self.tmp / "base.json"
+        self.base.write_text(json.dumps({"id": "ubuntu", "version": "22.04"}))
+        # A copy of the charm without bytecode, like an unpacked charm.
+        for path in ("src", "lib"):
+            shutil.copytree(
+                ROOT / path, self.tmp / path, ignore=shutil.ignore_patterns("__pycache__")
+            )
+
+    def _startup(self, eager: bool, bytecode: bool) -> float:
+        """Return the import time of the charm, checking which heavy modules it imported."""
+        env = dict(
+            os.environ,
+            PYTHONDONTWRITEBYTECODE="1",
+            # Bytecode is looked up in an empty cache when there is none.
+            PYTHONPYCACHEPREFIX="" if bytecode else str(self.tmp / "empty"),
+            PYTHONPATH=os.pathsep.join(
+                [str(self.tmp / "lib"), str(self.tmp / "src"), os.environ.get("PYTHONPATH", "")]
+            ),
+        )
+        script = STARTUP.format(base=str(self.base), eager=EAGER if eager else "", heavy=HEAVY)
+        output = subprocess.check_output([sys.executable, "-c", script], env=env, cwd=self.tmp)
+        elapsed, imported = json.loads(output)
+        self.assertEqual(imported, HEAVY if eager else [])
+        return elapsed
+
+    def test_startup(self) -> None:
+        # Like the bytecode shipped in the charm.
+        compileall.compile_dir(
+            self.tmp, quiet=1, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+        )
+        timings = {"eager": [], "lazy_source": [], "lazy": []}
+        for _ in range(ROUNDS):
+            timings["eager"].append(self._startup(eager=True, bytecode=True))
+            timings["lazy_source"].append(self._startup(eager=False, bytecode=False))
+            timings["lazy"].append(self._startup(eager=False, bytecode=True))
+        eager, lazy_source, lazy = (min(timings[key]) for key in ("eager", "lazy_source", "lazy"))
+
+        logger.info(
+            f"Charm import per hook - eager imports: {eager * 1e3:.3f} ms, "
+            f"lazy imports without bytecode: {lazy_source * 1e3:.3f} ms, "
+            f"lazy imports with bytecode: {lazy * 1e3:.3f} ms"
+        )
+        self.assertLess(lazy, eager)
+        self.assertLess(lazy, lazy_source)
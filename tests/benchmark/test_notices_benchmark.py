@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the D-Bus traffic of the notices daemon."""
+
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Tuple
+from unittest.mock import patch
+
+import charms.operator_libs_linux.v0.juju_systemd_notices as notices
+from dbus_fast import BusType, Message, MessageType
+from dbus_fast.aio import MessageBus
+
+# The systemd stand-in is shared with the unit tests.
+sys.path.insert(0, str(Path(__file__).parents[1] / "unit" / "utils"))
+from fake_systemd import DBUS_DAEMON, FakeSystemd  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Scopes and services systemd starts for the jobs of a busy compute node.
+CHURN = [f"run-u{i}.scope" for i in range(2000)] + [f"slurmstepd-{i}.scope" for i in range(500)]
+WATCHED = ["slurmd.service", "munge.service"]
+# The match rule of the daemon before it matched units by their exact path.
+NAMESPACE_RULE = (
+    "path_namespace='/org/freedesktop/systemd1/unit',type='signal',"
+    "interface='org.freedesktop.DBus.Properties'"
+)
+# Services with hooks in the charm directory on reload.
+HOOKED = [f"service-{i}.service" for i in range(50)]
+ROUNDS = 10
+
+
+async def _legacy_reload(address: str) -> None:
+    """Load the hooked services like the daemon did before sharing its bus.
+
+    Every reload connected a new bus, which was never closed, and introspected
+    the units one by one.
+    """
+    bus = await MessageBus(bus_address=address, bus_type=BusType.SYSTEM).connect()
+    for service in HOOKED:
+        if service not in notices._service_states:
+            path = notices._name_to_dbus_path(service)
+            introspection = await bus.introspect("org.freedesktop.systemd1", path)
+            proxy = bus.get_proxy_object("org.freedesktop.systemd1", path, introspection)
+            properties = proxy.get_interface("org.freedesktop.DBus.Properties")
+            state = await properties.call_get("org.freedesktop.systemd1.Unit", "ActiveState")
+            notices._service_states[service] = state.value
+    bus.disconnect()
+
+
+@unittest.skipUnless(DBUS_DAEMON, "dbus-daemon is required")
+class TestNoticesBenchmark(unittest.TestCase):
+    """Compare the messages received with a namespace rule and with per unit rules."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.systemd = FakeSystemd().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.systemd.stop()
+
+    async def _receive(self, exact: bool) -> Tuple[int, float]:
+        """Return the messages the daemon received during the churn and the time handling them."""
+        bus = await MessageBus(bus_address=self.systemd.address, bus_type=BusType.SYSTEM).connect()
+        received = 0
+        handling = 0.0
+
+        def on_message(msg: Message) -> None:
+            nonlocal received, handling
+            if msg.message_type == MessageType.SIGNAL:
+                received += 1
+                start = time.perf_counter()
+                notices._systemd_unit_changed(msg)
+                handling += time.perf_counter() - start
+
+        if exact:
+            await notices._sync_match_rules(bus)
+        else:
+            await notices._update_match_rule(bus, "AddMatch", NAMESPACE_RULE)
+        bus.add_message_handler(on_message)
+
+        # The watched units do not change state, so no hooks are dispatched.
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.systemd.emit, CHURN + WATCHED, "inactive"
+        )
+        await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="GetId",
+            )
+        )
+        bus.disconnect()
+        await bus.wait_for_disconnect()
+        return received, handling
+
+    def test_exact_rules_drop_churn(self) -> None:
+        states = dict.fromkeys(WATCHED, "inactive")
+        with patch.dict(notices._service_states, states), patch.dict(notices._match_rules):
+            namespace, namespace_time = asyncio.run(self._receive(exact=False))
+            exact, exact_time = asyncio.run(self._receive(exact=True))
+
+        logger.info(
+            f"{len(CHURN)} job units and {len(WATCHED)} watched units changing state - "
+            f"namespace rule: {namespace} messages, {namespace_time * 1e3:.3f} ms handling, "
+            f"per unit rules: {exact} messages, {exact_time * 1e3:.3f} ms handling"
+        )
+        self.assertEqual(namespace, len(CHURN) + len(WATCHED))
+        self.assertEqual(exact, len(WATCHED))
+
+    async def _reload(self, legacy: bool) -> float:
+        """Return the fastest reload of all hooked services from scratch."""
+        bus = await MessageBus(bus_address=self.systemd.address, bus_type=BusType.SYSTEM).connect()
+        timings = []
+        for _ in range(ROUNDS):
+            notices._service_states.clear()
+            notices._notified_states.clear()
+            start = time.perf_counter()
+            if legacy:
+                await _legacy_reload(self.systemd.address)
+            else:
+                await notices._async_load_services(bus)
+            timings.append(time.perf_counter() - start)
+        bus.disconnect()
+        await bus.wait_for_disconnect()
+        return min(timings)
+
+    def test_reload(self) -> None:
+        for service in HOOKED:
+            self.systemd.unit(service)
+        with tempfile.TemporaryDirectory() as tmp:
+            hooks = Path(tmp) / "hooks"
+            hooks.mkdir()
+            for service in HOOKED:
+                (hooks / f"service-{service[:-len('.service')]}-started").touch()
+            with patch.object(Path, "cwd", return_value=Path(tmp)), patch.dict(
+                notices._service_states
+            ), patch.dict(notices._notified_states):
+                legacy = asyncio.run(self._reload(legacy=True))
+                shared = asyncio.run(self._reload(legacy=False))
+                self.assertEqual(len(notices._service_states), len(HOOKED))
+
+        logger.info(
+            f"Loading {len(HOOKED)} services - new connection and introspection per unit: "
+            f"{legacy * 1e3:.3f} ms, shared bus and concurrent Get: {shared * 1e3:.3f} ms"
+        )
+        self.assertLess(shared, legacy)
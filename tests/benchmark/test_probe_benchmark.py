@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the sysfs hardware probe against the lscpu/lspci subprocess path."""
+
+import logging
+import shutil
+import subprocess
+import timeit
+import unittest
+from unittest.mock import patch
+
+from utils import machine
+
+logger = logging.getLogger(__name__)
+
+ROUNDS = 20
+
+
+def _subprocess_inventory() -> dict:
+    """Collect the inventory the way machine.py did before the sysfs probe."""
+    lscpu_out = subprocess.check_output(["lscpu"]).decode().strip().split("\n")
+    lscpu = {line.split(":")[0].strip(): line.split(":")[1].strip() for line in lscpu_out}
+    gpus = subprocess.check_output(
+        "lspci | grep -i nvidia | awk '{print $1}' | cut -d : -f 1 | sort -u | wc -l",
+        shell=True,
+    )
+    meminfo = subprocess.check_output(["free", "-m"]).decode()
+    return {"lscpu": lscpu, "gpus": gpus, "free": meminfo}
+
+
+class TestProbeBenchmark(unittest.TestCase):
+    """Compare per-call latency of both inventory collection paths."""
+
+    def test_probe_spawns_no_processes(self) -> None:
+        with patch("subprocess.Popen", side_effect=AssertionError("process spawned")):
+            machine.get_inventory("bench", "127.0.0.1")
+
+    @unittest.skipUnless(
+        all(shutil.which(cmd) for cmd in ("lscpu", "lspci", "free")),
+        "lscpu, lspci and free are required for the subprocess baseline",
+    )
+    def test_probe_faster_than_subprocess(self) -> None:
+        probe = min(
+            timeit.repeat(lambda: machine.get_inventory("bench", ""), number=1, repeat=ROUNDS)
+        )
+        legacy = min(timeit.repeat(_subprocess_inventory, number=1, repeat=ROUNDS))
+        logger.info(f"sysfs probe: {probe * 1e3:.3f} ms, subprocess: {legacy * 1e3:.3f} ms")
+        self.assertLess(probe, legacy)
+
+    def test_probe_latency(self) -> None:
+        probe = min(
+            timeit.repeat(lambda: machine.get_inventory("bench", ""), number=1, repeat=ROUNDS)
+        )
+        logger.info(f"sysfs probe: {probe * 1e3:.3f} ms")
+        self.assertLess(probe, 0.05)
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulate the slurmd relation of a large cluster in one process.
+
+Every simulated slurmd unit runs the real `Slurmd` interface in its own
+Harness. A stand-in for slurmctld holds the controller side of the relation.
+It counts the relation-changed events the controller would see whenever a
+unit commits a change to its databags, and accepts the inventory of every
+node. Set `SIMULATED_UNITS` to a comma separated list of cluster sizes, for
+example `SIMULATED_UNITS=5000`.
+"""
+
+import base64
+import functools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Dict, Optional
+from unittest.mock import patch
+
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+from interface_slurmd import Slurmd
+from interface_slurmd_peer import SlurmdPeer
+from utils.probe import Probe
+from utils.stats import percentile
+
+# The sysfs builder is shared with the unit tests.
+sys.path.insert(0, str(Path(__file__).parents[1] / "unit" / "utils"))
+import fake_sysfs  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+SCALES = [int(units) for units in os.environ.get("SIMULATED_UNITS", "100,1000").split(",")]
+METADATA = """
+name: slurmd
+provides:
+  slurmd:
+    interface: slurmd
+peers:
+  slurmd-peers:
+    interface: slurmd-peers
+"""
+CONFIG = """
+options:
+  fleet-inventory:
+    type: boolean
+    default: false
+  fleet-inventory-window:
+    type: int
+    default: 60
+  node-set-memory-tolerance:
+    type: float
+    default: 1.0
+  restart-concurrency:
+    type: int
+    default: 0
+  partition-config:
+    type: string
+    default: ""
+  partition-state:
+    type: string
+    default: "UP"
+"""
+SLURMCTLD_APP_DATA = {
+    "munge_key": base64.b64encode(os.urandom(1024)).decode(),
+    "slurmctld_host": "ctld-0",
+    "slurmctld_port": "6817",
+    "cluster_name": "cluster",
+    "nhc_params": "-X 5",
+}
+
+
+def _size(data: Dict[str, str]) -> int:
+    """Return the bytes of a databag."""
+    return sum(len(key) + len(value) for key, value in data.items())
+
+
+class _Json:
+    """Stand-in for the json module of the interface, timing (de)serialization."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def _time(self, kind: str, func, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.seconds[kind] = self.seconds.get(kind, 0.0) + time.perf_counter() - start
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        # The payloads are told apart by their fields.
+        if isinstance(obj, dict) and "partition_name" in obj:
+            kind = "partition_info"
+        elif isinstance(obj, dict) and "node_name" in obj:
+            kind = "node_inventory"
+        else:
+            kind = "other"
+        return self._time(f"dumps_{kind}", json.dumps, obj, **kwargs)
+
+    def loads(self, raw: str, **kwargs) -> Any:
+        return self._time("loads", json.loads, raw, **kwargs)
+
+
+class _SlurmdUnit(CharmBase):
+    """Minimal slurmd charm around the real interfaces."""
+
+    hostname = "node-0"
+    cluster_name = ""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slurmd_peer = SlurmdPeer(self, "slurmd-peers")
+        self._slurmd = Slurmd(self, "slurmd", peer=self._slurmd_peer)
+        self.available_at: Optional[float] = None
+        self.framework.observe(self._slurmd.on.slurmctld_available, self._on_slurmctld_available)
+
+    def _on_slurmctld_available(self, _) -> None:
+        if self.unit.is_leader():
+            self._slurmd.set_partition_info_on_app_relation_data(
+                {
+                    "partition_name": self.app.name,
+                    "partition_config": self.config.get("partition-config"),
+                    "partition_state": self.config.get("partition-state"),
+                }
+            )
+        self.available_at = time.perf_counter()
+
+
+class _Slurmctld:
+    """Stand-in for the controller side of the slurmd relation."""
+
+    def __init__(self) -> None:
+        self.relation_changed = 0
+        self.nodes: Dict[str, dict] = {}
+        self.ready_at: Dict[str, float] = {}
+        self.partition_info: Optional[dict] = None
+        self.parse_seconds = 0.0
+
+    def on_unit_changed(self, node: str, data: Dict[str, str]) -> None:
+        """Handle relation-changed for the databag of a slurmd unit."""
+        self.relation_changed += 1
+        if raw := data.get("inventory"):
+            start = time.perf_counter()
+            self.nodes[node] = json.loads(raw)
+            self.parse_seconds += time.perf_counter() - start
+            self.ready_at[node] = time.perf_counter()
+
+    def on_app_changed(self, data: Dict[str, str]) -> None:
+        """Handle relation-changed for the application databag of slurmd."""
+        self.relation_changed += 1
+        if raw := data.get("partition_info"):
+            self.partition_info = json.loads(raw)
+
+
+class _SimulatedUnit:
+    """A slurmd unit related to the controller."""
+
+    def __init__(self, index: int, controller: _Slurmctld) -> None:
+        self.node = f"node-{index}"
+        self.controller = controller
+        self.written = 0
+        self._hook = False
+        self.harness = Harness(_SlurmdUnit, meta=METADATA, config=CONFIG)
+        self.harness.set_leader(index == 0)
+        self.harness.begin()
+        self.harness.charm.hostname = self.node
+        self._count_writes()
+
+        with self.harness.hooks_disabled():
+            self.relation_id = self.harness.add_relation("slurmd", "slurmctld")
+            # Juju sets the address of the unit before relation-created.
+            address = f"10.{index // 65536}.{index // 256 % 256}.{index % 256}"
+            self.harness.update_relation_data(
+                self.relation_id, "slurmd/0", {"ingress-address": address}
+            )
+        self.relation = self.harness.model.get_relation("slurmd", self.relation_id)
+        # The databags of the unit and its application, as last seen by the controller.
+        self._bags = {
+            name: dict(self.harness.get_relation_data(self.relation_id, name))
+            for name in ("slurmd/0", "slurmd")
+        }
+
+    def _count_writes(self) -> None:
+        backend = self.harness._backend
+        update = backend.update_relation_data
+
+        @functools.wraps(update)
+        def update_relation_data(*args, **kwargs):
+            if self._hook:
+                self.written += _size(kwargs["data"])
+            return update(*args, **kwargs)
+
+        backend.update_relation_data = update_relation_data
+
+    def _run(self, emit) -> None:
+        """Run a hook on the unit and deliver the databags it changed to the controller."""
+        self._hook = True
+        try:
+            emit()
+            # Relation data is published when the hook commits.
+            self.harness.framework.commit()
+        finally:
+            self._hook = False
+        for name, bag in self._bags.items():
+            data = self.harness.get_relation_data(self.relation_id, name)
+            if data != bag:
+                self._bags[name] = dict(data)
+                if name == "slurmd":
+                    self.controller.on_app_changed(data)
+                else:
+                    self.controller.on_unit_changed(self.node, data)
+
+    def created(self) -> None:
+        """Run relation-created."""
+        self._run(
+            lambda: self.harness.charm.on["slurmd"].relation_created.emit(
+                self.relation, self.relation.app
+            )
+        )
+
+    def joined(self, app_data: Dict[str, str]) -> None:
+        """Add the controller unit and its data, then run relation-joined."""
+        with self.harness.hooks_disabled():
+            self.harness.update_relation_data(self.relation_id, "slurmctld", app_data)
+            self.harness.add_relation_unit(self.relation_id, "slurmctld/0")
+            self.harness.update_relation_data(
+                self.relation_id, "slurmctld/0", {"ingress-address": "10.255.0.1"}
+            )
+        unit = self.harness.model.get_unit("slurmctld/0")
+        self._run(
+            lambda: self.harness.charm.on["slurmd"].relation_joined.emit(
+                self.relation, unit.app, unit
+            )
+        )
+
+    def changed(self, app_data: Dict[str, str]) -> None:
+        """Update the controller data, then run relation-changed."""
+        with self.harness.hooks_disabled():
+            self.harness.update_relation_data(self.relation_id, "slurmctld", app_data)
+        self._run(
+            lambda: self.harness.charm.on["slurmd"].relation_changed.emit(
+                self.relation, self.relation.app
+            )
+        )
+
+    def databag_bytes(self) -> int:
+        """Return the bytes of the databags of this unit, including its app databag."""
+        return sum(_size(bag) for bag in self._bags.values())
+
+
+class TestRelationSimulation(unittest.TestCase):
+    """Simulate clusters joining slurmctld, and slurmctld updating the whole cluster."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        # A dual socket compute node with 8 GPUs.
+        fake_sysfs.add_cpus(root, sockets=2, cores_per_socket=32, threads_per_core=2)
+        fake_sysfs.add_meminfo(root, 1024 * 1024 * 1024)
+        for gpu in range(8):
+            fake_sysfs.add_pci_device(
+                root, f"0000:{gpu + 1:02x}:00.0", 0x10DE, 0x2330, 0x030200, numa_node=gpu // 4
+            )
+        self.json = _Json()
+        for target, value in {
+            "utils.inventory.INVENTORY_CACHE": root / "inventory.json",
+            "utils.machine.Probe": functools.partial(Probe, root),
+            "interface_slurmd.json": self.json,
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _simulate(self, units: int) -> dict:
+        controller = _Slurmctld()
+        cluster = []
+        join_to_ready = []
+        start = time.perf_counter()
+        for index in range(units):
+            unit = _SimulatedUnit(index, controller)
+            cluster.append(unit)
+            joined_at = time.perf_counter()
+            unit.created()
+            unit.joined(SLURMCTLD_APP_DATA)
+            ready_at = max(unit.harness.charm.available_at, controller.ready_at[unit.node])
+            join_to_ready.append(ready_at - joined_at)
+        join_seconds = time.perf_counter() - start
+        join_events = controller.relation_changed
+        join_serialization = dict(self.json.seconds)
+
+        # slurmctld changes its data, e.g. the NHC parameters, for the whole cluster.
+        start = time.perf_counter()
+        for unit in cluster:
+            unit.changed({**SLURMCTLD_APP_DATA, "nhc_params": "-X 10"})
+        fan_out_seconds = time.perf_counter() - start
+
+        # Reading every inventory, like a controller hook rendering slurm.conf.
+        start = time.perf_counter()
+        for unit in cluster:
+            json.loads(unit.harness.get_relation_data(unit.relation_id, "slurmd/0")["inventory"])
+        full_parse_seconds = time.perf_counter() - start
+
+        result = {
+            "units": units,
+            "relation_bytes": sum(unit.databag_bytes() for unit in cluster)
+            + _size(SLURMCTLD_APP_DATA),
+            "relation_bytes_written": sum(unit.written for unit in cluster),
+            "controller_relation_changed": join_events,
+            "fan_out_controller_relation_changed": controller.relation_changed - join_events,
+            "dumps_node_inventory_ms": round(
+                join_serialization.get("dumps_node_inventory", 0.0) * 1e3, 3
+            ),
+            "dumps_partition_info_ms": round(
+                join_serialization.get("dumps_partition_info", 0.0) * 1e3, 3
+            ),
+            "controller_parse_ms": round(controller.parse_seconds * 1e3, 3),
+            "controller_full_parse_ms": round(full_parse_seconds * 1e3, 3),
+            "join_to_ready_ms": {
+                "p50": round(percentile(join_to_ready, 50) * 1e3, 3),
+                "p99": round(percentile(join_to_ready, 99) * 1e3, 3),
+                "max": round(max(join_to_ready) * 1e3, 3),
+            },
+            "join_all_s": round(join_seconds, 3),
+            "fan_out_s": round(fan_out_seconds, 3),
+        }
+        for unit in cluster:
+            unit.harness.cleanup()
+
+        self.assertEqual(len(controller.nodes), units)
+        self.assertEqual(controller.partition_info["partition_name"], "slurmd")
+        return result
+
+    def test_simulate(self) -> None:
+        for units in SCALES:
+            with self.subTest(units=units):
+                self.json.seconds.clear()
+                result = self._simulate(units)
+                logger.info(f"Simulated cluster: {json.dumps(result)}")
+                # Each unit publishes its inventory once when joining, and the
+                # leader publishes the partition once.
+                self.assertEqual(result["controller_relation_changed"], units + 1)
+                # Units do not write back when slurmctld changes its data.
+                self.assertEqual(result["fan_out_controller_relation_changed"], 0)
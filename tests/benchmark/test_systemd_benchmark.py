@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the D-Bus systemd backend against forking a process per call."""
+
+import logging
+import shutil
+import subprocess
+import sys
+import timeit
+import unittest
+from pathlib import Path
+
+# The systemd stand-in is shared with the unit tests.
+sys.path.insert(0, str(Path(__file__).parents[1] / "unit" / "utils"))
+from fake_systemd import DBUS_DAEMON, FakeSystemd  # noqa: E402
+
+from utils.systemd_dbus import SystemdBus  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+ROUNDS = 20
+# The systemd calls of a slurmctld-available hook that changed everything.
+HOOK_CALLS = [
+    ("Reload", []),
+    ("RestartUnit", ["munge.service", "replace"]),
+    ("RestartUnit", ["slurmd.service", "replace"]),
+    ("GetUnit", ["slurmd.service"]),
+    ("StartUnit", ["slurmd.service", "replace"]),
+]
+
+
+@unittest.skipUnless(
+    DBUS_DAEMON and shutil.which("dbus-send"), "dbus-daemon and dbus-send are required"
+)
+class TestSystemdBenchmark(unittest.TestCase):
+    """Compare the latency of the systemd calls of one hook."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.systemd = FakeSystemd().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.systemd.stop()
+
+    def _dbus_hook(self) -> None:
+        """Run the calls of a hook over one persistent connection."""
+        bus = SystemdBus(self.systemd.address, timeout=5).connect()
+        bus.daemon_reload()
+        bus.restart("munge")
+        bus.restart("slurmd")
+        bus.is_active("slurmd")
+        bus.start("slurmd")
+        bus.close()
+
+    def _subprocess_hook(self) -> None:
+        """Run the calls of a hook with one forked bus client per call, like systemctl."""
+        for member, args in HOOK_CALLS:
+            subprocess.check_output(
+                [
+                    "dbus-send",
+                    f"--bus={self.systemd.address}",
+                    "--print-reply",
+                    "--dest=org.freedesktop.systemd1",
+                    "/org/freedesktop/systemd1",
+                    f"org.freedesktop.systemd1.Manager.{member}",
+                    *(f"string:{arg}" for arg in args),
+                ]
+            )
+
+    def test_dbus_faster_than_subprocess(self) -> None:
+        dbus = min(timeit.repeat(self._dbus_hook, number=1, repeat=ROUNDS))
+        forked = min(timeit.repeat(self._subprocess_hook, number=1, repeat=ROUNDS))
+        logger.info(
+            f"{len(HOOK_CALLS)} systemd calls - D-Bus: {dbus * 1e3:.3f} ms, "
+            f"process per call: {forked * 1e3:.3f} ms"
+        )
+        self.assertLess(dbus, forked)
@@ -15,12 +15,17 @@
 
 """Unit tests for the slurmd operator."""
 
+import base64
+import json
+import tempfile
 import unittest
+from pathlib import Path
 from unittest.mock import PropertyMock, patch
 
-from charm import SlurmdCharm
-from ops.model import ActiveStatus, BlockedStatus
-from ops.testing import Harness
+from charm import SlurmdCharm, _format_action_results
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.testing import ActionFailed, Harness
+from utils import nhc, slurmd
 
 
 class TestCharm(unittest.TestCase):
@@ -28,6 +33,21 @@ class TestCharm(unittest.TestCase):
 
     def setUp(self) -> None:
         """Set up unit test."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for target, path in {
+            "utils.health.HEALTH_STATE": Path(tmp.name) / "health.json",
+            "utils.base.BASE_STATE": Path(tmp.name) / "base.json",
+            "utils.inventory.INVENTORY_CACHE": Path(tmp.name) / "inventory.json",
+            "utils.nhc.PROFILE_LOG": Path(tmp.name) / "nhc-profile.jsonl",
+            "utils.nhc.TIMING_SCRIPT": Path(tmp.name) / "charm_timing.nhc",
+            "utils.nhc.WRAPPER": Path(tmp.name) / "omni-nhc-wrapper",
+            "utils.slurmd.START_WINDOW_FILE": Path(tmp.name) / "start-window",
+        }.items():
+            patcher = patch(target, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
         self.harness = Harness(SlurmdCharm)
         self.addCleanup(self.harness.cleanup)
         self.harness.begin()
@@ -56,9 +76,9 @@ class TestCharm(unittest.TestCase):
     @patch("pathlib.Path.read_text", return_value="v1.0.0")
     @patch("ops.model.Unit.set_workload_version")
     @patch("ops.model.Resources.fetch")
-    @patch("utils.slurmd.override_default")
-    @patch("utils.slurmd.override_service")
+    @patch("charm.SlurmdCharm._reconcile")
     @patch("charms.operator_libs_linux.v0.juju_systemd_notices.SystemdNotices.subscribe")
+    @patch("interface_slurmd.Slurmd.cache_inventory")
     @patch("ops.framework.EventBase.defer")
     def test_install_success(self, defer, *_) -> None:
         """Test install success behavior."""
@@ -70,9 +90,9 @@ class TestCharm(unittest.TestCase):
     @patch("pathlib.Path.read_text", return_value="v1.0.0")
     @patch("ops.model.Unit.set_workload_version")
     @patch("ops.model.Resources.fetch")
-    @patch("utils.slurmd.override_default")
-    @patch("utils.slurmd.override_service")
+    @patch("charm.SlurmdCharm._reconcile")
     @patch("charms.operator_libs_linux.v0.juju_systemd_notices.SystemdNotices.subscribe")
+    @patch("interface_slurmd.Slurmd.cache_inventory")
     @patch("ops.framework.EventBase.defer")
     def test_install_success_centos(self, defer, *_) -> None:
         """Test install success behavior on CentOS."""
@@ -90,12 +110,90 @@ class TestCharm(unittest.TestCase):
         self.harness.charm.on.service_slurmd_stopped.emit()
         self.assertEqual(self.harness.charm.unit.status, BlockedStatus("slurmd not running"))
 
+    @patch.dict("os.environ", {"JUJU_SYSTEMD_NOTICES_RESULT": "exit-code"})
+    def test_service_slurmd_failed(self) -> None:
+        self.harness.charm.on.service_slurmd_failed.emit()
+        self.assertEqual(self.harness.charm.unit.status, BlockedStatus("slurmd failed: exit-code"))
+
+        self.harness.charm.on.service_slurmd_restarting.emit()
+        self.assertEqual(self.harness.charm.unit.status, WaitingStatus("slurmd restarting"))
+
+        self.harness.charm.on.service_slurmd_start_limit_hit.emit()
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("slurmd failed too often, see journalctl -u slurmd"),
+        )
+
+    @patch("slurm_ops_manager.SlurmManager.restart_munged", return_value=True)
+    def test_service_munge_failed(self, restart_munged) -> None:
+        """Test that a failed munged is restarted right away."""
+        self.harness.charm.on.service_munge_failed.emit("signal")
+        self.assertEqual(self.harness.charm.unit.status, BlockedStatus("munged failed: signal"))
+        restart_munged.assert_called_once()
+
+        self.harness.charm.on.service_munge_stopped.emit()
+        self.assertEqual(self.harness.charm.unit.status, BlockedStatus("munged not running"))
+
+    @patch("interface_slurmd.Slurmd.is_joined", new_callable=PropertyMock(return_value=True))
+    @patch("interface_slurmd.Slurmd.publish_inventory_drift", return_value=False)
+    @patch("utils.systemd_dbus.service_running", return_value=True)
+    @patch("slurm_ops_manager.SlurmManager.check_munged", return_value=True)
+    def test_update_status_cached_munge_check(self, check_munged, *_) -> None:
+        """Test that munged is only checked again after it changed state."""
+        self.harness.charm._stored.slurm_installed = True
+        self.harness.charm._stored.slurmctld_available = True
+
+        for _ in range(3):
+            self.harness.charm.on.update_status.emit()
+        check_munged.assert_called_once()
+
+        check_munged.return_value = False
+        self.harness.charm.on.service_munge_stopped.emit()
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(
+            self.harness.charm.unit.status, BlockedStatus("Error configuring munge key")
+        )
+
+        check_munged.return_value = True
+        self.harness.charm.on.service_munge_started.emit()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(check_munged.call_count, 3)
+
+        # A change of the slurmctld relation also checks munged again.
+        with patch("utils.slurmd.stop"):
+            self.harness.charm._slurmd.on.slurmctld_unavailable.emit()
+        self.harness.charm._stored.slurmctld_available = True
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(check_munged.call_count, 4)
+
+    @patch("utils.slurmd.restart")
+    def test_rolling_restart_without_started_notice(self, restart) -> None:
+        """Test that the restart slot is released once slurmd restarted.
+
+        A restart within the debounce window of the notices daemon does not
+        notify slurmd-started.
+        """
+        self.harness.set_leader(True)
+        self.harness.charm._stored.slurmctld_available = True
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"restart-concurrency": 1})
+            peer_id = self.harness.add_relation("slurmd-peers", "slurmd")
+
+        self.harness.charm._restart_slurmd()
+
+        restart.assert_called_once()
+        data = self.harness.get_relation_data(peer_id, "slurmd/0")
+        self.assertEqual(data["restart_done"], data["restart_request"])
+        self.assertFalse(self.harness.get_relation_data(peer_id, "slurmd").get("restart_grants"))
+
     def test_update_status_install_fail(self) -> None:
         """Test update_status failure behavior from install."""
         self.harness.charm.on.update_status.emit()
         self.assertEqual(self.harness.charm.unit.status, BlockedStatus("Error installing slurmd"))
 
     @patch("interface_slurmd.Slurmd.is_joined", new_callable=PropertyMock(return_value=True))
+    @patch("interface_slurmd.Slurmd.publish_inventory_drift", return_value=False)
     @patch("slurm_ops_manager.SlurmManager.check_munged", return_value=True)
     def test_update_status_success(self, *_) -> None:
         """Test update_status success behavior."""
@@ -109,3 +207,198 @@ class TestCharm(unittest.TestCase):
         # modify the current state of the unit and should return True.
         self.assertTrue(self.harness.charm._check_status())
         self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    def test_update_status_start_delay_window_too_long(self) -> None:
+        """Test that a start window past the start timeout of slurmd blocks the unit."""
+        self.harness.charm._stored.slurm_installed = True
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"start-delay-window": 900})
+        self.harness.charm.on.update_status.emit()
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("start-delay-window must be at most 600 seconds"),
+        )
+
+    @patch("utils.inventory.InventoryCache.refresh")
+    def test_update_status_inventory_drift(self, refresh) -> None:
+        """Test that update_status only rewrites the inventory when the hardware drifts."""
+        self.harness.charm._stored.slurm_installed = True
+        with self.harness.hooks_disabled():
+            relation_id = self.harness.add_relation("slurmd", "slurmctld")
+        inventory = {"node_name": "node-0", "real_memory": 8192, "gres": 1, "new_node": True}
+        with self.harness.hooks_disabled():
+            self.harness.update_relation_data(
+                relation_id, "slurmd/0", {"inventory": json.dumps(inventory)}
+            )
+
+        refresh.return_value = {}
+        self.harness.charm.on.update_status.emit()
+        self.harness.framework.commit()
+        self.assertEqual(
+            json.loads(self.harness.get_relation_data(relation_id, "slurmd/0")["inventory"]),
+            inventory,
+        )
+
+        refresh.return_value = {"real_memory": 4096, "gres": None}
+        self.harness.charm.on.update_status.emit()
+        self.harness.framework.commit()
+        self.assertEqual(
+            json.loads(self.harness.get_relation_data(relation_id, "slurmd/0")["inventory"]),
+            {"node_name": "node-0", "real_memory": 4096, "new_node": True},
+        )
+
+    def test_format_action_results(self) -> None:
+        """Test that nested inventory is converted to valid action results."""
+        inventory = {
+            "real_memory": 2048,
+            "numa_nodes": {"0": {"cpus": "0-1", "real_memory": 2048}},
+            "cpu_numa_map": [0, 0],
+            "gres_devices": [{"file": "/dev/nvidia0", "pci_address": "0000:3b:00.0"}],
+        }
+        self.assertEqual(
+            _format_action_results(inventory),
+            {
+                "real-memory": 2048,
+                "numa-nodes": {"0": {"cpus": "0-1", "real-memory": 2048}},
+                "cpu-numa-map": "0 0",
+                "gres-devices": {"0": {"file": "/dev/nvidia0", "pci-address": "0000:3b:00.0"}},
+            },
+        )
+
+    @patch("charm.SystemdNotices.stats")
+    def test_notices_stats_action(self, stats) -> None:
+        stats.return_value = {"messages": 3, "dropped": {"unwatched": 1}, "hook-failures": 0}
+        output = self.harness.run_action("notices-stats")
+        self.assertEqual(output.results, stats.return_value)
+
+        stats.side_effect = FileNotFoundError("No such file or directory")
+        with self.assertRaises(ActionFailed):
+            self.harness.run_action("notices-stats")
+
+    @patch("charm.SlurmdCharm._check_status", return_value=False)
+    def test_hook_profile_action(self, _) -> None:
+        with self.assertRaises(ActionFailed):
+            self.harness.run_action("hook-profile")
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with patch("utils.profiling.PROFILE_LOG", Path(tmp.name) / "hook-profile.jsonl"):
+            harness = Harness(SlurmdCharm)
+            self.addCleanup(harness.cleanup)
+            harness.update_config({"hook-profiling": "timing"})
+            harness.begin()
+            harness.charm.on.update_status.emit()
+            harness.charm.on.update_status.emit()
+            output = harness.run_action("hook-profile", {"event": "update_status"})
+        self.assertEqual(list(output.results), ["update-status"])
+        self.assertEqual(output.results["update-status"]["runs"], 2)
+        self.assertEqual(
+            set(output.results["update-status"]["wall"]), {"p50", "p90", "p99", "max"}
+        )
+
+    @patch("charm.SlurmdCharm._check_status", return_value=False)
+    def test_nhc_profile_action(self, _) -> None:
+        with self.assertRaises(ActionFailed):
+            self.harness.run_action("nhc-profile")
+
+        checks = [{"check": "check_fs_mount_rw -f /", "seconds": 0.2, "returncode": 0}]
+        nhc.PROFILE_LOG.write_text(json.dumps({"seconds": 0.5, "returncode": 0, "checks": checks}))
+        output = self.harness.run_action("nhc-profile", {"top": 1})
+        self.assertEqual(output.results["runs"], 1)
+        self.assertEqual(output.results["seconds"], {"p50": 0.5, "p95": 0.5, "max": 0.5})
+        self.assertEqual(output.results["slowest-checks"]["0"]["check"], "check_fs_mount_rw -f /")
+
+    @patch("charm.SlurmdCharm._reconcile")
+    def test_nhc_params_changed(self, reconcile) -> None:
+        self.harness.charm._stored.slurm_installed = True
+        with self.harness.hooks_disabled():
+            relation_id = self.harness.add_relation("slurmd", "slurmctld")
+        self.harness.update_relation_data(relation_id, "slurmctld", {"nhc_params": "-X 10"})
+        reconcile.assert_called_once()
+        # Unrelated changes do not render the wrapper again.
+        self.harness.update_relation_data(relation_id, "slurmctld", {"cluster_name": "osd"})
+        reconcile.assert_called_once()
+
+        self.harness.update_config({"nhc-budget": 2.5})
+        (wrapper,) = [a for a in self.harness.charm._artifacts() if a.name == "nhc-wrapper"]
+        self.assertTrue(wrapper.content.endswith("--budget 2.5 -- -X 10\n"))
+
+    @patch("utils.reservation.compute", return_value={"cpu_spec_list": "4-7"})
+    def test_config_changed_reservation(self, compute) -> None:
+        with self.harness.hooks_disabled():
+            relation_id = self.harness.add_relation("slurmd", "slurmctld")
+            self.harness.update_relation_data(
+                relation_id, "slurmd/0", {"inventory": json.dumps({"node_name": "node-0"})}
+            )
+        self.harness.update_config({"reserved-cores": 2, "reserved-memory": 512})
+        compute.assert_called_once_with(2, 512)
+        self.harness.framework.commit()
+        inventory = self.harness.get_relation_data(relation_id, "slurmd/0")["inventory"]
+        self.assertEqual(json.loads(inventory), {"node_name": "node-0", "cpu_spec_list": "4-7"})
+
+    @patch("utils.systemd_dbus.daemon_reload")
+    @patch("slurm_ops_manager.SlurmManager.restart_munged", return_value=True)
+    @patch("slurm_ops_manager.SlurmManager.configure_munge_key")
+    @patch("utils.slurmd.start")
+    @patch("utils.slurmd.restart")
+    def test_slurmctld_available_minimal_restarts(
+        self, restart, start, configure_munge_key, restart_munged, daemon_reload
+    ) -> None:
+        """Test that services are only restarted when their inputs changed."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        tmp = Path(tmp.name)
+        munge_key = base64.b64encode(b"munge").decode()
+        for target, path in {
+            "utils.slurmd.DEFAULT_FILE": tmp / "default",
+            "utils.slurmd.SERVICE_OVERRIDE": tmp / "override.conf",
+            "utils.reconcile.RECONCILE_STATE": tmp / "artifacts.json",
+            "charm.MUNGE_KEY": tmp / "munge.key",
+        }.items():
+            patcher = patch(target, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Stand in for the munge key written by the slurm manager.
+        configure_munge_key.side_effect = lambda key: (tmp / "munge.key").write_bytes(
+            base64.b64decode(key)
+        )
+
+        charm = self.harness.charm
+        charm._stored.slurm_installed = True
+        charm._slurmd._stored.munge_key = munge_key
+        charm._slurmd._stored.slurmctld_hostname = "ctld-0"
+        charm._slurmd._stored.slurmctld_port = "6817"
+
+        charm._slurmd.on.slurmctld_available.emit()
+        daemon_reload.assert_called_once()
+        restart_munged.assert_called_once()
+        restart.assert_called_once()
+        start.assert_not_called()
+        self.assertIn("ctld-0:6817", (tmp / "default").read_text())
+
+        # Nothing changed, so slurmd is only ensured to be running.
+        charm._slurmd.on.slurmctld_available.emit()
+        daemon_reload.assert_called_once()
+        restart_munged.assert_called_once()
+        restart.assert_called_once()
+        start.assert_called_once()
+
+        charm._slurmd._stored.slurmctld_hostname = "ctld-1"
+        self.assertEqual(
+            charm._reconcile(dry_run=True).to_dict(),
+            {"changed": ["slurmd-default"], "actions": ["restart-slurmd"]},
+        )
+        charm._slurmd.on.slurmctld_available.emit()
+        restart_munged.assert_called_once()
+        self.assertEqual(restart.call_count, 2)
+
+        # The start window only applies after boot, so it does not restart slurmd.
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"start-delay-window": 120})
+        self.assertEqual(
+            charm._reconcile(dry_run=True).to_dict(),
+            {"changed": ["slurmd-start-window"], "actions": []},
+        )
+        self.harness.charm.on.config_changed.emit()
+        self.assertEqual(slurmd.START_WINDOW_FILE.read_text(), "SLURMD_START_WINDOW=120")
+        self.assertEqual(restart.call_count, 2)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the slurmd interface."""
+
+import json
+import unittest
+from unittest.mock import PropertyMock, patch
+
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+from interface_slurmd import NodeInventory, Slurmd
+from interface_slurmd_peer import SlurmdPeer
+
+METADATA = """
+name: slurmd
+provides:
+  slurmd:
+    interface: slurmd
+peers:
+  slurmd-peers:
+    interface: slurmd-peers
+"""
+
+CONFIG = """
+options:
+  fleet-inventory:
+    type: boolean
+    default: false
+  fleet-inventory-window:
+    type: int
+    default: 60
+  node-set-memory-tolerance:
+    type: float
+    default: 1.0
+  restart-concurrency:
+    type: int
+    default: 0
+"""
+
+
+class _SlurmdRequirer(CharmBase):
+    """Minimal charm to drive the slurmd interface."""
+
+    hostname = "node-0"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slurmd_peer = SlurmdPeer(self, "slurmd-peers")
+        self.slurmd = self._slurmd = Slurmd(self, "slurmd", peer=self._slurmd_peer)
+        self.restarts = 0
+        self.framework.observe(self._slurmd_peer.on.restart_granted, self._on_restart_granted)
+
+    def _on_restart_granted(self, _):
+        self.restarts += 1
+
+
+class _StandaloneRequirer(CharmBase):
+    """Minimal charm using the slurmd interface without a peer relation."""
+
+    hostname = "node-0"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slurmd = Slurmd(
+            self, "slurmd", reservation=lambda: {"cpu_spec_list": "0-1", "mem_spec_limit": 512}
+        )
+
+
+class TestNodeInventory(unittest.TestCase):
+    """Unit tests for the NodeInventory model."""
+
+    def test_changed(self) -> None:
+        inventory = NodeInventory.from_json(json.dumps({"real_memory": 1024, "new_node": True}))
+        self.assertEqual(inventory.changed, set())
+
+        inventory.new_node = True
+        inventory["real_memory"] = 1024
+        self.assertEqual(inventory.changed, set())
+
+        inventory.real_memory = "2048"
+        inventory.pop("new_node")
+        inventory.pop("missing")
+        self.assertEqual(inventory.changed, {"real_memory", "new_node"})
+        self.assertEqual(json.loads(inventory.to_json()), {"real_memory": 2048})
+
+    def test_from_empty(self) -> None:
+        inventory = NodeInventory.from_json(None)
+        self.assertEqual(inventory.to_dict(), {})
+        self.assertFalse(inventory.new_node)
+        self.assertEqual(inventory.real_memory, 0)
+
+
+class TestSlurmd(unittest.TestCase):
+    """Unit tests for the slurmd interface."""
+
+    def setUp(self) -> None:
+        self.harness = Harness(_SlurmdRequirer, meta=METADATA, config=CONFIG)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+        with self.harness.hooks_disabled():
+            self.relation_id = self.harness.add_relation("slurmd", "slurmctld")
+            self.harness.update_relation_data(
+                self.relation_id,
+                "slurmd/0",
+                {"inventory": json.dumps({"node_name": "node-0", "new_node": True})},
+            )
+
+    def test_single_read_and_write_per_hook(self) -> None:
+        """Test that the relation data is read once and written once at commit."""
+        slurmd = self.harness.charm.slurmd
+        with patch(
+            "interface_slurmd.NodeInventory.from_json", wraps=NodeInventory.from_json
+        ) as from_json, patch("ops.model.RelationDataContent.__setitem__") as setitem:
+            slurmd.new_node = False
+            slurmd.node_inventory.real_memory = 2048
+            self.assertFalse(slurmd.new_node)
+            from_json.assert_called_once()
+            setitem.assert_not_called()
+
+            self.harness.framework.commit()
+            setitem.assert_called_once_with(
+                "inventory",
+                json.dumps({"node_name": "node-0", "new_node": False, "real_memory": 2048}),
+            )
+
+    def test_publish_reservation(self) -> None:
+        slurmd = self.harness.charm.slurmd
+        slurmd.publish_reservation({"cpu_spec_list": "12-15", "mem_spec_limit": 256})
+        self.assertEqual(slurmd.node_inventory.changed, {"cpu_spec_list", "mem_spec_limit"})
+        self.harness.framework.commit()
+
+        slurmd.publish_reservation({"mem_spec_limit": 512})
+        self.assertEqual(
+            slurmd.node_inventory,
+            {"node_name": "node-0", "new_node": True, "mem_spec_limit": 512},
+        )
+
+    def test_no_write_without_changes(self) -> None:
+        """Test that an unmodified inventory is not written back."""
+        slurmd = self.harness.charm.slurmd
+        slurmd.new_node = True
+        with patch("ops.model.RelationDataContent.__setitem__") as setitem:
+            self.harness.framework.commit()
+        setitem.assert_not_called()
+
+
+class TestStandaloneSlurmd(unittest.TestCase):
+    """Unit tests for the slurmd interface without a peer interface."""
+
+    def setUp(self) -> None:
+        self.harness = Harness(_StandaloneRequirer, meta=METADATA, config=CONFIG)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+    @patch(
+        "interface_slurmd.InventoryCache.hardware",
+        new_callable=PropertyMock,
+        return_value={"real_memory": 1024},
+    )
+    def test_relation_created(self, _) -> None:
+        """Test that the inventory with the reservation is published on the slurmd relation."""
+        with self.harness.hooks_disabled():
+            relation_id = self.harness.add_relation("slurmd", "slurmctld")
+            self.harness.update_relation_data(
+                relation_id, "slurmd/0", {"ingress-address": "10.0.0.10"}
+            )
+        relation = self.harness.model.get_relation("slurmd", relation_id)
+        self.harness.charm.on["slurmd"].relation_created.emit(relation, relation.app)
+        self.harness.framework.commit()
+
+        self.assertEqual(
+            json.loads(self.harness.get_relation_data(relation_id, "slurmd/0")["inventory"]),
+            {
+                "node_name": "node-0",
+                "node_addr": "10.0.0.10",
+                "state": "UNKNOWN",
+                "real_memory": 1024,
+                "cpu_spec_list": "0-1",
+                "mem_spec_limit": 512,
+                "new_node": True,
+            },
+        )
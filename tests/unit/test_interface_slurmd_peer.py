@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the slurmd peer interface."""
+
+import json
+import unittest
+from unittest.mock import patch
+
+from ops.testing import Harness
+from test_interface_slurmd import CONFIG, METADATA, _SlurmdRequirer
+
+
+class TestSlurmdPeer(unittest.TestCase):
+    """Unit tests for the leader aggregated fleet inventory."""
+
+    def setUp(self) -> None:
+        self.harness = Harness(_SlurmdRequirer, meta=METADATA, config=CONFIG)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.update_config({"fleet-inventory": True})
+        self.harness.begin()
+        with self.harness.hooks_disabled():
+            self.slurmd_id = self.harness.add_relation("slurmd", "slurmctld")
+            self.peer_id = self.harness.add_relation("slurmd-peers", "slurmd")
+            self.harness.update_relation_data(
+                self.peer_id, "slurmd/0", {"inventory": json.dumps({"node_name": "node-0"})}
+            )
+
+    def _join(self, unit: int) -> None:
+        self.harness.add_relation_unit(self.peer_id, f"slurmd/{unit}")
+        self.harness.update_relation_data(
+            self.peer_id,
+            f"slurmd/{unit}",
+            {"inventory": json.dumps({"node_name": f"node-{unit}"})},
+        )
+
+    def _fleet(self) -> dict:
+        raw = self.harness.get_relation_data(self.slurmd_id, "slurmd").get("fleet_inventory")
+        return json.loads(raw) if raw else {}
+
+    @patch("time.time")
+    def test_join_window(self, now) -> None:
+        """Test that joins within the window are published as one batch."""
+        now.return_value = 1000.0
+        self._join(1)
+        fleet = self._fleet()
+        self.assertEqual(fleet["version"], 1)
+        self.assertEqual(fleet["serial"], 1)
+        self.assertEqual([node["node_name"] for node in fleet["nodes"]], ["node-0", "node-1"])
+
+        now.return_value = 1010.0
+        for unit in range(2, 5):
+            self._join(unit)
+        self.assertEqual(self._fleet()["serial"], 1)
+        self.assertTrue(self.harness.charm._slurmd_peer.pending)
+
+        now.return_value = 1100.0
+        self.assertTrue(self.harness.charm._slurmd_peer.publish_fleet_inventory())
+        self.assertEqual(self._fleet()["serial"], 2)
+        self.assertEqual(len(self._fleet()["nodes"]), 5)
+        self.assertFalse(self.harness.charm._slurmd_peer.pending)
+
+        # Nothing changed, so the payload is not rewritten.
+        now.return_value = 1200.0
+        self.assertFalse(self.harness.charm._slurmd_peer.publish_fleet_inventory())
+
+    @patch("time.time")
+    def test_leader_inventory(self, now) -> None:
+        """Test that changes to the inventory of the leader are published."""
+        now.return_value = 1000.0
+        self._join(1)
+        self.assertEqual(self._fleet()["serial"], 1)
+
+        now.return_value = 1010.0
+        self.harness.charm.slurmd.node_inventory["real_memory"] = 1024
+        self.harness.framework.commit()
+        self.assertEqual(self._fleet()["serial"], 1)
+        self.assertTrue(self.harness.charm._slurmd_peer.pending)
+
+        now.return_value = 1100.0
+        self.assertTrue(self.harness.charm._slurmd_peer.publish_fleet_inventory())
+        self.assertEqual(self._fleet()["nodes"][0], {"node_name": "node-0", "real_memory": 1024})
+
+        now.return_value = 1200.0
+        self.harness.charm.slurmd.node_inventory["real_memory"] = 2048
+        self.harness.framework.commit()
+        self.assertEqual(self._fleet()["serial"], 3)
+        self.assertEqual(self._fleet()["nodes"][0]["real_memory"], 2048)
+
+    def test_not_leader(self) -> None:
+        self.harness.set_leader(False)
+        self._join(1)
+        self.assertEqual(self._fleet(), {})
+
+    def test_unit_inventory_on_peer_relation(self) -> None:
+        """Test that the unit inventory moves between relations with the mode."""
+        slurmd = self.harness.charm.slurmd
+        with self.harness.hooks_disabled():
+            self.harness.update_relation_data(
+                self.slurmd_id, "slurmd/0", {"inventory": json.dumps({"node_name": "node-0"})}
+            )
+            self.harness.update_relation_data(self.peer_id, "slurmd/0", {"inventory": ""})
+            self.harness.update_config({"fleet-inventory": True})
+
+        slurmd.sync_node_inventory()
+        self.harness.framework.commit()
+        self.assertIn("inventory", self.harness.get_relation_data(self.peer_id, "slurmd/0"))
+        self.assertNotIn("inventory", self.harness.get_relation_data(self.slurmd_id, "slurmd/0"))
+
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"fleet-inventory": False})
+        slurmd.sync_node_inventory()
+        self.harness.framework.commit()
+        self.assertIn("inventory", self.harness.get_relation_data(self.slurmd_id, "slurmd/0"))
+        self.assertNotIn("inventory", self.harness.get_relation_data(self.peer_id, "slurmd/0"))
+
+
+class TestRollingRestart(unittest.TestCase):
+    """Unit tests for the leader coordinated rolling restart of slurmd."""
+
+    def setUp(self) -> None:
+        self.harness = Harness(_SlurmdRequirer, meta=METADATA, config=CONFIG)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.update_config({"restart-concurrency": 2})
+        self.harness.begin()
+        with self.harness.hooks_disabled():
+            self.peer_id = self.harness.add_relation("slurmd-peers", "slurmd")
+            for unit in range(1, 5):
+                self.harness.add_relation_unit(self.peer_id, f"slurmd/{unit}")
+        self.peer = self.harness.charm._slurmd_peer
+
+    def _request(self, unit: int, token: str = "1") -> None:
+        self.harness.update_relation_data(
+            self.peer_id, f"slurmd/{unit}", {"restart_request": token}
+        )
+
+    def _done(self, unit: int, token: str = "1") -> None:
+        self.harness.update_relation_data(self.peer_id, f"slurmd/{unit}", {"restart_done": token})
+
+    def _granted(self) -> list:
+        raw = self.harness.get_relation_data(self.peer_id, "slurmd").get("restart_grants")
+        return sorted(json.loads(raw)) if raw else []
+
+    def test_batches(self) -> None:
+        """Test that a new batch only restarts once the previous batch started."""
+        for unit in range(1, 5):
+            self._request(unit)
+        self.assertEqual(self._granted(), ["slurmd/1", "slurmd/2"])
+
+        self._done(1)
+        self.assertEqual(self._granted(), ["slurmd/2", "slurmd/3"])
+
+        # The leader restarts itself once a slot is free.
+        self.assertTrue(self.peer.request_restart())
+        self.assertEqual(self.harness.charm.restarts, 0)
+        self._done(2)
+        self._done(3)
+        self.assertEqual(self._granted(), ["slurmd/0", "slurmd/4"])
+        self.assertEqual(self.harness.charm.restarts, 1)
+
+        # Started events unrelated to the restart do not release the slot twice.
+        self.peer.restart_completed()
+        self.peer.restart_completed()
+        self.assertEqual(self._granted(), ["slurmd/4"])
+        self.assertEqual(
+            self.harness.get_relation_data(self.peer_id, "slurmd/0")["restart_done"], "1"
+        )
+
+        self._done(4)
+        self.assertEqual(self._granted(), [])
+
+    def test_granted_unit_restarts_once(self) -> None:
+        """Test that a granted unit restarts once per request."""
+        self.harness.set_leader(False)
+        self.assertTrue(self.peer.request_restart())
+        grants = {"slurmd/0": {"token": "1", "granted": 0}}
+        self.harness.update_relation_data(
+            self.peer_id, "slurmd", {"restart_grants": json.dumps(grants)}
+        )
+        self.assertEqual(self.harness.charm.restarts, 1)
+        self._request(1)
+        self.assertEqual(self.harness.charm.restarts, 1)
+
+    @patch("time.time")
+    def test_timeout(self, now) -> None:
+        """Test that slots of units which never start again are reclaimed."""
+        now.return_value = 1000.0
+        for unit in range(1, 4):
+            self._request(unit)
+        self.assertEqual(self._granted(), ["slurmd/1", "slurmd/2"])
+
+        now.return_value = 1000.0 + 901
+        self.assertTrue(self.peer.schedule_restarts())
+        self.assertEqual(self._granted(), ["slurmd/3"])
+
+        # A new request of a timed out unit is granted again.
+        self._request(1, "2")
+        self.assertEqual(self._granted(), ["slurmd/1", "slurmd/3"])
+
+    def test_departed_unit(self) -> None:
+        for unit in range(1, 4):
+            self._request(unit)
+        self.harness.remove_relation_unit(self.peer_id, "slurmd/1")
+        self.assertEqual(self._granted(), ["slurmd/2", "slurmd/3"])
+
+    def test_disabled(self) -> None:
+        self.harness.update_config({"restart-concurrency": 0})
+        self.assertFalse(self.peer.request_restart())
+        self.assertEqual(self._granted(), [])
+
+    def test_disabled_reads_no_unit_data(self) -> None:
+        """Test that the units are not read while rolling restarts are disabled."""
+        self.harness.update_config({"restart-concurrency": 0})
+        with patch.object(self.peer, "_release_restart_slots") as release:
+            self._request(1)
+            self.assertFalse(self.peer.schedule_restarts())
+        release.assert_not_called()
+        self.assertFalse(self.peer.restarts_in_progress)
+
+    def test_disabled_with_granted_slots(self) -> None:
+        """Test that slots granted before rolling restarts were disabled are released."""
+        self._request(1)
+        self.assertTrue(self.peer.restarts_in_progress)
+        self.harness.update_config({"restart-concurrency": 0})
+        self._done(1)
+        self.assertEqual(self._granted(), [])
+        self.assertFalse(self.peer.restarts_in_progress)
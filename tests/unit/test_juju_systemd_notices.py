@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the juju-systemd-notices daemon."""
+
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import AsyncMock, Mock, patch
+
+import charms.operator_libs_linux.v0.juju_systemd_notices as notices
+from dbus_fast import BusType, Message, MessageType, Variant
+from dbus_fast.aio import MessageBus
+
+# The systemd stand-in is shared with the utils tests.
+sys.path.insert(0, str(Path(__file__).parent / "utils"))
+from fake_systemd import DBUS_DAEMON, FakeSystemd  # noqa: E402
+
+
+class TestMatchRules(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for the per unit match rules of the notices daemon."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.systemd = FakeSystemd().start() if DBUS_DAEMON else None
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        if cls.systemd is not None:
+            cls.systemd.stop()
+
+    def setUp(self) -> None:
+        for state in (notices._service_states, notices._match_rules, notices._notified_states):
+            patcher = patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _connect(self) -> MessageBus:
+        """Connect a daemon bus recording the units it receives state changes of."""
+        bus = await MessageBus(bus_address=self.systemd.address, bus_type=BusType.SYSTEM).connect()
+        self.addAsyncCleanup(self._disconnect, bus)
+        self.received = []
+
+        def on_message(msg: Message) -> None:
+            if msg.message_type == MessageType.SIGNAL and msg.member == "PropertiesChanged":
+                self.received.append(notices._dbus_path_to_name(msg.path))
+
+        bus.add_message_handler(on_message)
+        return bus
+
+    async def _disconnect(self, bus: MessageBus) -> None:
+        bus.disconnect()
+        await bus.wait_for_disconnect()
+
+    async def _emit(self, bus: MessageBus, units: List[str]) -> List[str]:
+        """Emit state changes of units and return the ones the daemon bus received."""
+        self.received.clear()
+        await asyncio.get_running_loop().run_in_executor(None, self.systemd.emit, units)
+        # The signals were routed, a round trip makes sure they were read.
+        await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="GetId",
+            )
+        )
+        return self.received
+
+    def test_unit_match_rule(self) -> None:
+        self.assertEqual(
+            notices._unit_match_rule("slurmd.service"),
+            "type='signal',interface='org.freedesktop.DBus.Properties',"
+            "member='PropertiesChanged',path='/org/freedesktop/systemd1/unit/slurmd_2eservice'",
+        )
+
+    @unittest.skipUnless(DBUS_DAEMON, "dbus-daemon is required for the systemd stand-in")
+    async def test_sync_match_rules(self) -> None:
+        """Test that only the state changes of watched units are received."""
+        bus = await self._connect()
+        units = ["slurmd.service", "munge.service", "run-u42.scope", "session-1.scope"]
+
+        notices._service_states["slurmd.service"] = "inactive"
+        await notices._sync_match_rules(bus)
+        self.assertEqual(await self._emit(bus, units), ["slurmd.service"])
+
+        notices._service_states["munge.service"] = "active"
+        await notices._sync_match_rules(bus)
+        self.assertEqual(await self._emit(bus, units), ["slurmd.service", "munge.service"])
+
+        del notices._service_states["slurmd.service"]
+        await notices._sync_match_rules(bus)
+        self.assertEqual(list(notices._match_rules), ["munge.service"])
+        self.assertEqual(await self._emit(bus, units), ["munge.service"])
+
+    def _hooks(self, services: List[str]) -> Path:
+        """Create the hooks of services in a temporary charm directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        hooks = Path(tmp.name) / "hooks"
+        hooks.mkdir()
+        (hooks / "install").touch()
+        for service in services:
+            (hooks / f"service-{service}-started").touch()
+            (hooks / f"service-{service}-stopped").touch()
+        patcher = patch.object(Path, "cwd", return_value=Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return hooks
+
+    @unittest.skipUnless(DBUS_DAEMON, "dbus-daemon is required for the systemd stand-in")
+    async def test_reload_services(self) -> None:
+        """Test that reloads apply the difference to the watched services."""
+        bus = await self._connect()
+        self.systemd.unit("slurmd.service").active_state = "active"
+        hooks = self._hooks(["slurmd", "munge"])
+
+        await notices._reload_services(bus)
+        self.assertEqual(
+            notices._service_states, {"slurmd.service": "active", "munge.service": "unknown"}
+        )
+        self.assertEqual(set(notices._match_rules), {"slurmd.service", "munge.service"})
+
+        notices._service_states["slurmd.service"] = "inactive"
+        for hook in hooks.glob("service-munge-*"):
+            hook.unlink()
+        await notices._reload_services(bus)
+        # Services that are still watched are not queried again.
+        self.assertEqual(notices._service_states, {"slurmd.service": "inactive"})
+        self.assertEqual(list(notices._match_rules), ["slurmd.service"])
+
+    @unittest.skipUnless(DBUS_DAEMON, "dbus-daemon is required for the systemd stand-in")
+    async def test_sighup_reloads_in_order(self) -> None:
+        """Test that reloads scheduled by consecutive SIGHUPs do not interleave."""
+        bus = await self._connect()
+        hooks = self._hooks(["slurmd"])
+        loop = asyncio.get_running_loop()
+        with patch.object(notices, "_reload_task", None), patch.object(
+            notices, "_update_match_rule", wraps=notices._update_match_rule
+        ) as update_match_rule:
+            notices._load_services(loop, bus)
+            for hook in hooks.glob("service-*"):
+                hook.unlink()
+            self._hooks(["munge"])
+            notices._load_services(loop, bus)
+            notices._load_services(loop, bus)
+            await notices._reload_task
+
+        self.assertEqual(list(notices._service_states), ["munge.service"])
+        self.assertEqual(list(notices._match_rules), ["munge.service"])
+        # Interleaved reloads would each have added a rule for munge.
+        self.assertEqual(update_match_rule.call_count, 1)
+
+    async def test_load_services_removes_unhooked(self) -> None:
+        """Test that services are no longer watched once their hooks are removed."""
+        notices._service_states["slurmd.service"] = "active"
+        self._hooks([])
+        await notices._async_load_services(Mock())
+        self.assertEqual(notices._service_states, {})
+
+    def test_unit_changed_ignores_other_messages(self) -> None:
+        """Test that replies to the daemon's own calls are not state changes."""
+        reply = Message(message_type=MessageType.METHOD_RETURN, reply_serial=1)
+        self.assertFalse(notices._systemd_unit_changed(reply))
+
+
+class TestDispatch(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for the debounced hook dispatch of the notices daemon."""
+
+    def setUp(self) -> None:
+        for state in (notices._pending_states, notices._dispatchers, notices._notified_states):
+            patcher = patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name, value in (("_debounce", 0.01), ("_HOOK_BACKOFF", 0.01)):
+            patcher = patch.object(notices, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.hooks = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self.results = []
+        self.release = asyncio.Event()
+        self.release.set()
+        patcher = patch.object(
+            notices, "_send_juju_notification", AsyncMock(side_effect=self._hook)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _hook(self, service: str, state: str) -> bool:
+        self.hooks.append((service, state))
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        await self.release.wait()
+        self.inflight -= 1
+        return self.results.pop(0) if self.results else True
+
+    async def _settle(self) -> None:
+        await asyncio.gather(*notices._dispatchers.values())
+
+    async def test_collapse_transitions(self) -> None:
+        """Test that a burst of transitions dispatches only the final state."""
+        for state in ("active", "failed", "active", "failed"):
+            notices._queue_notification("slurmd.service", state)
+        await self._settle()
+        self.assertEqual(self.hooks, [("slurmd.service", "failed")])
+
+    async def test_collapse_to_notified_state(self) -> None:
+        notices._notified_states["slurmd.service"] = "active"
+        notices._queue_notification("slurmd.service", "inactive")
+        notices._queue_notification("slurmd.service", "active")
+        await self._settle()
+        self.assertEqual(self.hooks, [])
+
+    async def test_one_hook_in_flight(self) -> None:
+        """Test that the hooks of a service run one at a time and in order."""
+        self.release.clear()
+        notices._queue_notification("slurmd.service", "active")
+        while not self.hooks:
+            await asyncio.sleep(0.01)
+        notices._queue_notification("slurmd.service", "inactive")
+        notices._queue_notification("munge.service", "inactive")
+        await asyncio.sleep(0.05)
+        self.release.set()
+        await self._settle()
+
+        self.assertEqual(
+            self.hooks,
+            [
+                ("slurmd.service", "active"),
+                ("munge.service", "inactive"),
+                ("slurmd.service", "inactive"),
+            ],
+        )
+        # Only services other than slurmd run concurrently with its hook.
+        self.assertEqual(self.max_inflight, 2)
+
+    async def test_retry_failed_hook(self) -> None:
+        self.results = [False, False, True]
+        notices._queue_notification("slurmd.service", "active")
+        await self._settle()
+        self.assertEqual(self.hooks, [("slurmd.service", "active")] * 3)
+        self.assertEqual(notices._notified_states["slurmd.service"], "active")
+
+    async def test_give_up_failed_hook(self) -> None:
+        self.results = [False] * (notices._hook_retries + 1)
+        notices._queue_notification("slurmd.service", "active")
+        await self._settle()
+        self.assertEqual(len(self.hooks), notices._hook_retries + 1)
+        self.assertNotIn("slurmd.service", notices._notified_states)
+
+    async def test_retry_superseded(self) -> None:
+        """Test that retrying stops once the service changed state again."""
+        self.results = [False]
+        notices._queue_notification("slurmd.service", "active")
+        while not self.hooks:
+            await asyncio.sleep(0.001)
+        notices._queue_notification("slurmd.service", "failed")
+        await self._settle()
+        self.assertEqual(self.hooks, [("slurmd.service", "active"), ("slurmd.service", "failed")])
+
+
+class TestStats(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for the runtime statistics of the notices daemon."""
+
+    def setUp(self) -> None:
+        patcher = patch.object(notices, "_stats", notices._Stats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for state in (
+            notices._service_states,
+            notices._pending_states,
+            notices._dispatchers,
+            notices._notified_states,
+        ):
+            patcher = patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _signal(self, unit: str, properties: dict) -> Message:
+        return Message.new_signal(
+            notices._name_to_dbus_path(unit),
+            "org.freedesktop.DBus.Properties",
+            "PropertiesChanged",
+            "sa{sv}as",
+            ["org.freedesktop.systemd1.Unit", properties, []],
+        )
+
+    def test_histogram(self) -> None:
+        histogram = notices._Histogram()
+        for latency in (0.005, 0.02, 0.02, 1000):
+            histogram.observe(latency)
+        stats = histogram.to_dict()
+        self.assertEqual(stats["count"], 4)
+        self.assertEqual(stats["buckets"]["le-10ms"], 1)
+        self.assertEqual(stats["buckets"]["le-50ms"], 3)
+        self.assertEqual(stats["buckets"]["le-300000ms"], 3)
+        self.assertEqual(stats["buckets"]["le-inf"], 4)
+
+    @patch.object(notices, "_queue_notification")
+    def test_message_counters(self, _) -> None:
+        notices._service_states["slurmd.service"] = "inactive"
+        for unit, state in (
+            ("run-u1.scope", "active"),
+            ("slurmd.service", "activating"),
+            ("slurmd.service", "active"),
+            ("slurmd.service", "active"),
+        ):
+            notices._systemd_unit_changed(self._signal(unit, {"ActiveState": Variant("s", state)}))
+        notices._systemd_unit_changed(self._signal("slurmd.service", {}))
+
+        stats = notices._stats.to_dict()
+        self.assertEqual(stats["messages"], 5)
+        self.assertEqual(stats["transitions"], 1)
+        self.assertEqual(
+            stats["dropped"],
+            {"unwatched": 1, "transitional": 1, "duplicate": 1, "no-active-state": 1},
+        )
+
+    async def test_hook_counters(self) -> None:
+        with patch.multiple(notices, _juju_unit="slurmd/0", _debounce=0, _hook_retries=0), patch(
+            "asyncio.create_subprocess_exec", side_effect=FileNotFoundError
+        ):
+            notices._queue_notification("slurmd.service", "active")
+            await asyncio.gather(*notices._dispatchers.values())
+
+        stats = notices._stats.to_dict()
+        self.assertEqual((stats["hooks"], stats["hook-failures"]), (1, 1))
+        self.assertEqual(stats["notify-latency"]["count"], 0)
+
+    async def test_serve_stats(self) -> None:
+        """Test that SystemdNotices reads the statistics the daemon serves."""
+        notices._stats.counters["messages"] = 42
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "notices.sock"
+            server = await asyncio.start_unix_server(notices._serve_stats, path=str(path))
+            async with server:
+                stats = await asyncio.get_running_loop().run_in_executor(
+                    None, notices.SystemdNotices.stats, Mock(_stats_socket=path)
+                )
+
+        self.assertEqual(stats["messages"], 42)
+        self.assertIn("cpu-time", stats)
+
+
+class TestServiceEvents(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for the failure aware service events of the notices daemon."""
+
+    def setUp(self) -> None:
+        for state in (notices._service_states, notices._service_results):
+            patcher = patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(notices, "_juju_unit", "slurmd/0")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.hooks = Path(tmp.name) / "hooks"
+        self.hooks.mkdir()
+        for event in ("started", "stopped"):
+            (self.hooks / f"service-slurmd-{event}").touch()
+        patcher = patch.object(Path, "cwd", return_value=Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        process = Mock(returncode=0, wait=AsyncMock())
+        patcher = patch("asyncio.create_subprocess_exec", AsyncMock(return_value=process))
+        self.exec = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cmd(self) -> List[str]:
+        return list(self.exec.call_args.args)
+
+    def test_unit_state(self) -> None:
+        def state(active: str, sub: str) -> str:
+            return notices._unit_state(
+                {"ActiveState": Variant("s", active), "SubState": Variant("s", sub)}
+            )
+
+        self.assertEqual(state("failed", "failed"), "failed")
+        self.assertEqual(state("activating", "auto-restart"), "restarting")
+        self.assertIsNone(state("activating", "start"))
+        self.assertEqual(state("active", "running"), "active")
+
+    def test_record_result(self) -> None:
+        notices._service_states["slurmd.service"] = "active"
+        for unit in ("slurmd.service", "run-u1.scope"):
+            notices._systemd_unit_changed(
+                Message.new_signal(
+                    notices._name_to_dbus_path(unit),
+                    "org.freedesktop.DBus.Properties",
+                    "PropertiesChanged",
+                    "sa{sv}as",
+                    ["org.freedesktop.systemd1.Service", {"Result": Variant("s", "signal")}, []],
+                )
+            )
+        self.assertEqual(notices._service_results, {"slurmd.service": "signal"})
+
+    async def test_failed(self) -> None:
+        """Test that the Result of a failed service is passed to its hook."""
+        (self.hooks / "service-slurmd-failed").touch()
+        notices._service_results["slurmd.service"] = "exit-code"
+        self.assertTrue(await notices._send_juju_notification("slurmd.service", "failed"))
+        self.assertEqual(
+            self._cmd(),
+            [
+                "/usr/bin/juju-exec",
+                "slurmd/0",
+                "env",
+                "JUJU_SYSTEMD_NOTICES_RESULT=exit-code",
+                "hooks/service-slurmd-failed",
+            ],
+        )
+
+    async def test_start_limit_hit(self) -> None:
+        (self.hooks / "service-slurmd-start-limit-hit").touch()
+        notices._service_results["slurmd.service"] = "start-limit-hit"
+        await notices._send_juju_notification("slurmd.service", "failed")
+        self.assertEqual(self._cmd()[-1], "hooks/service-slurmd-start-limit-hit")
+
+    async def test_fallback_hooks(self) -> None:
+        """Test that charms without hooks for the new events are notified as before."""
+        notices._service_results["slurmd.service"] = "start-limit-hit"
+        await notices._send_juju_notification("slurmd.service", "failed")
+        self.assertEqual(self._cmd()[-1], "hooks/service-slurmd-stopped")
+
+        self.exec.reset_mock()
+        self.assertTrue(await notices._send_juju_notification("slurmd.service", "restarting"))
+        self.exec.assert_not_called()
+
+        await notices._send_juju_notification("slurmd.service", "active")
+        self.assertEqual(
+            self._cmd(), ["/usr/bin/juju-exec", "slurmd/0", "hooks/service-slurmd-started"]
+        )
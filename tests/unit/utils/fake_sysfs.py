@@ -0,0 +1,99 @@
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Build fake sysfs/procfs trees for exercising the hardware probe."""
+
+from pathlib import Path
+from typing import Optional
+
+
+def write(root: Path, path: str, content: str) -> Path:
+    """Write `content` to `path` under `root`, creating parent directories."""
+    target = root / path.lstrip("/")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(f"{content}\n")
+    return target
+
+
+def add_cpus(root: Path, sockets: int, cores_per_socket: int, threads_per_core: int) -> None:
+    """Populate /sys/devices/system/cpu with a regular topology.
+
+    Cpu ids are numbered like Linux does on x86: first thread of every core,
+    then the sibling threads.
+    """
+    cores = sockets * cores_per_socket
+    cpus = cores * threads_per_core
+    write(root, "/sys/devices/system/cpu/online", f"0-{cpus - 1}")
+    for cpu in range(cpus):
+        core = cpu % cores
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        write(root, f"{base}/physical_package_id", str(core // cores_per_socket))
+        write(root, f"{base}/core_id", str(core % cores_per_socket))
+
+
+def add_meminfo(root: Path, mem_total_kb: int) -> None:
+    """Write a minimal /proc/meminfo."""
+    write(
+        root,
+        "/proc/meminfo",
+        f"MemTotal:       {mem_total_kb} kB\n"
+        f"MemFree:        {mem_total_kb // 2} kB\n"
+        "HugePages_Total:       0",
+    )
+
+
+def add_pci_device(
+    root: Path,
+    address: str,
+    vendor: int,
+    device: int,
+    pci_class: int,
+    local_cpulist: Optional[str] = None,
+    numa_node: Optional[int] = None,
+) -> Path:
+    """Add a device under /sys/bus/pci/devices and return its directory."""
+    base = f"/sys/bus/pci/devices/{address}"
+    write(root, f"{base}/vendor", f"0x{vendor:04x}")
+    write(root, f"{base}/device", f"0x{device:04x}")
+    write(root, f"{base}/class", f"0x{pci_class:06x}")
+    if local_cpulist is not None:
+        write(root, f"{base}/local_cpulist", local_cpulist)
+    if numa_node is not None:
+        write(root, f"{base}/numa_node", str(numa_node))
+
+    return root / base.lstrip("/")
+
+
+def add_net_device(
+    root: Path, interface: str, numa_node: Optional[int] = None, default: bool = False
+) -> None:
+    """Add a network interface, backed by a PCI device if `numa_node` is set."""
+    write(root, f"/sys/class/net/{interface}/operstate", "up")
+    if numa_node is not None:
+        write(root, f"/sys/class/net/{interface}/device/numa_node", str(numa_node))
+    if default:
+        write(
+            root,
+            "/proc/net/route",
+            "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\n"
+            f"{interface}\t0000000A\t00000000\t0001\t0\t0\t0\t00FFFFFF\n"
+            f"{interface}\t00000000\t0100000A\t0003\t0\t0\t0\t00000000",
+        )
+
+
+def add_process(root: Path, pid: int, comm: str, cmdline: str, rss_kb: int) -> None:
+    """Add a process under /proc with its resident set size."""
+    write(root, f"/proc/{pid}/comm", comm)
+    write(root, f"/proc/{pid}/cmdline", cmdline.replace(" ", "\0"))
+    write(root, f"/proc/{pid}/status", f"Name:\t{comm}\nVmRSS:\t  {rss_kb} kB\nThreads:\t1")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stand-in for systemd served on a private D-Bus daemon."""
+
+import asyncio
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from dbus_fast import BusType, Message, Variant
+from dbus_fast.aio import MessageBus
+from dbus_fast.errors import DBusError
+from dbus_fast.service import PropertyAccess, ServiceInterface, dbus_property, method, signal
+
+DBUS_DAEMON = shutil.which("dbus-daemon")
+
+_BUS_CONFIG = """
+<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-BUS Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:path={socket}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+
+def _unit_path(unit: str) -> str:
+    escaped = "".join(c if c.isalnum() else f"_{ord(c):02x}" for c in unit)
+    return f"/org/freedesktop/systemd1/unit/{escaped}"
+
+
+class _Unit(ServiceInterface):
+    def __init__(self) -> None:
+        super().__init__("org.freedesktop.systemd1.Unit")
+        self.active_state = "inactive"
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ActiveState(self) -> "s":  # noqa: F821 N802
+        return self.active_state
+
+
+class _Manager(ServiceInterface):
+    def __init__(self, systemd: "FakeSystemd") -> None:
+        super().__init__("org.freedesktop.systemd1.Manager")
+        self._systemd = systemd
+        self._job = 0
+
+    def _queue(self, unit: str, state: str) -> str:
+        self._job += 1
+        job = f"/org/freedesktop/systemd1/job/{self._job}"
+        self._systemd.calls.append(unit)
+        result = "failed" if unit in self._systemd.failing else "done"
+        if result == "done":
+            self._systemd.unit(unit).active_state = state
+        # Like systemd, the job finishes after the call returned its path.
+        asyncio.get_running_loop().call_soon(self.JobRemoved, self._job, job, unit, result)
+        return job
+
+    @method()
+    def StartUnit(self, unit: "s", mode: "s") -> "o":  # noqa: F821 N802
+        return self._queue(unit, "active")
+
+    @method()
+    def StopUnit(self, unit: "s", mode: "s") -> "o":  # noqa: F821 N802
+        return self._queue(unit, "inactive")
+
+    @method()
+    def RestartUnit(self, unit: "s", mode: "s") -> "o":  # noqa: F821 N802
+        return self._queue(unit, "active")
+
+    @method()
+    def ReloadUnit(self, unit: "s", mode: "s") -> "o":  # noqa: F821 N802
+        return self._queue(unit, "active")
+
+    @method()
+    def GetUnit(self, unit: "s") -> "o":  # noqa: F821 N802
+        if unit not in self._systemd.units:
+            raise DBusError("org.freedesktop.systemd1.NoSuchUnit", f"Unit {unit} not loaded.")
+        return _unit_path(unit)
+
+    @method()
+    def EnableUnitFiles(self, files: "as", runtime: "b", force: "b") -> "ba(sss)":  # noqa
+        if force:
+            raise DBusError("org.freedesktop.DBus.Error.InvalidArgs", "Refusing to force.")
+        self._systemd.enabled.update(files)
+        return [True, []]
+
+    @method()
+    def DisableUnitFiles(self, files: "as", runtime: "b") -> "a(sss)":  # noqa
+        self._systemd.enabled.difference_update(files)
+        return []
+
+    @method()
+    def Reload(self) -> None:  # noqa: N802
+        self._systemd.reloads += 1
+
+    @method()
+    def Subscribe(self) -> None:  # noqa: N802
+        pass
+
+    @signal()
+    def JobRemoved(self, id: "u", job: "o", unit: "s", result: "s") -> "uoss":  # noqa
+        return [id, job, unit, result]
+
+
+class FakeSystemd:
+    """Private D-Bus daemon with a stand-in systemd manager.
+
+    The address of the bus is available as `address` once started.
+    """
+
+    def __init__(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.address = f"unix:path={self._tmp.name}/bus"
+        self.units: Dict[str, _Unit] = {}
+        self.calls: List[str] = []
+        self.failing = set()
+        self.enabled = set()
+        self.reloads = 0
+        self._daemon = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._bus = None
+
+    def unit(self, name: str) -> _Unit:
+        """Return the unit object, loading the unit if needed."""
+        if name not in self.units:
+            self.units[name] = _Unit()
+            self._bus.export(_unit_path(name), self.units[name])
+        return self.units[name]
+
+    def emit(self, units: Iterable[str], state: str = "active") -> None:
+        """Emit the PropertiesChanged signals of units changing state, like systemd.
+
+        Returns once the bus routed all signals to their receivers.
+        """
+        asyncio.run_coroutine_threadsafe(self._emit(units, state), self._loop).result(60)
+
+    async def _emit(self, units: Iterable[str], state: str) -> None:
+        for i, unit in enumerate(units, 1):
+            await self._bus.send(
+                Message.new_signal(
+                    _unit_path(unit),
+                    "org.freedesktop.DBus.Properties",
+                    "PropertiesChanged",
+                    "sa{sv}as",
+                    ["org.freedesktop.systemd1.Unit", {"ActiveState": Variant("s", state)}, []],
+                )
+            )
+            # dbus_fast drops the connection if the socket buffer fills up.
+            if i % 100 == 0:
+                await self._round_trip()
+        # The bus handles the messages of a connection in order.
+        await self._round_trip()
+
+    async def _round_trip(self) -> None:
+        await self._bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="GetId",
+            )
+        )
+
+    def start(self) -> "FakeSystemd":
+        """Start the bus and serve the stand-in systemd on it."""
+        config = Path(self._tmp.name) / "bus.conf"
+        config.write_text(textwrap.dedent(_BUS_CONFIG.format(socket=f"{self._tmp.name}/bus")))
+        self._daemon = subprocess.Popen(
+            [DBUS_DAEMON, "--nofork", f"--config-file={config}"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while not Path(f"{self._tmp.name}/bus").exists():
+            if time.monotonic() > deadline:
+                raise TimeoutError("dbus-daemon did not start")
+            time.sleep(0.01)
+
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result(10)
+        return self
+
+    async def _serve(self) -> None:
+        self._bus = await MessageBus(bus_address=self.address, bus_type=BusType.SYSTEM).connect()
+        self._bus.export("/org/freedesktop/systemd1", _Manager(self))
+        await self._bus.request_name("org.freedesktop.systemd1")
+
+    def stop(self) -> None:
+        """Stop the stand-in and the bus."""
+        if self._bus is not None:
+            self._loop.call_soon_threadsafe(self._bus.disconnect)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        if self._daemon is not None:
+            self._daemon.terminate()
+            self._daemon.wait()
+        self._tmp.cleanup()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the base utility module."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from utils import base
+
+
+@patch("distro.version", return_value="7")
+@patch("distro.id", return_value="centos")
+class TestBase(unittest.TestCase):
+    """Unit tests for the cached base detection."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.state = Path(tmp.name) / "cache" / "base.json"
+
+    def test_detect_without_cache(self, distro_id, _) -> None:
+        self.assertEqual(base.os_id(self.state), "centos")
+        self.assertEqual(base.os_id(self.state), "centos")
+        self.assertEqual(distro_id.call_count, 2)
+        self.assertFalse(self.state.exists())
+
+    def test_cached(self, distro_id, _) -> None:
+        self.assertEqual(base.save(self.state), {"id": "centos", "version": "7"})
+        distro_id.return_value = "ubuntu"
+        self.assertEqual(base.os_id(self.state), "centos")
+        distro_id.assert_called_once()
+
+        # A series upgrade caches the new base.
+        base.save(self.state)
+        self.assertEqual(base.os_id(self.state), "ubuntu")
+
+    def test_unwritable_cache(self, *_) -> None:
+        self.state.parent.touch()
+        self.assertEqual(base.save(self.state)["id"], "centos")
+        self.assertEqual(base.os_id(self.state), "centos")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for GRES detection."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import fake_sysfs
+
+from utils.gres import GresDetector
+from utils.probe import Probe
+
+
+class TestGres(unittest.TestCase):
+    """Unit tests for GRES detection against fake sysfs trees."""
+
+    def setUp(self) -> None:
+        """Create a two socket, eight core fake machine."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        fake_sysfs.add_cpus(self.root, sockets=2, cores_per_socket=4, threads_per_core=2)
+        self.detector = GresDetector(Probe(self.root))
+
+    def test_nvidia(self) -> None:
+        """Test NVIDIA GPUs are mapped by device minor and local cpus."""
+        for minor, address, cpus in (
+            (1, "0000:3b:00.0", "0-3,8-11"),
+            (0, "0000:af:00.0", "4-7,12-15"),
+        ):
+            fake_sysfs.add_pci_device(self.root, address, 0x10DE, 0x1DB4, 0x030200, cpus)
+            fake_sysfs.write(
+                self.root,
+                f"/proc/driver/nvidia/gpus/{address}/information",
+                f"Model: \t\t Tesla V100-SXM2-16GB\nDevice Minor: \t {minor}",
+            )
+            fake_sysfs.write(self.root, f"/dev/nvidia{minor}", "")
+        # The audio function of a GPU and other vendors' VGA must be ignored.
+        fake_sysfs.add_pci_device(self.root, "0000:3b:00.1", 0x10DE, 0x10F0, 0x040300)
+        fake_sysfs.add_pci_device(self.root, "0000:03:00.0", 0x1A03, 0x2000, 0x030000)
+
+        gpus = self.detector.detect()
+
+        self.assertEqual([gpu["file"] for gpu in gpus], ["/dev/nvidia1", "/dev/nvidia0"])
+        self.assertEqual([gpu["cores"] for gpu in gpus], ["0-3", "4-7"])
+        self.assertEqual(gpus[0]["type"], "tesla_v100-sxm2-16gb")
+        self.assertNotIn("links", gpus[0])
+
+    def test_amd_xgmi_links(self) -> None:
+        """Test AMD GPUs are mapped to render nodes and xGMI links are read from KFD."""
+        addresses = ["0000:c1:00.0", "0000:c5:00.0", "0000:c9:00.0"]
+        for i, address in enumerate(addresses):
+            device = fake_sysfs.add_pci_device(
+                self.root, address, 0x1002, 0x738C, 0x038000, "0-15"
+            )
+            (device / "drm" / f"renderD{128 + i}").mkdir(parents=True)
+            fake_sysfs.write(self.root, f"/sys/bus/pci/devices/{address}/product_name", "MI100")
+            fake_sysfs.write(self.root, f"/dev/dri/renderD{128 + i}", "")
+            # KFD node 0 is the CPU, GPUs start at node 1.
+            bus = int(address[5:7], 16)
+            fake_sysfs.write(
+                self.root,
+                f"/sys/class/kfd/kfd/topology/nodes/{i + 1}/properties",
+                f"cpu_cores_count 0\nlocation_id {bus << 8}\ndomain 0",
+            )
+        # GPU 0 and 1 share an xGMI link, GPU 2 is only connected over PCIe.
+        for node_from, node_to, link_type in ((1, 2, 11), (2, 1, 11), (3, 0, 2)):
+            fake_sysfs.write(
+                self.root,
+                f"/sys/class/kfd/kfd/topology/nodes/{node_from}/io_links/0/properties",
+                f"type {link_type}\nnode_from {node_from}\nnode_to {node_to}\nweight 15",
+            )
+
+        gpus = self.detector.detect()
+
+        self.assertEqual(
+            [gpu["file"] for gpu in gpus], [f"/dev/dri/renderD{128 + i}" for i in range(3)]
+        )
+        self.assertEqual([gpu["links"] for gpu in gpus], ["-1,1,0", "1,-1,0", "0,0,-1"])
+        self.assertEqual(gpus[0]["type"], "mi100")
+        self.assertEqual(gpus[0]["cores"], "0-7")
+
+    def test_intel_without_render_node(self) -> None:
+        """Test that a GPU without a device file is skipped."""
+        fake_sysfs.add_pci_device(self.root, "0000:00:02.0", 0x8086, 0x0BD5, 0x038000)
+        self.assertEqual(len(self.detector.gpus()), 1)
+        self.assertEqual(self.detector.detect(), [])
+
+    def test_integrated_gpus(self) -> None:
+        """Test that integrated GPUs with a render node are not GPUs, unlike 3D controllers."""
+        for i, (address, vendor, device, pci_class) in enumerate(
+            (
+                ("0000:00:02.0", 0x8086, 0x9A49, 0x030000),
+                ("0000:05:00.0", 0x1002, 0x1638, 0x030000),
+                ("0000:4d:00.0", 0x8086, 0x0BD6, 0x030200),
+            )
+        ):
+            path = fake_sysfs.add_pci_device(self.root, address, vendor, device, pci_class)
+            (path / "drm" / f"renderD{128 + i}").mkdir(parents=True)
+            fake_sysfs.write(self.root, f"/dev/dri/renderD{128 + i}", "")
+
+        self.assertEqual([gpu["pci_address"] for gpu in self.detector.detect()], ["0000:4d:00.0"])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the health utility module."""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from utils.health import MUNGED, TTL_SLACK, HealthCache
+
+
+class TestHealthCache(unittest.TestCase):
+    """Unit tests for the cache of passing health checks."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.state = Path(tmp.name) / "state" / "health.json"
+        self.now = 1000.0
+        self.probe = Mock(return_value=True)
+
+    def _cache(self, ttl: float = 60) -> HealthCache:
+        # Every hook constructs a new cache.
+        return HealthCache(self.state, ttl=ttl, clock=lambda: self.now)
+
+    def test_cache_passing_check(self) -> None:
+        self.assertTrue(self._cache().check(MUNGED, self.probe))
+        self.now += 60 + TTL_SLACK - 1
+        self.assertTrue(self._cache().check(MUNGED, self.probe))
+        self.probe.assert_called_once()
+
+        self.now += 1
+        self.assertTrue(self._cache().check(MUNGED, self.probe))
+        self.assertEqual(self.probe.call_count, 2)
+
+    def test_next_update_status_is_cached(self) -> None:
+        """Test that update-status one interval after the check hits the cache."""
+        cache = HealthCache(self.state, clock=lambda: self.now)
+        cache.check(MUNGED, self.probe)
+        self.now += 300
+        cache.check(MUNGED, self.probe)
+        self.probe.assert_called_once()
+
+        # The check runs again on the update-status after that.
+        self.now += 300
+        cache.check(MUNGED, self.probe)
+        self.assertEqual(self.probe.call_count, 2)
+
+    def test_failing_check_not_cached(self) -> None:
+        """Test that failing checks run on every call and keep when they last passed."""
+        self._cache().check(MUNGED, self.probe)
+        self._cache().invalidate(MUNGED)
+        self.probe.return_value = False
+        self.now += 10
+        self.assertFalse(self._cache().check(MUNGED, self.probe))
+        self.assertFalse(self._cache().check(MUNGED, self.probe))
+        self.assertEqual(self.probe.call_count, 3)
+        self.assertEqual(
+            json.loads(self.state.read_text()),
+            {MUNGED: {"ok": False, "checked": 1010.0, "last_good": 1000.0}},
+        )
+
+    def test_invalidate(self) -> None:
+        self._cache().invalidate(MUNGED)
+        self._cache().check(MUNGED, self.probe)
+        self._cache().invalidate(MUNGED)
+        self._cache().check(MUNGED, self.probe)
+        self.assertEqual(self.probe.call_count, 2)
+
+    def test_ttl_disabled(self) -> None:
+        self._cache(ttl=0).check(MUNGED, self.probe)
+        self._cache(ttl=0).check(MUNGED, self.probe)
+        self.assertEqual(self.probe.call_count, 2)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the hostlist and node set utilities."""
+
+import unittest
+
+from utils import hostlist
+from utils.nodeset import group_node_sets
+
+
+class TestHostlist(unittest.TestCase):
+    """Unit tests for hostlist compression and expansion."""
+
+    def test_compress(self) -> None:
+        hosts = [f"node{i:03d}" for i in (3, 1, 2, 7, 512)] + ["login", "node2-ib"]
+        self.assertEqual(hostlist.compress(hosts), "login,node[001-003,007,512],node2-ib")
+        self.assertEqual(hostlist.compress(["node9", "node10", "node11"]), "node[9-11]")
+        self.assertEqual(hostlist.compress(["node08", "node09", "node10"]), "node[08-10]")
+        self.assertEqual(hostlist.compress(["node1", "node01"]), "node[01,1]")
+        self.assertEqual(hostlist.compress([]), "")
+
+    def test_compress_keeps_order(self) -> None:
+        addrs = ["10.0.0.5", "10.0.0.6", "10.0.0.2", "10.0.1.1"]
+        expression = hostlist.compress(addrs, sort=False)
+        self.assertEqual(expression, "10.0.0.[5-6,2],10.0.1.1")
+        self.assertEqual(hostlist.expand(expression), addrs)
+
+    def test_expand(self) -> None:
+        self.assertEqual(
+            hostlist.expand("node[001-003,007],gpu[1-2]-ib, login"),
+            ["node001", "node002", "node003", "node007", "gpu1-ib", "gpu2-ib", "login"],
+        )
+        self.assertEqual(
+            hostlist.expand("rack[1-2]-node[1-2]"),
+            ["rack1-node1", "rack1-node2", "rack2-node1", "rack2-node2"],
+        )
+        with self.assertRaises(ValueError):
+            hostlist.expand("node[5-1]")
+
+    def test_round_trip(self) -> None:
+        hosts = [f"compute-{i}" for i in range(1, 1000) if i % 7]
+        self.assertEqual(hostlist.expand(hostlist.compress(hosts)), hosts)
+
+
+class TestNodeSets(unittest.TestCase):
+    """Unit tests for grouping homogeneous nodes."""
+
+    @staticmethod
+    def _node(i: int, real_memory: int = 257000, cpus: int = 128) -> dict:
+        return {
+            "node_name": f"node{i:03d}",
+            "node_addr": f"10.0.0.{i}",
+            "state": "UNKNOWN",
+            "cpus": cpus,
+            "sockets_per_board": 2,
+            "real_memory": real_memory,
+            "numa_nodes": {"0": {"cpus": f"0-{cpus - 1}"}},
+        }
+
+    def test_group_node_sets(self) -> None:
+        nodes = [self._node(i, 257000 + i) for i in range(1, 101)]
+        nodes.append(self._node(101, 128000))
+        nodes.append(self._node(102, cpus=64))
+
+        node_sets = group_node_sets(reversed(nodes), memory_tolerance=1.0)
+
+        self.assertEqual(
+            [(s["node_name"], s["real_memory"], s["count"]) for s in node_sets],
+            [("node[001-100]", 257001, 100), ("node101", 128000, 1), ("node102", 257000, 1)],
+        )
+        self.assertEqual(node_sets[0]["node_addr"], "10.0.0.[1-100]")
+        self.assertNotIn("gres", node_sets[0])
+        self.assertNotIn("numa_nodes", node_sets[0])
+
+    def test_memory_tolerance(self) -> None:
+        nodes = [self._node(1, 100000), self._node(2, 100500), self._node(3, 102000)]
+        self.assertEqual(len(group_node_sets(nodes, memory_tolerance=1.0)), 2)
+        self.assertEqual(len(group_node_sets(nodes, memory_tolerance=0.0)), 3)
+
+    def test_reservation(self) -> None:
+        """Test that nodes reserving different cores or memory are not grouped."""
+        nodes = [self._node(i) for i in range(1, 5)]
+        for node in nodes[:2]:
+            node.update(cpu_spec_list="0-1", mem_spec_limit=1024)
+        nodes[2].update(cpu_spec_list="0-1", mem_spec_limit=2048)
+
+        node_sets = group_node_sets(nodes)
+
+        self.assertEqual(
+            [(s["node_name"], s.get("cpu_spec_list"), s.get("mem_spec_limit")) for s in node_sets],
+            [("node[001-002]", "0-1", 1024), ("node003", "0-1", 2048), ("node004", None, None)],
+        )
+
+    def test_gres_types(self) -> None:
+        """Test that nodes with equal GPU counts but different types are not grouped."""
+        nodes = [self._node(i) for i in range(1, 4)]
+        for node, gpu_type in zip(nodes, ("a100", "a100", "v100")):
+            node["gres"] = "gpu:4"
+            node["gres_devices"] = [
+                {
+                    "name": "gpu",
+                    "type": gpu_type,
+                    "file": f"/dev/nvidia{i}",
+                    "cores": "0-63",
+                    "pci_address": f"0000:{node['node_name'][-1]}{i}:00.0",
+                }
+                for i in range(4)
+            ]
+
+        node_sets = group_node_sets(nodes)
+
+        self.assertEqual(
+            [(s["node_name"], s["gres"]) for s in node_sets],
+            [("node[001-002]", "gpu:4"), ("node003", "gpu:4")],
+        )
+        self.assertEqual([d["type"] for d in node_sets[0]["gres_devices"]], ["a100"] * 4)
+        self.assertEqual([d["type"] for d in node_sets[1]["gres_devices"]], ["v100"] * 4)
+        self.assertNotIn("pci_address", node_sets[0]["gres_devices"][0])
+        self.assertNotIn("gres_devices", group_node_sets([self._node(4)])[0])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the inventory cache."""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import fake_sysfs
+
+from utils.inventory import InventoryCache, fingerprint
+from utils.probe import Probe
+
+
+class TestInventoryCache(unittest.TestCase):
+    """Unit tests for the on-disk inventory cache and drift detection."""
+
+    def setUp(self) -> None:
+        """Create a fake machine and a cache file location."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name) / "root"
+        self.path = Path(tmp.name) / "cache" / "inventory.json"
+        fake_sysfs.add_cpus(self.root, sockets=1, cores_per_socket=4, threads_per_core=1)
+        fake_sysfs.add_meminfo(self.root, 8 * 1024 * 1024)
+        self.cache = InventoryCache(self.path, Probe(self.root))
+
+    def test_refresh(self) -> None:
+        """Test that the first probe is cached and unchanged hardware is not reported."""
+        changes = self.cache.refresh()
+        self.assertEqual(changes["real_memory"], 8192)
+        cached = json.loads(self.path.read_text())
+        self.assertEqual(cached["fingerprint"], fingerprint(cached["hardware"]))
+
+        self.assertEqual(self.cache.refresh(), {})
+        # A new cache instance reads the fingerprint back from disk.
+        self.assertEqual(InventoryCache(self.path, Probe(self.root)).refresh(), {})
+
+    def test_refresh_drift(self) -> None:
+        """Test that only drifted fields are reported."""
+        self.cache.refresh()
+        fake_sysfs.add_meminfo(self.root, 4 * 1024 * 1024)
+        changes = self.cache.refresh()
+        self.assertEqual(changes["real_memory"], 4096)
+        self.assertNotIn("cpus", changes)
+
+    def test_refresh_removed_gpu(self) -> None:
+        """Test that fields of removed hardware are reported as None."""
+        fake_sysfs.add_pci_device(self.root, "0000:01:00.0", 0x10DE, 1, 0x030200)
+        dev = fake_sysfs.write(self.root, "/dev/nvidia0", "")
+        self.assertEqual(self.cache.hardware["gres"], 1)
+
+        dev.unlink()
+        self.assertEqual(self.cache.refresh(), {"gres": None, "gres_devices": None})
+
+    def test_unwritable_cache(self) -> None:
+        """Test that a cache that can not be written does not fail the hook."""
+        self.path.parent.mkdir(parents=True)
+        self.path.parent.chmod(0o500)
+        self.addCleanup(self.path.parent.chmod, 0o700)
+        self.assertEqual(self.cache.hardware["cpus"], 4)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the monkeypatch utility module."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from charms.operator_libs_linux.v0 import juju_systemd_notices as notices_module
+
+from utils import monkeypatch
+
+
+class TestMonkeypatch(unittest.TestCase):
+    """Unit tests for the patches applied on CentOS and for D-Bus."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # Restore the library functions replaced by the patches.
+        patcher = patch.multiple(
+            notices_module,
+            _daemon_reload=notices_module._daemon_reload,
+            _start_service=notices_module._start_service,
+            _stop_service=notices_module._stop_service,
+            _enable_service=notices_module._enable_service,
+            _disable_service=notices_module._disable_service,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("utils.systemd_dbus.service_start")
+    @patch("utils.systemd_dbus.service_enable")
+    @patch("utils.systemd_dbus.daemon_reload")
+    def test_centos_subscribe_over_dbus(self, daemon_reload, service_enable, service_start):
+        """Test that the CentOS notices daemon is started over D-Bus once routed there."""
+
+        class Notices:
+            _service_file = self.tmp / "juju-slurmd-0.service"
+            _debounce = 0.5
+            _stats_socket = self.tmp / "stats.sock"
+            _charm = Mock(**{"framework.charm_dir": self.tmp, "unit.name": "slurmd/0"})
+            _create_hooks = Mock()
+
+        monkeypatch.juju_systemd_notices(Notices)
+        monkeypatch.juju_systemd_notices_dbus(notices_module)
+        Notices().subscribe()
+
+        self.assertIn("ExecStart=/usr/bin/env python3.8", Notices._service_file.read_text())
+        daemon_reload.assert_called_once_with()
+        service_enable.assert_called_once_with("juju-slurmd-0.service")
+        service_start.assert_called_once_with("juju-slurmd-0.service")
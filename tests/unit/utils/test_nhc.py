@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the NHC utility module."""
+
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from utils import nhc
+
+NHC_CONF = textwrap.dedent("""\
+    # NHC configuration
+    * || export PATH="$PATH:/usr/sbin"
+    * || check_fast
+      node[1-4] ||  check_slow 0.05
+    * || check_fail
+    # * || check_commented
+    """)
+
+# Stand-in for nhc-wrapper, running the checks of $CONFFILE with the scripts of NHC.
+PARALLEL_CONF = textwrap.dedent("""\
+    * || export PATH="$PATH:/usr/sbin"
+    * || check_fast
+    # @parallel mounts
+    * || check_slow 0.3
+    # @parallel gpu 0.2
+    * || check_slow \\
+        0.3
+    # @serial
+    * || export SLOW=1
+    * || check_fail Default group
+    """)
+
+# Stand-in for the NHC helpers marking the node in slurm.
+MARK_NODE = textwrap.dedent("""\
+    #!/bin/sh
+    echo "$(basename "$0") $*" >> {marks}
+    """)
+
+NHC_WRAPPER = textwrap.dedent("""\
+    #!/bin/bash
+    source {timing_script}
+    check_fast() {{ :; }}
+    check_slow() {{ sleep "$1"; }}
+    check_fail() {{ echo "ERROR:  nhc:  Health check failed:  $*"; exit 1; }}
+    echo "$@" > {args}
+    echo "${{MARK_OFFLINE:-1}}" > {args}.mark-offline
+    while read line; do
+        [[ "$line" == \\#* || "$line" != *"||"* ]] && continue
+        eval "${{line#*||}}"
+    done < "$CONFFILE"
+    """)
+
+
+class TestNhc(unittest.TestCase):
+    """Unit tests for the NHC wrapper and its profile."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.log = self.tmp / "log" / "nhc-profile.jsonl"
+        self.conf = self.tmp / "nhc.conf"
+        self.conf.write_text(NHC_CONF)
+        timing_script = self.tmp / "charm_timing.nhc"
+        timing_script.write_text(nhc.timing_script())
+        self.program = self.tmp / "nhc-wrapper"
+        self.program.write_text(
+            NHC_WRAPPER.format(timing_script=timing_script, args=self.tmp / "args")
+        )
+        self.program.chmod(0o755)
+        self.marks = self.tmp / "marks"
+        helpers = self.tmp / "helpers"
+        helpers.mkdir()
+        for helper in ("node-mark-offline", "node-mark-online"):
+            (helpers / helper).write_text(MARK_NODE.format(marks=self.marks))
+            (helpers / helper).chmod(0o755)
+        patcher = patch("utils.nhc.NHC_HELPERS", helpers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, budget: float = 0) -> int:
+        with patch.dict(os.environ, {"CONFFILE": str(self.conf)}):
+            return nhc.main(
+                [
+                    "--budget",
+                    str(budget),
+                    "--program",
+                    str(self.program),
+                    "--log",
+                    str(self.log),
+                    "--",
+                    "-X",
+                    "5",
+                ]
+            )
+
+    def test_instrument(self) -> None:
+        instrumented = nhc.instrument(NHC_CONF).splitlines()
+        self.assertEqual(instrumented[1], '* || export PATH="$PATH:/usr/sbin"')
+        self.assertEqual(instrumented[2], "* || nhc_timed check_fast")
+        self.assertEqual(instrumented[3], "  node[1-4] ||  nhc_timed check_slow 0.05")
+        self.assertEqual(instrumented[5], "# * || check_commented")
+
+    def test_parse_timing(self) -> None:
+        lines = [
+            "S 100.0 check_fast",
+            "E 100.5 0 check_fast",
+            "garbage",
+            "E 101.0 0 check_unknown",
+            "S 101.0 check_fail -a",
+        ]
+        self.assertEqual(
+            nhc.parse_timing(lines, end=103.0),
+            [
+                {"check": "check_fast", "seconds": 0.5, "returncode": 0},
+                {"check": "check_fail -a", "seconds": 2.0, "returncode": None},
+            ],
+        )
+
+    def test_run(self) -> None:
+        with patch("utils.nhc._warn") as warn:
+            self.assertEqual(self._run(), 1)
+        warn.assert_not_called()
+        self.assertEqual((self.tmp / "args").read_text().strip(), "-X 5")
+
+        (record,) = nhc.records(self.log)
+        self.assertEqual(record["returncode"], 1)
+        self.assertNotIn("over_budget", record)
+        self.assertEqual(
+            [(c["check"], c["returncode"]) for c in record["checks"]],
+            [("check_fast", 0), ("check_slow 0.05", 0), ("check_fail", None)],
+        )
+        self.assertGreaterEqual(record["checks"][1]["seconds"], 0.05)
+        self.assertGreaterEqual(record["seconds"], sum(c["seconds"] for c in record["checks"]))
+
+    def test_run_over_budget(self) -> None:
+        with patch("utils.nhc._warn") as warn:
+            self._run(budget=0.01)
+        warn.assert_called_once()
+        self.assertIn("slowest check: check_slow 0.05", warn.call_args.args[0])
+        self.assertTrue(nhc.records(self.log)[0]["over_budget"])
+
+    def test_run_without_conf(self) -> None:
+        self.conf.unlink()
+        self.assertEqual(self._run(), 1)
+        (record,) = nhc.records(self.log)
+        self.assertEqual(record["checks"], [])
+
+    def test_groups(self) -> None:
+        self.assertEqual(nhc.groups(NHC_CONF), [])
+
+        groups = nhc.groups(PARALLEL_CONF)
+        self.assertEqual(
+            [(g.name, g.timeout) for g in groups],
+            [("default", None), ("mounts", None), ("gpu", 0.2)],
+        )
+        settings = '* || export PATH="$PATH:/usr/sbin"\n'
+        self.assertEqual(
+            groups[0].conf,
+            f"{settings}* || check_fast\n* || export SLOW=1\n* || check_fail Default group\n",
+        )
+        self.assertEqual(groups[1].conf, f"{settings}* || check_slow 0.3\n* || export SLOW=1\n")
+        self.assertEqual(
+            groups[2].conf, f"{settings}* || check_slow \\\n    0.3\n* || export SLOW=1\n"
+        )
+
+    def test_run_parallel(self) -> None:
+        self.conf.write_text(PARALLEL_CONF.replace("# @parallel gpu 0.2", "# @parallel gpu"))
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            self.assertEqual(self._run(), 1)
+        self.assertEqual(stdout.getvalue(), "ERROR:  nhc:  Health check failed:  Default group\n")
+        self.assertEqual((self.tmp / "args.mark-offline").read_text().strip(), "0")
+        self.assertEqual(
+            self.marks.read_text(),
+            f"node-mark-offline {socket.gethostname().split('.')[0]} Default group\n",
+        )
+
+        (record,) = nhc.records(self.log)
+        self.assertEqual(
+            [(g["group"], g["returncode"], g["timed_out"]) for g in record["groups"]],
+            [("default", 1, False), ("mounts", 0, False), ("gpu", 0, False)],
+        )
+        self.assertEqual(
+            [(c["group"], c["check"]) for c in record["checks"]],
+            [
+                ("default", "check_fast"),
+                ("default", "check_fail Default group"),
+                ("mounts", "check_slow 0.3"),
+                ("gpu", "check_slow 0.3"),
+            ],
+        )
+        # The slow groups ran concurrently.
+        self.assertLess(record["seconds"], 0.6)
+
+        summary = nhc.summary(log=self.log)
+        self.assertEqual(set(summary["groups"]), {"default", "mounts", "gpu"})
+        self.assertEqual(summary["groups"]["gpu"]["timed_out"], 0)
+
+    def test_run_parallel_timeout(self) -> None:
+        self.conf.write_text(PARALLEL_CONF.replace("* || check_fail Default group\n", ""))
+        with patch("utils.nhc.TIMEOUT_GRACE", 0), patch("sys.stdout", new_callable=io.StringIO):
+            self.assertEqual(self._run(), 1)
+        self.assertIn("Group gpu timed out after 0.2 seconds", self.marks.read_text())
+
+        (record,) = nhc.records(self.log)
+        self.assertEqual(
+            [(g["group"], g["timed_out"]) for g in record["groups"]],
+            [("default", False), ("mounts", False), ("gpu", True)],
+        )
+        self.assertEqual(record["checks"][-1]["returncode"], None)
+
+    def test_run_parallel_passing(self) -> None:
+        self.conf.write_text(PARALLEL_CONF.replace("* || check_fail Default group\n", ""))
+        with patch.dict(os.environ, {"MARK_OFFLINE": "0"}):
+            self.assertEqual(self._run(), 0)
+        self.assertFalse(self.marks.exists())
+
+        self.assertEqual(self._run(), 0)
+        self.assertEqual(
+            self.marks.read_text(), f"node-mark-online {socket.gethostname().split('.')[0]}\n"
+        )
+
+    def test_log_is_rolling(self) -> None:
+        with patch("utils.nhc.MAX_RUNS", 2):
+            for _ in range(3):
+                self._run()
+        self.assertEqual(len(nhc.records(self.log)), 2)
+
+    def test_summary(self) -> None:
+        self.assertEqual(nhc.summary(log=self.log), {})
+
+        runs = [
+            {"seconds": 1.0, "returncode": 0, "checks": [{"check": "check_a", "seconds": 0.1}]},
+            {"seconds": 3.0, "returncode": 1, "over_budget": True, "checks": []},
+            {
+                "seconds": 2.0,
+                "returncode": 0,
+                "checks": [
+                    {"check": "check_a", "seconds": 0.3},
+                    {"check": "check_b", "seconds": 1.5},
+                ],
+            },
+        ]
+        self.log.parent.mkdir()
+        self.log.write_text("\n".join(json.dumps(run) for run in runs))
+
+        summary = nhc.summary(top=1, log=self.log)
+        self.assertEqual(summary["runs"], 3)
+        self.assertEqual(summary["failed"], 1)
+        self.assertEqual(summary["over_budget"], 1)
+        self.assertEqual(summary["seconds"], {"p50": 2.0, "p95": 3.0, "max": 3.0})
+        self.assertEqual(
+            summary["slowest_checks"],
+            [{"check": "check_b", "runs": 1, "p50": 1.5, "p95": 1.5, "max": 1.5}],
+        )
+
+    def test_wrapper(self) -> None:
+        wrapper = nhc.wrapper("-X 5", 2.5, "/usr/bin/env python3.8").splitlines()
+        self.assertEqual(wrapper[0], "#!/bin/sh")
+        self.assertEqual(
+            wrapper[-1], "exec /usr/bin/env python3.8 -m utils.nhc --budget 2.5 -- -X 5"
+        )
+
+    def test_wrapper_runs_outside_the_charm(self) -> None:
+        """Test that the rendered wrapper runs without the environment of the charm."""
+        wrapper = self.tmp / "omni-nhc-wrapper"
+        contents = nhc.wrapper("-X 5", python=sys.executable)
+        wrapper.write_text(
+            contents.replace(
+                "-m utils.nhc", f"-m utils.nhc --program {self.program} --log {self.log}"
+            )
+        )
+        wrapper.chmod(0o755)
+        result = subprocess.run(
+            [str(wrapper)],
+            env={"PATH": os.defpath, "CONFFILE": str(self.conf)},
+            cwd=self.tmp,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 1, result.stderr)
+        self.assertEqual(result.stderr, "")
+        self.assertEqual((self.tmp / "args").read_text().strip(), "-X 5")
+        self.assertEqual(len(nhc.records(self.log)[0]["checks"]), 3)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the persist utility module."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils.persist import append_rolling, write_atomic
+
+
+class TestPersist(unittest.TestCase):
+    """Unit tests for the atomic writes of state files and logs."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def test_write_atomic(self) -> None:
+        path = self.tmp / "state" / "state.json"
+        self.assertTrue(write_atomic(path, "{}"))
+        self.assertTrue(write_atomic(path, '{"a": 1}'))
+        self.assertEqual(path.read_text(), '{"a": 1}')
+        self.assertEqual(list(path.parent.iterdir()), [path])
+
+    def test_write_atomic_failure(self) -> None:
+        (self.tmp / "file").write_text("")
+        with self.assertLogs("utils.persist", "WARNING"):
+            self.assertFalse(write_atomic(self.tmp / "file" / "state.json", "{}"))
+
+    def test_append_rolling(self) -> None:
+        log = self.tmp / "log" / "runs.jsonl"
+        for line in "abcd":
+            self.assertTrue(append_rolling(log, line, keep=3))
+        self.assertEqual(log.read_text(), "b\nc\nd\n")
+
+        append_rolling(log, "e", keep=1)
+        self.assertEqual(log.read_text(), "e\n")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the sysfs/procfs hardware probe and node inventory."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import fake_sysfs
+
+from utils import machine
+from utils.probe import Probe, format_cpulist, parse_cpulist
+
+
+class TestProbe(unittest.TestCase):
+    """Unit tests for the hardware probe."""
+
+    def setUp(self) -> None:
+        """Create an empty fake filesystem root."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.probe = Probe(self.root)
+
+    def test_cpulist_round_trip(self) -> None:
+        self.assertEqual(parse_cpulist("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(parse_cpulist(""), [])
+        self.assertEqual(format_cpulist([11, 0, 1, 2, 3, 8, 10, 3]), "0-3,8,10-11")
+        self.assertEqual(format_cpulist([]), "")
+
+    def test_online_cpus_without_online_file(self) -> None:
+        """Test that cpuN directories are enumerated if `online` is missing."""
+        for cpu in (0, 1, 10):
+            (self.root / f"sys/devices/system/cpu/cpu{cpu}").mkdir(parents=True)
+        (self.root / "sys/devices/system/cpu/cpufreq").mkdir()
+        self.assertEqual(self.probe.online_cpus(), [0, 1, 10])
+
+    def test_meminfo(self) -> None:
+        fake_sysfs.add_meminfo(self.root, 16303932)
+        meminfo = self.probe.meminfo()
+        self.assertEqual(meminfo["MemTotal"], 16303932)
+        self.assertEqual(meminfo["HugePages_Total"], 0)
+
+    def test_pci_devices_skips_unreadable(self) -> None:
+        fake_sysfs.add_pci_device(self.root, "0000:3b:00.0", 0x10DE, 0x20B0, 0x030200)
+        (self.root / "sys/bus/pci/devices/0000:00:1f.0").mkdir()
+        devices = self.probe.pci_devices()
+        self.assertEqual(len(devices), 1)
+        self.assertEqual(devices[0].address, "0000:3b:00.0")
+        self.assertEqual(devices[0].pci_class, 0x030200)
+
+    def test_default_interface_numa_node(self) -> None:
+        fake_sysfs.add_net_device(self.root, "lo")
+        fake_sysfs.add_net_device(self.root, "eno1", numa_node=-1)
+        fake_sysfs.add_net_device(self.root, "ens1f0", numa_node=1, default=True)
+        self.assertEqual(self.probe.default_interface(), "ens1f0")
+        self.assertEqual(self.probe.interface_numa_node("ens1f0"), 1)
+        self.assertIsNone(self.probe.interface_numa_node("eno1"))
+        self.assertIsNone(self.probe.interface_numa_node("lo"))
+
+    def test_processes(self) -> None:
+        fake_sysfs.add_process(self.root, 42, "slurmd", "/usr/sbin/slurmd -D -s", 2048)
+        fake_sysfs.write(self.root, "/proc/2/comm", "kthreadd")
+        fake_sysfs.write(self.root, "/proc/2/status", "Name:\tkthreadd")
+        # Exited while the processes were read.
+        (self.root / "proc/7").mkdir()
+        self.assertEqual(
+            self.probe.processes(),
+            [(2, "kthreadd", "", 0), (42, "slurmd", "/usr/sbin/slurmd -D -s", 2048)],
+        )
+
+    def test_empty_root(self) -> None:
+        """Test that a missing sysfs does not raise."""
+        self.assertEqual(self.probe.online_cpus(), [])
+        self.assertEqual(self.probe.meminfo(), {})
+        self.assertEqual(self.probe.pci_devices(), [])
+        self.assertIsNone(self.probe.default_interface())
+        self.assertEqual(self.probe.processes(), [])
+
+    @patch("subprocess.Popen")
+    @patch("subprocess.check_output")
+    def test_get_inventory(self, check_output, popen) -> None:
+        """Test that the inventory is assembled without spawning processes."""
+        fake_sysfs.add_cpus(self.root, sockets=2, cores_per_socket=4, threads_per_core=2)
+        fake_sysfs.add_meminfo(self.root, 64 * 1024 * 1024)
+        for gpu in range(2):
+            fake_sysfs.add_pci_device(self.root, f"0000:{gpu + 1:02x}:00.0", 0x10DE, 1, 0x030200)
+            fake_sysfs.add_pci_device(self.root, f"0000:{gpu + 1:02x}:00.1", 0x10DE, 2, 0x040300)
+            fake_sysfs.write(self.root, f"/dev/nvidia{gpu}", "")
+
+        inventory = machine.get_inventory("compute-0", "10.0.0.1", self.probe)
+
+        self.assertEqual(
+            inventory,
+            {
+                "node_name": "compute-0",
+                "node_addr": "10.0.0.1",
+                "state": "UNKNOWN",
+                "real_memory": 65536,
+                "cpus": 16,
+                "threads_per_core": 2,
+                "cores_per_socket": 4,
+                "sockets_per_board": 2,
+                "numa_nodes": {"0": {"cpus": "0-15", "real_memory": 65536}},
+                "cpu_numa_map": [0] * 16,
+                "l3_caches": [],
+                "gres": 2,
+                "gres_devices": [
+                    {
+                        "name": "gpu",
+                        "type": "nvidia_0001",
+                        "file": f"/dev/nvidia{gpu}",
+                        "cores": "",
+                        "pci_address": f"0000:{gpu + 1:02x}:00.0",
+                    }
+                    for gpu in range(2)
+                ],
+            },
+        )
+        check_output.assert_not_called()
+        popen.assert_not_called()
+
+    def test_get_inventory_gpu_missing_device_file(self) -> None:
+        fake_sysfs.add_pci_device(self.root, "0000:01:00.0", 0x10DE, 1, 0x030200)
+        self.assertNotIn("gres", machine.get_inventory("compute-0", "10.0.0.1", self.probe))
+
+    def test_numa_info(self) -> None:
+        """Test NUMA nodes, per node memory and L3 domains on a two socket machine."""
+        fake_sysfs.add_cpus(self.root, sockets=2, cores_per_socket=4, threads_per_core=2)
+        fake_sysfs.write(self.root, "/sys/devices/system/node/online", "0-1")
+        for node, cpus in enumerate(("0-3,8-11", "4-7,12-15")):
+            base = f"/sys/devices/system/node/node{node}"
+            fake_sysfs.write(self.root, f"{base}/cpulist", cpus)
+            fake_sysfs.write(
+                self.root, f"{base}/meminfo", f"Node {node} MemTotal:  {(node + 1) * 1048576} kB"
+            )
+        for cpu in range(16):
+            base = f"/sys/devices/system/cpu/cpu{cpu}/cache"
+            fake_sysfs.write(self.root, f"{base}/index0/level", "1")
+            fake_sysfs.write(self.root, f"{base}/index0/shared_cpu_list", f"{cpu}")
+            fake_sysfs.write(self.root, f"{base}/index3/level", "3")
+            l3 = "0-3,8-11" if cpu % 8 < 4 else "4-7,12-15"
+            fake_sysfs.write(self.root, f"{base}/index3/shared_cpu_list", l3)
+
+        self.assertEqual(
+            machine.numa_info(self.probe),
+            {
+                "numa_nodes": {
+                    "0": {"cpus": "0-3,8-11", "real_memory": 1024},
+                    "1": {"cpus": "4-7,12-15", "real_memory": 2048},
+                },
+                "cpu_numa_map": [0, 0, 0, 0, 1, 1, 1, 1, 0, 0, 0, 0, 1, 1, 1, 1],
+                "l3_caches": ["0-3,8-11", "4-7,12-15"],
+            },
+        )
+
+    def test_numa_info_without_numa(self) -> None:
+        """Test that a machine without NUMA in sysfs is reported as one node."""
+        fake_sysfs.add_cpus(self.root, sockets=1, cores_per_socket=2, threads_per_core=1)
+        fake_sysfs.add_meminfo(self.root, 2 * 1024 * 1024)
+        info = machine.numa_info(self.probe)
+        self.assertEqual(info["numa_nodes"], {"0": {"cpus": "0-1", "real_memory": 2048}})
+        self.assertEqual(info["cpu_numa_map"], [0, 0])
+        self.assertEqual(info["l3_caches"], [])
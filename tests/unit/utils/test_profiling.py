@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the profiling utility module."""
+
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from utils import systemd_dbus
+from utils.profiling import CPROFILE, TIMING, HookProfiler, observed_handlers
+
+
+class _Handlers:
+    """Stand-in for an object observing events."""
+
+    def _on_start(self, event) -> None:
+        subprocess.run(["true"], check=True)
+        subprocess.run(["/usr/bin/env", "true"], check=True)
+        systemd_dbus.service_running("slurmd")
+
+    def _on_config_changed(self, event) -> None:
+        raise RuntimeError("boom")
+
+    def helper(self) -> None:
+        pass
+
+
+def _event(kind: str) -> Mock:
+    event = Mock()
+    event.handle.kind = kind
+    return event
+
+
+class TestHookProfiler(unittest.TestCase):
+    """Unit tests for the hook profiler."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log = Path(tmp.name) / "log" / "hook-profile.jsonl"
+        self.handlers = _Handlers()
+
+    def _profile(self, mode: str = TIMING) -> HookProfiler:
+        profiler = HookProfiler(mode, log=self.log)
+        profiler.instrument(observed_handlers(self.handlers))
+        return profiler
+
+    def test_observed_handlers(self) -> None:
+        self.assertEqual(
+            {handler.__name__ for handler in observed_handlers(self.handlers)},
+            {"_on_start", "_on_config_changed"},
+        )
+
+    @patch("utils.systemd_dbus.backend")
+    def test_disabled(self, _) -> None:
+        profiler = self._profile(mode="")
+        self.assertNotIn("_on_start", vars(self.handlers))
+        self.handlers._on_start(_event("start"))
+        self.assertEqual(profiler.records(), [])
+
+    def test_unknown_mode(self) -> None:
+        self.assertEqual(HookProfiler("strace", log=self.log).mode, "")
+
+    @patch("utils.systemd_dbus.backend")
+    def test_record(self, _) -> None:
+        profiler = self._profile()
+        with patch("utils.profiling.HOOK_TOOLS", {"env"}):
+            self.handlers._on_start(_event("start"))
+        with self.assertRaises(RuntimeError):
+            self.handlers._on_config_changed(_event("config_changed"))
+        # Processes and systemd calls outside of handlers are not recorded.
+        subprocess.run(["true"], check=True)
+        self.assertNotIn("timed", systemd_dbus.service_running.__qualname__)
+
+        start, config_changed = profiler.records()
+        self.assertEqual(start["event"], "start")
+        self.assertEqual(start["handler"], "_Handlers._on_start")
+        self.assertEqual([p["call"] for p in start["processes"]], ["true"])
+        self.assertEqual(start["hook_tools"]["env"]["calls"], 1)
+        self.assertEqual([c["call"] for c in start["systemd"]], ["service_running slurmd"])
+        self.assertGreaterEqual(start["wall"], start["processes"][0]["seconds"])
+        self.assertEqual(config_changed["event"], "config_changed")
+        self.assertEqual(config_changed["processes"], [])
+
+    def test_ring_buffer(self) -> None:
+        profiler = self._profile()
+        with patch("utils.profiling.MAX_RECORDS", 3), patch("utils.systemd_dbus.backend"):
+            for i in range(5):
+                self.handlers._on_start(_event(f"event_{i}"))
+        self.assertEqual(
+            [record["event"] for record in profiler.records()], ["event_2", "event_3", "event_4"]
+        )
+
+    def test_summary(self) -> None:
+        profiler = self._profile()
+        with patch("utils.systemd_dbus.backend"):
+            for _ in range(3):
+                self.handlers._on_start(_event("start"))
+        with self.assertRaises(RuntimeError):
+            self.handlers._on_config_changed(_event("config_changed"))
+
+        summary = profiler.summary()
+        self.assertEqual(summary["start"]["runs"], 3)
+        self.assertEqual(summary["config_changed"]["runs"], 1)
+        self.assertEqual(set(summary["start"]["wall"]), {"p50", "p90", "p99", "max"})
+        self.assertGreater(summary["start"]["processes"]["p50"], 0)
+        self.assertEqual(summary["config_changed"]["hook_tool_calls"]["max"], 0)
+        self.assertEqual(list(profiler.summary("start")), ["start"])
+        self.assertEqual(profiler.summary("install"), {})
+
+    def test_cprofile(self) -> None:
+        profiler = self._profile(mode=CPROFILE)
+        with patch("utils.profiling.MAX_DUMPS", 2), patch("utils.systemd_dbus.backend"):
+            for _ in range(3):
+                self.handlers._on_start(_event("start"))
+        dumps = sorted((self.log.parent / "profiles").glob("*.prof"))
+        self.assertEqual(len(dumps), 2)
+        self.assertEqual(profiler.records()[-1]["profile"], str(dumps[-1]))
+
+    def test_unwritable_log(self) -> None:
+        self.log.parent.touch()
+        profiler = self._profile()
+        with patch("utils.systemd_dbus.backend"):
+            self.handlers._on_start(_event("start"))
+        self.assertEqual(profiler.records(), [])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the reconcile utility module."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from utils.reconcile import (
+    DAEMON_RELOAD,
+    RESTART_MUNGE,
+    RESTART_SLURMD,
+    Artifact,
+    Plan,
+    Reconciler,
+)
+
+
+class TestReconciler(unittest.TestCase):
+    """Unit tests for the minimal-action reconciler."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.state = self.tmp / "state" / "artifacts.json"
+        self.handlers = {
+            DAEMON_RELOAD: Mock(),
+            RESTART_MUNGE: Mock(),
+            RESTART_SLURMD: Mock(),
+        }
+
+    def _artifacts(self, default: str = "OPTIONS=a", override: str = "[Service]"):
+        return [
+            Artifact("default", default, self.tmp / "default", (RESTART_SLURMD,)),
+            Artifact(
+                "override",
+                override,
+                self.tmp / "slurmd.service.d" / "override.conf",
+                (DAEMON_RELOAD, RESTART_SLURMD),
+            ),
+        ]
+
+    def _called(self) -> list:
+        return [action for action, handler in self.handlers.items() if handler.called]
+
+    def test_first_apply(self) -> None:
+        plan = Reconciler(self._artifacts(), self.state).apply(self.handlers)
+        self.assertEqual(plan, Plan(["default", "override"], [DAEMON_RELOAD, RESTART_SLURMD]))
+        self.assertEqual((self.tmp / "default").read_text(), "OPTIONS=a")
+        self.assertEqual(
+            (self.tmp / "slurmd.service.d" / "override.conf").read_text(), "[Service]"
+        )
+        for handler in self.handlers.values():
+            self.assertLessEqual(handler.call_count, 1)
+
+    def test_no_changes(self) -> None:
+        """Test that unchanged artifacts are neither written nor acted upon."""
+        Reconciler(self._artifacts(), self.state).apply({})
+        plan = Reconciler(self._artifacts(), self.state).apply(self.handlers)
+        self.assertFalse(plan)
+        self.assertEqual(self._called(), [])
+
+    def test_minimal_actions(self) -> None:
+        """Test that systemd is only reloaded when a unit file changed."""
+        Reconciler(self._artifacts(), self.state).apply({})
+        reconciler = Reconciler(self._artifacts(default="OPTIONS=b"), self.state)
+        self.assertEqual(reconciler.plan(), Plan(["default"], [RESTART_SLURMD]))
+        # Planning does not change anything.
+        self.assertEqual((self.tmp / "default").read_text(), "OPTIONS=a")
+
+        reconciler.apply(self.handlers)
+        self.assertEqual(self._called(), [RESTART_SLURMD])
+        self.assertEqual((self.tmp / "default").read_text(), "OPTIONS=b")
+
+    def test_drift_on_disk(self) -> None:
+        """Test that files modified outside the charm are restored."""
+        Reconciler(self._artifacts(), self.state).apply({})
+        (self.tmp / "slurmd.service.d" / "override.conf").write_text("[Service]\nUser=nobody")
+        plan = Reconciler(self._artifacts(), self.state).apply(self.handlers)
+        self.assertEqual(plan.changed, ["override"])
+        self.assertEqual(self._called(), [DAEMON_RELOAD, RESTART_SLURMD])
+
+    def test_action_order(self) -> None:
+        artifacts = [
+            Artifact("key", b"\x00\x01", self.tmp / "munge.key", (RESTART_MUNGE, RESTART_SLURMD)),
+            *self._artifacts(),
+        ]
+        plan = Reconciler(artifacts, self.state).plan()
+        self.assertEqual(plan.actions, [DAEMON_RELOAD, RESTART_MUNGE, RESTART_SLURMD])
+        self.assertEqual(
+            plan.to_dict(),
+            {
+                "changed": ["key", "default", "override"],
+                "actions": [DAEMON_RELOAD, RESTART_MUNGE, RESTART_SLURMD],
+            },
+        )
+
+    def test_custom_writer(self) -> None:
+        """Test that artifacts rendered elsewhere are tracked by their inputs."""
+        write = Mock()
+        Reconciler(
+            [Artifact("nhc", "* || check_fs_mount_rw -f /", write=write)], self.state
+        ).apply({})
+        write.assert_called_once()
+
+        Reconciler(
+            [Artifact("nhc", "* || check_fs_mount_rw -f /", write=write)], self.state
+        ).apply({})
+        write.assert_called_once()
+
+        Reconciler([Artifact("nhc", "* || check_hw_cpuinfo 1", write=write)], self.state).apply({})
+        self.assertEqual(write.call_count, 2)
+
+    def test_file_mode(self) -> None:
+        Reconciler([Artifact("key", b"secret", self.tmp / "key", mode=0o400)], self.state).apply(
+            {}
+        )
+        self.assertEqual((self.tmp / "key").stat().st_mode & 0o777, 0o400)
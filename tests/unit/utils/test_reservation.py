@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the system reservation utility module."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import fake_sysfs
+
+from utils import reservation
+from utils.probe import Probe
+
+
+class TestReservation(unittest.TestCase):
+    """Unit tests for the core and memory reservation of the system daemons."""
+
+    def setUp(self) -> None:
+        """Create a two socket machine with one NUMA node per socket."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.probe = Probe(self.root)
+        # Core c of socket s holds cpus 4s+c and 4s+c+8.
+        fake_sysfs.add_cpus(self.root, sockets=2, cores_per_socket=4, threads_per_core=2)
+        fake_sysfs.add_meminfo(self.root, 4 * 1024 * 1024)
+        fake_sysfs.write(self.root, "/sys/devices/system/node/online", "0-1")
+        for node, cpus in enumerate(("0-3,8-11", "4-7,12-15")):
+            fake_sysfs.write(self.root, f"/sys/devices/system/node/node{node}/cpulist", cpus)
+        fake_sysfs.add_net_device(self.root, "lo")
+
+    def test_reserved_cores_without_nic(self) -> None:
+        self.assertEqual(reservation.reserved_cores(2, self.probe), [(1, 2), (1, 3)])
+
+    def test_reserved_cores_prefer_nic_numa_node(self) -> None:
+        fake_sysfs.add_net_device(self.root, "eno1", numa_node=0, default=True)
+        self.assertEqual(reservation.reserved_cores(2, self.probe), [(0, 2), (0, 3)])
+        # Cores of other nodes are only reserved once the node of the NIC is full.
+        self.assertEqual(
+            reservation.reserved_cores(5, self.probe), [(0, 0), (0, 1), (0, 2), (0, 3), (1, 3)]
+        )
+
+    def test_reserved_cores_leave_one_core(self) -> None:
+        self.assertEqual(len(reservation.reserved_cores(8, self.probe)), 7)
+
+    def test_abstract_cpus(self) -> None:
+        """Test that Slurm numbers the threads of a core consecutively."""
+        self.assertEqual(reservation.abstract_cpus([(0, 1), (1, 3)], self.probe), [2, 3, 14, 15])
+
+    def test_daemon_memory(self) -> None:
+        fake_sysfs.add_process(self.root, 1, "systemd", "/sbin/init", 12 * 1024)
+        fake_sysfs.add_process(self.root, 100, "slurmd", "/usr/sbin/slurmd -D -s", 100 * 1024)
+        fake_sysfs.add_process(self.root, 101, "munged", "/usr/sbin/munged", 20 * 1024)
+        fake_sysfs.add_process(
+            self.root,
+            102,
+            "python3",
+            "/usr/bin/python3 src/charms/operator_libs_linux/v0/juju_systemd_notices.py",
+            50 * 1024 + 1,
+        )
+        self.assertEqual(reservation.daemon_memory(self.probe), 171)
+
+    def test_compute(self) -> None:
+        self.assertEqual(reservation.compute(probe=self.probe), {})
+
+        fake_sysfs.add_net_device(self.root, "eno1", numa_node=1, default=True)
+        fake_sysfs.add_process(self.root, 100, "slurmd", "/usr/sbin/slurmd", 170 * 1024)
+        self.assertEqual(
+            reservation.compute(cores=2, probe=self.probe),
+            {"cpu_spec_list": "12-15", "mem_spec_limit": 256},
+        )
+        self.assertEqual(
+            reservation.compute(memory=1000, probe=self.probe), {"mem_spec_limit": 1280}
+        )
+        # At most half of the memory is reserved.
+        self.assertEqual(
+            reservation.compute(memory=4000, probe=self.probe), {"mem_spec_limit": 2048}
+        )
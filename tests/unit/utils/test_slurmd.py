@@ -16,16 +16,68 @@
 """Unit tests for the slurmd utility module."""
 
 import datetime
-import subprocess
+import os
+import signal
+import socket
+import sys
+import tempfile
+import textwrap
+import threading
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import Mock, patch
 
 from utils import slurmd
 
 
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _StandInSlurmctld:
+    """Stand-in configless server that counts the connections it accepts."""
+
+    def __init__(self, port: int) -> None:
+        self.connections = 0
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", port))
+        self._sock.listen()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            conn.close()
+
+    def close(self) -> None:
+        self._sock.close()
+
+
 class TestSlurmd(unittest.TestCase):
     """Unit tests for methods in slurmd utility module."""
 
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # Control systemd through systemctl rather than the system bus.
+        patcher = patch("utils.systemd_dbus.backend", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.started = self.tmp / "started"
+        patcher = patch("utils.slurmd.STARTED_MARKER", self.started)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch("charms.operator_libs_linux.v1.systemd._systemctl")
     def test_start(self, _) -> None:
         slurmd.start()
@@ -38,24 +90,61 @@ class TestSlurmd(unittest.TestCase):
     def test_restart(self, _) -> None:
         slurmd.restart()
 
-    @patch("pathlib.Path.write_text")
-    def test_overwrite_default(self, _) -> None:
-        slurmd.override_default("127.0.0.1", 6818)
+    def test_overwrite_default(self) -> None:
+        default = self.tmp / "default" / "slurmd"
+        with patch("utils.slurmd.DEFAULT_FILE", default):
+            self.assertTrue(slurmd.override_default("127.0.0.1", 6817))
+            self.assertIn("--conf-server 127.0.0.1:6817", default.read_text())
+            self.assertFalse(slurmd.override_default("127.0.0.1", 6817))
+            self.assertTrue(slurmd.override_default("127.0.0.2", 6817))
 
-    @patch("pathlib.Path.is_dir", return_value=False)
-    @patch("pathlib.Path.mkdir")
-    @patch("pathlib.Path.write_text")
-    @patch("charms.operator_libs_linux.v1.systemd._systemctl")
-    def test_override_service_no_service_d(self, *_) -> None:
-        """Test override_service(...) when slurmd.service.d does not exist."""
-        slurmd.override_service()
+    def test_start_window_file(self) -> None:
+        self.assertEqual(slurmd.start_window_file(120), "SLURMD_START_WINDOW=120")
+        self.assertEqual(slurmd.start_window_file(3600), "SLURMD_START_WINDOW=600")
+        self.assertIn(f"EnvironmentFile=-{slurmd.START_WINDOW_FILE}", slurmd.service_override())
+
+    def test_conf_servers(self) -> None:
+        """Test parsing the configless servers out of $SLURMD_OPTIONS."""
+        self.assertEqual(slurmd._conf_servers("--conf-server ctld-0:6817 -M"), [("ctld-0", 6817)])
+        self.assertEqual(
+            slurmd._conf_servers("--conf-server=ctld-0,ctld-1:7000"),
+            [("ctld-0", 6817), ("ctld-1", 7000)],
+        )
+        self.assertEqual(slurmd._conf_servers(""), [])
+
+    def test_conf_server_reachable(self) -> None:
+        port = _free_port()
+        self.assertFalse(slurmd._conf_server_reachable([("127.0.0.1", port)]))
+        server = _StandInSlurmctld(port)
+        self.addCleanup(server.close)
+        self.assertTrue(slurmd._conf_server_reachable([("127.0.0.1", port)]))
+        # Without a configless server there is nothing to wait for.
+        self.assertTrue(slurmd._conf_server_reachable([]))
+
+    def test_start_delay(self) -> None:
+        """Test that start delay slots are stable and spread within the window."""
+        self.assertEqual(slurmd._start_delay("node-1", 0), 0)
+        self.assertEqual(slurmd._start_delay("node-1", 60), slurmd._start_delay("node-1", 60))
+        delays = [slurmd._start_delay(f"node-{i}", 60) for i in range(100)]
+        self.assertTrue(all(0 <= delay < 60 for delay in delays))
+        self.assertGreater(len(set(delays)), 90)
+        self.assertLess(min(delays), 10)
+        self.assertGreater(max(delays), 50)
+
+    def test_jitter(self) -> None:
+        for _ in range(100):
+            self.assertTrue(5 <= slurmd._jitter(10) <= 10)
 
-    @patch("pathlib.Path.is_dir", return_value=True)
-    @patch("pathlib.Path.write_text")
     @patch("charms.operator_libs_linux.v1.systemd._systemctl")
-    def test_override_service_yes_service_d(self, *_) -> None:
-        """Test override_service(...) when slurmd.service.d exists."""
-        slurmd.override_service()
+    def test_override_service(self, systemctl) -> None:
+        """Test that systemd is only reloaded when the drop-in changes."""
+        override = self.tmp / "slurmd.service.d" / "99-slurmd-charm.conf"
+        with patch("utils.slurmd.SERVICE_OVERRIDE", override):
+            self.assertTrue(slurmd.override_service())
+            self.assertIn("ExecStart=/usr/bin/python3", override.read_text())
+            systemctl.assert_called_once_with("daemon-reload")
+            self.assertFalse(slurmd.override_service())
+            systemctl.assert_called_once()
 
     @patch("datetime.timedelta", return_value=datetime.timedelta(-1))
     def test_start_slurmd_service_fail(self, _) -> None:
@@ -70,10 +159,118 @@ class TestSlurmd(unittest.TestCase):
 
         self.assertEqual(e.exception.code, 1)
 
+    @patch("utils.slurmd._slurmd_ready", return_value=True)
     @patch("subprocess.Popen")
-    def test_start_slurmd_service_success(self, mock_popen) -> None:
+    def test_start_slurmd_service_success(self, mock_popen, _) -> None:
         """Test _start_slurmd_service() as if slurmd succeeds to start."""
         process_mock = Mock()
-        process_mock.configure_mock(**{"wait.side_effect": subprocess.TimeoutExpired("", 0)})
+        process_mock.configure_mock(**{"poll.return_value": None})
         mock_popen.return_value = process_mock
         slurmd._start_slurmd_service()
+        mock_popen.assert_called_once()
+
+    def _fake_slurmd(self, script: str) -> Path:
+        """Write a fake slurmd binary that runs `script` and return its path."""
+        binary = self.tmp / "slurmd"
+        binary.write_text(f"#!{sys.executable}\n{textwrap.dedent(script)}")
+        binary.chmod(0o755)
+        return binary
+
+    def _kill(self, pid_file: Path) -> None:
+        os.kill(int(pid_file.read_text()), signal.SIGTERM)
+
+    def test_start_slurmd_service_pid_file(self) -> None:
+        """Test that slurmd is considered started as soon as it writes its pid file."""
+        pid_file = self.tmp / "slurmd.pid"
+        binary = self._fake_slurmd(f"""
+            import os, time
+            open("{pid_file}", "w").write(str(os.getpid()))
+            time.sleep(60)
+            """)
+        start = time.monotonic()
+        slurmd._start_slurmd_service(str(binary), _free_port(), pid_file, ready_timeout=30)
+        self.addCleanup(self._kill, pid_file)
+        self.assertLess(time.monotonic() - start, 5)
+
+    @patch("utils.slurmd.BACKOFF_INITIAL", 0.01)
+    def test_start_slurmd_service_port_with_retries(self) -> None:
+        """Test that failed starts are retried until slurmd accepts connections."""
+        attempts = self.tmp / "attempts"
+        pid_file = self.tmp / "slurmd.pid"
+        port = _free_port()
+        binary = self._fake_slurmd(f"""
+            import os, socket, sys, time
+            with open("{attempts}", "a") as f:
+                f.write("x")
+            if len(open("{attempts}").read()) < 3:
+                sys.exit(1)
+            open("{pid_file}.real", "w").write(str(os.getpid()))
+            os.rename("{pid_file}.real", "{pid_file}.kill")
+            s = socket.socket()
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind(("127.0.0.1", {port}))
+            s.listen()
+            time.sleep(60)
+            """)
+        slurmd._start_slurmd_service(str(binary), port, pid_file, ready_timeout=30)
+        self.addCleanup(self._kill, Path(f"{pid_file}.kill"))
+        self.assertEqual(attempts.read_text(), "xxx")
+
+    @patch("utils.slurmd.BACKOFF_INITIAL", 0.05)
+    def test_start_slurmd_service_waits_for_conf_server(self) -> None:
+        """Test that slurmd is only launched once the configless server is up."""
+        attempts = self.tmp / "attempts"
+        pid_file = self.tmp / "slurmd.pid"
+        conf_port = _free_port()
+        binary = self._fake_slurmd(f"""
+            import os, time
+            with open("{attempts}", "a") as f:
+                f.write("x")
+            open("{pid_file}", "w").write(str(os.getpid()))
+            time.sleep(60)
+            """)
+        servers = []
+        timer = threading.Timer(0.3, lambda: servers.append(_StandInSlurmctld(conf_port)))
+        timer.start()
+        self.addCleanup(lambda: [server.close() for server in servers])
+        with patch.dict(os.environ, {"SLURMD_OPTIONS": f"--conf-server 127.0.0.1:{conf_port}"}):
+            slurmd._start_slurmd_service(str(binary), _free_port(), pid_file, ready_timeout=30)
+        self.addCleanup(self._kill, pid_file)
+        timer.join()
+        self.assertEqual(attempts.read_text(), "x")
+        self.assertEqual(servers[0].connections, 1)
+
+    @patch("time.sleep")
+    @patch("utils.slurmd._slurmd_ready", return_value=True)
+    @patch("subprocess.Popen")
+    def test_start_slurmd_service_start_window(self, mock_popen, _, mock_sleep) -> None:
+        """Test that the first start is delayed by the slot of the node."""
+        mock_popen.return_value.configure_mock(**{"poll.return_value": None})
+        with patch.dict(os.environ, {"SLURMD_START_WINDOW": "60", "SLURMD_OPTIONS": ""}):
+            slurmd._start_slurmd_service()
+            mock_sleep.assert_called_once_with(slurmd._start_delay(socket.gethostname(), 60))
+            self.assertTrue(self.started.exists())
+
+            # Restarts after the first start since boot are not delayed.
+            slurmd._start_slurmd_service()
+            mock_sleep.assert_called_once()
+
+    @patch("time.sleep")
+    @patch("utils.slurmd._conf_server_reachable", return_value=False)
+    @patch("utils.slurmd._start_delay", return_value=600)
+    def test_start_slurmd_service_start_window_deadline(self, start_delay, _, sleep) -> None:
+        """Test that the start delay counts against the 15 minutes to start slurmd."""
+        start = datetime.datetime(2024, 1, 1)
+
+        def now() -> datetime.datetime:
+            slept = sum(call.args[0] for call in sleep.call_args_list)
+            return start + datetime.timedelta(seconds=slept)
+
+        with patch("datetime.datetime", Mock(now=now)), patch.dict(
+            os.environ, {"SLURMD_START_WINDOW": "3600", "SLURMD_OPTIONS": ""}
+        ), self.assertRaises(SystemExit):
+            slurmd._start_slurmd_service()
+        self.assertEqual(start_delay.call_args.args[1], slurmd.MAX_START_WINDOW)
+        self.assertEqual(sleep.call_args_list[0].args, (600,))
+        slept = sum(call.args[0] for call in sleep.call_args_list)
+        self.assertLessEqual(slept, 15 * 60 + slurmd.BACKOFF_MAX)
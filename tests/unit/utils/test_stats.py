@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the stats utility module."""
+
+import unittest
+
+from utils.stats import percentile
+
+
+class TestStats(unittest.TestCase):
+    """Unit tests for the statistics of recorded runtimes."""
+
+    def test_percentile(self) -> None:
+        values = [float(v) for v in range(1, 11)]
+        self.assertEqual(percentile(values, 50), 5.0)
+        self.assertEqual(percentile(values, 90), 9.0)
+        self.assertEqual(percentile(values, 99), 10.0)
+        self.assertEqual(percentile([3.0], 50), 3.0)
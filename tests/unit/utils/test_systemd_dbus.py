@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the D-Bus systemd backend."""
+
+import unittest
+from unittest.mock import patch
+
+from charms.operator_libs_linux.v1.systemd import SystemdError
+from fake_systemd import DBUS_DAEMON, FakeSystemd
+
+from utils import systemd_dbus
+from utils.systemd_dbus import SystemdBus
+
+
+@unittest.skipUnless(DBUS_DAEMON, "dbus-daemon is required for the systemd stand-in")
+class TestSystemdBus(unittest.TestCase):
+    """Unit tests for the persistent connection to systemd."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.systemd = FakeSystemd().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.systemd.stop()
+
+    def setUp(self) -> None:
+        self.bus = SystemdBus(self.systemd.address, timeout=5).connect()
+        self.addCleanup(self.bus.close)
+        self.systemd.calls.clear()
+
+    def test_unit_jobs(self) -> None:
+        self.assertFalse(self.bus.is_active("slurmd"))
+        self.assertTrue(self.bus.start("slurmd"))
+        self.assertTrue(self.bus.is_active("slurmd"))
+        self.assertTrue(self.bus.restart("slurmd.service"))
+        self.assertTrue(self.bus.reload("slurmd"))
+        self.assertTrue(self.bus.stop("slurmd"))
+        self.assertFalse(self.bus.is_active("slurmd"))
+        self.assertEqual(self.systemd.calls, ["slurmd.service"] * 4)
+
+    def test_failed_job(self) -> None:
+        self.systemd.failing.add("munge.service")
+        self.addCleanup(self.systemd.failing.clear)
+        with self.assertRaises(SystemdError):
+            self.bus.start("munge")
+
+    def test_foreign_jobs(self) -> None:
+        """Test that only the results of the jobs queued by this process are kept."""
+        other = SystemdBus(self.systemd.address, timeout=5).connect()
+        self.addCleanup(other.close)
+        self.assertTrue(other.start("fluent-bit"))
+        self.assertTrue(other.stop("fluent-bit"))
+
+        self.assertTrue(self.bus.stop("slurmd"))
+        self.assertFalse(self.bus.is_active("fluent-bit"))
+        self.assertEqual(self.bus._results, {})
+        self.assertEqual(self.bus._waiters, {})
+
+    def test_enable(self) -> None:
+        reloads = self.systemd.reloads
+        self.assertTrue(self.bus.enable("juju-slurmd-0-systemd-notices"))
+        self.assertIn("juju-slurmd-0-systemd-notices.service", self.systemd.enabled)
+        self.assertTrue(self.bus.disable("juju-slurmd-0-systemd-notices"))
+        self.assertNotIn("juju-slurmd-0-systemd-notices.service", self.systemd.enabled)
+        self.assertTrue(self.bus.daemon_reload())
+        self.assertEqual(self.systemd.reloads, reloads + 3)
+
+    def test_backend(self) -> None:
+        """Test that the module functions share one connection per process."""
+        systemd_dbus.backend.cache_clear()
+        self.addCleanup(systemd_dbus.backend.cache_clear)
+        with patch.dict("os.environ", {"DBUS_SYSTEM_BUS_ADDRESS": self.systemd.address}):
+            self.assertTrue(systemd_dbus.service_start("fluent-bit"))
+            self.assertTrue(systemd_dbus.service_running("fluent-bit"))
+            self.assertTrue(systemd_dbus.service_restart("fluent-bit"))
+        self.assertIs(systemd_dbus.backend(), systemd_dbus.backend())
+        systemd_dbus.backend().close()
+
+
+class TestFallback(unittest.TestCase):
+    """Unit tests for the fallback to systemctl when there is no bus."""
+
+    def setUp(self) -> None:
+        systemd_dbus.backend.cache_clear()
+        self.addCleanup(systemd_dbus.backend.cache_clear)
+
+    @patch.dict("os.environ", {"DBUS_SYSTEM_BUS_ADDRESS": "unix:path=/nonexistent/bus"})
+    @patch("charms.operator_libs_linux.v1.systemd._systemctl", return_value=True)
+    def test_no_bus(self, systemctl) -> None:
+        self.assertIsNone(systemd_dbus.backend())
+        self.assertTrue(systemd_dbus.service_restart("slurmd"))
+        self.assertTrue(systemd_dbus.service_enable("slurmd"))
+        self.assertTrue(systemd_dbus.daemon_reload())
+        self.assertEqual(
+            [call.args for call in systemctl.call_args_list],
+            [("restart", "slurmd"), ("enable", "slurmd"), ("daemon-reload",)],
+        )